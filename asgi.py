@@ -0,0 +1,231 @@
+"""
+Async (ASGI) variant of the buildable-sets API in main.py, serving the same two URLs with the same response shapes.
+
+A request awaits its upstream calls instead of holding a worker thread for them, and calls that do not depend on each
+other are awaited concurrently: the user data with the set list, the inventory with the catalog index, and the set
+details with each other. Streaming and the batch resource are only served by main.py.
+
+Run with `uvicorn asgi:app`. Requires the packages in requirements-asgi.txt.
+"""
+import asyncio
+import contextlib
+import logging
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from config import BUILDABILITY_ENGINE, SET_DETAILS_MAX_WORKERS, RESULT_CACHE_TTL, RESULT_CACHE_MAX_BYTES
+from helpers.async_api_functions import create_client, get_user_data, get_lego_sets
+from helpers.async_api_functions import get_user_inventory_details, get_lego_set_details
+from helpers.cache_backends import MemoryCacheBackend
+from helpers.catalog_index import INDEX_ENGINES, catalog_index_class, catalog_version
+from helpers.catalog_index import find_catalog_index, store_catalog_index
+from helpers.functions import find_sets_with_less_bricks_than_users_inventory, sort_user_inventory
+from helpers.functions import buildable_set_ids_from_index, prune_lego_sets, set_check, summaries_for, summarize_set
+from helpers.service import buildable_sets_key
+
+# Computed results, keyed as in helpers.service.
+result_cache = MemoryCacheBackend(RESULT_CACHE_TTL, max_bytes=RESULT_CACHE_MAX_BYTES)
+
+# Held while an index is built, so that concurrent requests missing it wait for that one build.
+_index_lock = asyncio.Lock()
+
+
+async def fetch_lego_set_details(client: httpx.AsyncClient, lego_sets: Dict,
+                                 summaries: Optional[Dict[str, Dict]] = None) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+    """
+    Fetches the details of every set in `lego_sets` concurrently, with at most SET_DETAILS_MAX_WORKERS requests in
+    flight at once.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the requests with.
+        lego_sets (Dict): A dictionary containing Lego set details, where the 'Sets' key holds a list of sets.
+        summaries (Optional[Dict[str, Dict]], optional): Where the summary of each fetched set is recorded, as
+            returned by summaries_for. Defaults to the summaries of `lego_sets` itself.
+
+    Returns:
+        Tuple[Dict[str, Dict], Dict[str, str]]: The set details keyed by set id, in the same order as
+        `lego_sets['Sets']`, and a dictionary mapping the id of every set that could not be fetched to the reason.
+    """
+    if summaries is None:
+        summaries = summaries_for(lego_sets)
+    semaphore = asyncio.Semaphore(max(SET_DETAILS_MAX_WORKERS, 1))
+
+    async def fetch(set_id: str) -> Tuple[Optional[Dict], Optional[str]]:
+        async with semaphore:
+            try:
+                lego_set_details = await get_lego_set_details(client, set_id)
+            except Exception as err:
+                return None, str(err)
+        return lego_set_details, None if lego_set_details is not None else "Set details could not be retrieved."
+
+    results = await asyncio.gather(*(fetch(lego_set['id']) for lego_set in lego_sets['Sets']))
+
+    details: Dict[str, Dict] = {}
+    failures: Dict[str, str] = {}
+    for lego_set, (lego_set_details, error) in zip(lego_sets['Sets'], results):
+        set_id = lego_set['id']
+        if error is not None:
+            logging.error(f"Could not fetch details for set {set_id}: {error}")
+            failures[set_id] = error
+        else:
+            summaries[set_id] = summarize_set(lego_set, lego_set_details['pieces'])
+            details[set_id] = lego_set_details
+
+    return details, failures
+
+
+async def load_catalog_index(client: httpx.AsyncClient, lego_sets: Dict[str, Any]) -> Optional[Any]:
+    """
+    Returns the index of `lego_sets` for the configured BUILDABILITY_ENGINE, or None when the engine scans every set.
+    The index is kept like those built by get_catalog_index: until the catalog version changes, or for
+    PARTIAL_INDEX_TTL seconds if some sets failed to load.
+    """
+    if BUILDABILITY_ENGINE not in INDEX_ENGINES:
+        return None
+
+    index_class = catalog_index_class(BUILDABILITY_ENGINE)
+    version = catalog_version(lego_sets)
+    index = find_catalog_index(index_class, version)
+    if index is not None:
+        return index
+    async with _index_lock:
+        index = find_catalog_index(index_class, version)
+        if index is not None:
+            return index
+
+        set_details, failed_sets = await fetch_lego_set_details(client, lego_sets)
+        # Building the index is CPU-bound, so it runs off the event loop.
+        index = await asyncio.to_thread(index_class, lego_sets, set_details, failed_sets)
+        store_catalog_index(index)
+        return index
+
+
+async def find_buildable_sets(client: httpx.AsyncClient, users_inventory: Dict, lego_sets: Dict,
+                              is_flexible_on_color: bool, catalog_index: Optional[Any]) -> Dict[str, Any]:
+    """
+    Finds the buildable sets like helpers.functions.find_buildable_sets, fetching the set details it needs
+    concurrently. Answering from the index and checking the fetched sets are CPU-bound, so both run off the event
+    loop.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the requests with.
+        users_inventory (Dict): The user's inventory as returned by sort_user_inventory.
+        lego_sets (Dict): The set list as returned by get_lego_sets.
+        is_flexible_on_color (bool): Whether colors may be swapped.
+        catalog_index (Optional[CatalogIndex]): The index for `lego_sets`, or None to scan every set.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing the buildable sets, and the sets that could not be checked if there
+        were any.
+    """
+    buildable_sets: Dict[str, Dict[str, str]] = {}
+    failed_sets: Dict[str, str] = {}
+
+    if catalog_index is not None:
+        failed_sets.update(catalog_index.failed_sets)
+        set_ids = await asyncio.to_thread(
+            buildable_set_ids_from_index, users_inventory, catalog_index, is_flexible_on_color)
+        for set_id in set_ids:
+            buildable_sets[catalog_index.set_names[set_id]] = {'id': set_id}
+    elif users_inventory:
+        summaries = summaries_for(lego_sets)
+        lego_sets = prune_lego_sets(users_inventory, lego_sets, summaries=summaries)
+        set_details, fetch_failures = await fetch_lego_set_details(client, lego_sets, summaries)
+        failed_sets.update(fetch_failures)
+
+        can_build = set_check(is_flexible_on_color)
+
+        def check_sets() -> Dict[str, Dict[str, str]]:
+            return {lego_set['name']: {'id': lego_set['id']} for lego_set in lego_sets['Sets']
+                    if lego_set['id'] in set_details
+                    and can_build(users_inventory, set_details[lego_set['id']]['pieces'])}
+
+        buildable_sets.update(await asyncio.to_thread(check_sets))
+
+    if failed_sets:
+        return {"buildable_sets": buildable_sets, "failed_sets": failed_sets}
+    return {"buildable_sets": buildable_sets}
+
+
+async def find_buildable_sets_for_user(client: httpx.AsyncClient, username: str,
+                                       is_flexible_on_color: bool) -> Dict[str, Any]:
+    """
+    Runs the buildable-sets pipeline for one user.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the upstream requests with.
+        username (str): The username of the user whose inventory will look through to find buildable sets.
+        is_flexible_on_color (bool): Whether colors may be swapped.
+
+    Returns:
+        Dict[str, Any]: The response body, shaped like the response of the matching resource in main.py.
+    """
+    user_data, lego_sets = await asyncio.gather(get_user_data(client, username), get_lego_sets(client))
+    if user_data is None:
+        return {"message": "An error occurred while retrieving user data."}
+    if lego_sets is None:
+        return {"message": "An error occurred."}
+
+    if not find_sets_with_less_bricks_than_users_inventory(lego_sets, user_data['brickCount']):
+        return {"message": "No buildable sets found."}
+
+    users_inventory_raw, catalog_index = await asyncio.gather(
+        get_user_inventory_details(client, user_data), load_catalog_index(client, lego_sets))
+    if users_inventory_raw is None:
+        return {"message": "An error occurred while retrieving user data."}
+    users_inventory: Dict[str, Any] = sort_user_inventory(users_inventory_raw)
+
+    result_key = buildable_sets_key(users_inventory, lego_sets, is_flexible_on_color)
+    result = result_cache.get(result_key)
+    if result is not None:
+        return result
+
+    result = await find_buildable_sets(client, users_inventory, lego_sets, is_flexible_on_color, catalog_index)
+    if "failed_sets" not in result:
+        result_cache.set(result_key, result)
+    return result
+
+
+async def buildable_sets_response(request: Request, is_flexible_on_color: bool) -> JSONResponse:
+    username = request.path_params["username"]
+    try:
+        result = await find_buildable_sets_for_user(request.app.state.client, username, is_flexible_on_color)
+    except Exception as err:
+        logging.error(f"An error occurred: {err}")
+        result = {"message": "An error occurred."}
+    return JSONResponse(result)
+
+
+async def buildable_sets_from_current_inventory(request: Request) -> JSONResponse:
+    """
+    Returns the sets a user can build from their current inventory.
+    """
+    return await buildable_sets_response(request, False)
+
+
+async def buildable_sets_with_color_flexibility(request: Request) -> JSONResponse:
+    """
+    Returns the sets a user could build if they're willing to swap colors out for other colors in their inventory.
+    """
+    return await buildable_sets_response(request, True)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette) -> AsyncIterator[None]:
+    app.state.client = create_client()
+    try:
+        yield
+    finally:
+        await app.state.client.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/v1.0/buildable-sets/{username}", buildable_sets_from_current_inventory),
+        Route("/api/v1.0/buildable-sets-additional/{username}", buildable_sets_with_color_flexibility),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,104 @@
+"""
+Compares the matching-based color-substitution solver with the greedy first-fit loop it replaced, on synthetic sets
+with thousands of pieces.
+
+Usage: python benchmarks/bench_color_substitution.py [set_count] [pieces_per_set]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.synthetic import generate_catalog, generate_inventory
+from helpers.functions import LegoBrick, sort_user_inventory, user_can_build_set
+from helpers.functions import user_can_build_set_if_colors_are_changeable
+
+
+def greedy_user_can_build_set_if_colors_are_changeable(user_inventory, lego_bricks_in_set):
+    """
+    The greedy first-fit checker as it was before the matching solver, kept as the baseline.
+    """
+    used_colors = set()
+    substitutions = {}
+    needs_substitution = False
+
+    if not user_inventory:
+        return False
+
+    if user_can_build_set(user_inventory, lego_bricks_in_set):
+        return False
+
+    for lego in lego_bricks_in_set:
+        lego_brick = LegoBrick(lego['part']['designID'], str(lego['part']['material']), lego['quantity'])
+        if lego_brick.id in user_inventory:
+            if lego_brick.color in user_inventory[lego_brick.id]:
+                used_colors.add(lego_brick.color)
+            else:
+                found_substitute = False
+                for color, count in user_inventory[lego_brick.id].items():
+                    if color not in used_colors and count >= lego_brick.quantity:
+                        used_colors.add(color)
+                        substitutions[lego_brick.color] = color
+                        found_substitute = True
+                        break
+                if not found_substitute:
+                    needs_substitution = True
+                    break
+        else:
+            needs_substitution = True
+            break
+
+    if not needs_substitution:
+        return True
+
+    for lego in lego_bricks_in_set:
+        lego_brick = LegoBrick(lego['part']['designID'], str(lego['part']['material']), lego['quantity'])
+        if lego_brick.color not in substitutions:
+            needs_substitution = False
+            for color, count in user_inventory[lego_brick.id].items():
+                if color not in used_colors and count >= lego_brick.quantity:
+                    used_colors.add(color)
+                    substitutions[lego_brick.color] = color
+                    needs_substitution = True
+                    break
+            if not needs_substitution:
+                return False
+
+    return True
+
+
+def safe(checker):
+    def check(user_inventory, pieces):
+        try:
+            return checker(user_inventory, pieces)
+        except KeyError:
+            # The greedy loop raises KeyError for sets needing a part the user does not own.
+            return False
+    return check
+
+
+def main(set_count: int, pieces_per_set: int) -> None:
+    lego_sets, set_details = generate_catalog(set_count, pieces_per_set, part_count=60, color_count=12, seed=7)
+    pieces = [set_details[lego_set['id']]['pieces'] for lego_set in lego_sets['Sets']]
+
+    sparse = sort_user_inventory(generate_inventory(part_count=60, color_count=16, coverage=0.7, max_count=60, seed=7))
+    # Owns plenty of every part in every color but "0", so every set needing color "0" needs a substitution.
+    rich = sort_user_inventory(generate_inventory(part_count=60, color_count=16, coverage=1.0, max_count=60, seed=7))
+    for colors in rich.values():
+        colors.pop("0", None)
+        for color in colors:
+            colors[color] += 200
+
+    print(f"{set_count} sets, {pieces_per_set} pieces per set")
+    for inventory_name, inventory in (("sparse inventory", sparse), ("rich inventory", rich)):
+        print(f"  {inventory_name}")
+        for name, checker in (("greedy", safe(greedy_user_can_build_set_if_colors_are_changeable)),
+                              ("matching", user_can_build_set_if_colors_are_changeable)):
+            found = sum(checker(inventory, set_pieces) for set_pieces in pieces)
+            runs, total = timeit.Timer(lambda: [checker(inventory, set_pieces) for set_pieces in pieces]).autorange()
+            print(f"    {name:<10}{total / runs * 1000:10.2f} ms  {found} sets buildable with substitutions")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
@@ -0,0 +1,63 @@
+"""
+Compares the memory footprint and throughput of the compact, integer-coded representation with the dictionary form
+used by sort_user_inventory and the set-detail payloads.
+
+Usage: python benchmarks/bench_compact.py [set_count] [pieces_per_set]
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.synthetic import generate_catalog, generate_inventory
+from helpers.compact import CompactCatalog, CompactInventory
+from helpers.functions import sort_user_inventory, user_can_build_set, user_can_build_set_if_colors_are_changeable
+
+
+def allocated(build):
+    """
+    Returns what `build` returns, along with the number of bytes still allocated by it afterwards.
+    """
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def main(set_count: int, pieces_per_set: int) -> None:
+    lego_sets, generated_details = generate_catalog(set_count, pieces_per_set, part_count=2000, color_count=60)
+    payload = json.dumps(generated_details)
+    raw_inventory = json.dumps(generate_inventory(part_count=2000, color_count=60, coverage=0.3, max_count=200))
+
+    # Both forms are measured from freshly decoded JSON, as they would be built from upstream payloads.
+    set_details, details_bytes = allocated(lambda: json.loads(payload))
+    catalog, catalog_bytes = allocated(lambda: CompactCatalog(lego_sets, json.loads(payload)))
+    inventory, inventory_bytes = allocated(lambda: sort_user_inventory(json.loads(raw_inventory)))
+    compact_inventory, compact_inventory_bytes = allocated(lambda: CompactInventory(catalog, inventory))
+
+    print(f"{set_count} sets, {pieces_per_set} pieces per set")
+    print(f"  set details: dict {details_bytes / 2 ** 20:8.1f} MiB   compact {catalog_bytes / 2 ** 20:8.1f} MiB")
+    print(f"  inventory:   dict {inventory_bytes / 2 ** 10:8.1f} KiB   compact {compact_inventory_bytes / 2 ** 10:8.1f} KiB")
+
+    pieces = [set_details[set_id]['pieces'] for set_id in catalog.set_ids]
+    checks = (
+        ("exact", lambda: [user_can_build_set(inventory, set_pieces) for set_pieces in pieces],
+         lambda: [catalog.can_build(position, compact_inventory) for position in range(len(pieces))]),
+        ("flexible", lambda: [user_can_build_set_if_colors_are_changeable(inventory, set_pieces) for set_pieces in pieces],
+         lambda: [catalog.can_build_if_colors_are_changeable(position, compact_inventory)
+                  for position in range(len(pieces))]),
+    )
+    for name, dict_check, compact_check in checks:
+        assert dict_check() == compact_check()
+        dict_runs, dict_total = timeit.Timer(dict_check).autorange()
+        compact_runs, compact_total = timeit.Timer(compact_check).autorange()
+        print(f"  {name:<9}  dict {dict_total / dict_runs * 1000:8.2f} ms   "
+              f"compact {compact_total / compact_runs * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, int(sys.argv[2]) if len(sys.argv) > 2 else 100)
@@ -0,0 +1,48 @@
+"""
+Compares the JSON codecs on payloads recorded from the mock upstream: decoding every set-detail payload and the set
+list, as the catalog load does, and encoding a buildable-sets result for the whole catalog, as the resources do.
+
+Usage: python benchmarks/bench_json_codec.py [set_count] [pieces_per_set]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.mock_upstream import build_payloads
+from helpers.json_codec import msgspec, orjson
+
+
+def codecs():
+    yield "stdlib", json.loads, json.dumps
+    if orjson is not None:
+        yield "orjson", orjson.loads, lambda value: orjson.dumps(value).decode()
+    if msgspec is not None:
+        encode = msgspec.json.Encoder().encode
+        yield "msgspec", msgspec.json.Decoder().decode, lambda value: encode(value).decode()
+
+
+def main(set_count: int, pieces_per_set: int) -> None:
+    payloads = build_payloads(set_count, pieces_per_set, part_count=2000, color_count=60, user_count=1)
+    catalog = [body for path, body in payloads.items() if path.startswith("/api/set")]
+    lego_sets = json.loads(payloads["/api/sets"])
+    result = {"buildable_sets": {lego_set['name']: {'id': lego_set['id']} for lego_set in lego_sets['Sets']}}
+
+    print(f"{len(catalog)} catalog payloads, {sum(map(len, catalog)) / 2 ** 20:.1f} MiB")
+    baseline = {}
+    for name, loads, dumps in codecs():
+        timings = {
+            "decode catalog": lambda: [loads(body) for body in catalog],
+            "encode result": lambda: dumps(result),
+        }
+        for task, run in timings.items():
+            runs, _ = timeit.Timer(run).autorange()
+            seconds = min(timeit.Timer(run).repeat(repeat=5, number=runs)) / runs
+            baseline.setdefault(task, seconds)
+            print(f"  {name:<8} {task:<15} {seconds * 1000:9.2f} ms   {baseline[task] / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, int(sys.argv[2]) if len(sys.argv) > 2 else 100)
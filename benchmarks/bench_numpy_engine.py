@@ -0,0 +1,38 @@
+"""
+Compares the exact-match engines on a synthetic catalog.
+
+Usage: python benchmarks/bench_numpy_engine.py [set_count]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.synthetic import generate_catalog, generate_inventory
+from helpers.catalog_index import CatalogIndex
+from helpers.functions import sort_user_inventory, user_can_build_set
+from helpers.numpy_engine import NumpyCatalogIndex
+
+
+def main(set_count: int) -> None:
+    lego_sets, set_details = generate_catalog(set_count, pieces_per_set=40, part_count=400, color_count=20)
+    inventory = sort_user_inventory(generate_inventory(part_count=400, color_count=20, coverage=0.9))
+
+    def scan():
+        return [lego_set['id'] for lego_set in lego_sets['Sets']
+                if user_can_build_set(inventory, set_details[lego_set['id']]['pieces'])]
+
+    index = CatalogIndex(lego_sets, set_details)
+    numpy_index = NumpyCatalogIndex(lego_sets, set_details)
+    assert scan() == index.buildable_set_ids(inventory) == numpy_index.buildable_set_ids(inventory)
+
+    print(f"{set_count} sets, 40 pieces per set, {len(scan())} buildable")
+    for name, run in (("python", scan), ("index", lambda: index.buildable_set_ids(inventory)),
+                      ("numpy", lambda: numpy_index.buildable_set_ids(inventory))):
+        runs, total = timeit.Timer(run).autorange()
+        print(f"  {name:<8}{total / runs * 1000:10.2f} ms per query")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
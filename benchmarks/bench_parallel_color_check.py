@@ -0,0 +1,48 @@
+"""
+Measures how the color-flexible check scales when spread over 1, 2, 4 and 8 worker processes, against checking
+every set in one thread. Worker start-up is left out: the pool is started before timing, as in a running server.
+
+Usage: python benchmarks/bench_parallel_color_check.py [set_count] [pieces_per_set]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.synthetic import generate_catalog, generate_inventory
+from helpers.catalog_index import CatalogIndex
+from helpers.functions import check_color_flexible_sets, sort_user_inventory
+from helpers.parallel import shutdown_process_pool
+
+
+def main(set_count: int, pieces_per_set: int) -> None:
+    lego_sets, set_details = generate_catalog(set_count, pieces_per_set, part_count=400, color_count=20)
+    inventory = sort_user_inventory(generate_inventory(part_count=400, color_count=20, coverage=0.5, max_count=200))
+    catalog_index = CatalogIndex(lego_sets, set_details)
+    set_ids = list(catalog_index.set_names)
+
+    def in_thread():
+        return check_color_flexible_sets(inventory, catalog_index, set_ids)
+
+    def best(run) -> float:
+        runs, _ = timeit.Timer(run).autorange()
+        return min(timeit.Timer(run).repeat(repeat=3, number=runs)) / runs
+
+    print(f"{set_count} sets, {pieces_per_set} pieces per set, {os.cpu_count()} CPUs")
+    expected = in_thread()
+    single = best(in_thread)
+    print(f"  in-thread    {single * 1000:9.2f} ms")
+
+    for processes in (1, 2, 4, 8):
+        def run():
+            return check_color_flexible_sets(inventory, catalog_index, set_ids, processes)
+        # Starts the workers, which load the catalog, before timing.
+        assert run() == expected
+        seconds = best(run)
+        print(f"  {processes} process{'es' if processes > 1 else '  '}  {seconds * 1000:9.2f} ms   {single / seconds:5.2f}x")
+        shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, int(sys.argv[2]) if len(sys.argv) > 2 else 60)
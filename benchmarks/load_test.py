@@ -0,0 +1,135 @@
+"""
+Compares the requests per second of the WSGI app in main.py, served by gunicorn, with the ASGI app in asgi.py, served
+by uvicorn, against the mock upstream. Both servers run the same number of worker processes, so they are compared at
+about equal memory; the resident memory of each server is reported alongside.
+
+Requires gunicorn, uvicorn and the packages in requirements-asgi.txt.
+
+Usage: python benchmarks/load_test.py [workers] [concurrency] [seconds] [latency_ms]
+"""
+import asyncio
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, root)
+
+USER_COUNT = 100
+ENDPOINTS = ("/api/v1.0/buildable-sets/{}", "/api/v1.0/buildable-sets-additional/{}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def resident_memory(pid: int) -> int:
+    """
+    Returns the resident memory in bytes of a process and its children, read from /proc (Linux only).
+    """
+    with open(f"/proc/{pid}/status") as status:
+        rss = next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmRSS:"))
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as children:
+            rss += sum(resident_memory(int(child)) for child in children.read().split())
+    return rss
+
+
+def start_server(command: List[str], port: int, upstream_url: str) -> subprocess.Popen:
+    env = dict(os.environ, UPSTREAM_BASE_URL=upstream_url, CACHE_BACKEND="memory")
+    server = subprocess.Popen(command, cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/v1.0/buildable-sets/user-0", timeout=30)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"{' '.join(command)} did not start")
+
+
+async def run_load(base_url: str, concurrency: int, seconds: float) -> Dict[str, float]:
+    """
+    Sends requests for random users from `concurrency` clients at once for `seconds` seconds.
+    """
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.monotonic() + seconds
+    rng = random.Random(0)
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        while time.monotonic() < deadline:
+            url = base_url + rng.choice(ENDPOINTS).format(f"user-{rng.randrange(USER_COUNT)}")
+            started = time.monotonic()
+            try:
+                response = await client.get(url)
+                ok = response.status_code == 200 and "message" not in response.json()
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.monotonic() - started)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+
+    latencies.sort()
+    return {
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else float("nan"),
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else float("nan"),
+        "errors": errors,
+    }
+
+
+def main(workers: int, concurrency: int, seconds: float, latency_ms: float) -> None:
+    # The mock upstream runs in its own process so that it does not compete with the load generator for the GIL.
+    upstream_port = free_port()
+    upstream = subprocess.Popen([sys.executable, os.path.join(root, "benchmarks", "mock_upstream.py"),
+                                 str(upstream_port), str(latency_ms)], stdout=subprocess.DEVNULL)
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+
+    servers = {
+        "wsgi (gunicorn, 4 threads per worker)": lambda port: [
+            sys.executable, "-m", "gunicorn", "--workers", str(workers), "--threads", "4",
+            "--bind", f"127.0.0.1:{port}", "main:app"],
+        "asgi (uvicorn)": lambda port: [
+            sys.executable, "-m", "uvicorn", "--workers", str(workers), "--port", str(port),
+            "--log-level", "warning", "asgi:app"],
+    }
+
+    print(f"{workers} workers, {concurrency} concurrent clients, {seconds:g} s, {latency_ms:g} ms upstream latency")
+    for name, command in servers.items():
+        port = free_port()
+        server = start_server(command(port), port, upstream_url)
+        try:
+            result = asyncio.run(run_load(f"http://127.0.0.1:{port}", concurrency, seconds))
+            memory = resident_memory(server.pid)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(10)
+        print(f"{name:40} {result['requests_per_second']:8.1f} req/s   p50 {result['p50_ms']:7.1f} ms   "
+              f"p99 {result['p99_ms']:7.1f} ms   errors {result['errors']:4}   rss {memory / 2 ** 20:6.1f} MiB")
+
+    upstream.terminate()
+    upstream.wait(10)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 64,
+         float(sys.argv[3]) if len(sys.argv) > 3 else 10,
+         float(sys.argv[4]) if len(sys.argv) > 4 else 50)
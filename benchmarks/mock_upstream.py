@@ -0,0 +1,122 @@
+"""
+A local stand-in for the upstream API, serving a synthetic catalog and synthetic users with a fixed latency per
+request. Point UPSTREAM_BASE_URL at it to run the app without the real upstream.
+
+Usage: python benchmarks/mock_upstream.py [port] [latency_ms]
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.synthetic import generate_catalog, generate_inventory
+
+
+def build_payloads(set_count: int = 200, pieces_per_set: int = 30, part_count: int = 300, color_count: int = 20,
+                   user_count: int = 100, coverage: float = 0.05, seed: int = 0) -> Dict[str, bytes]:
+    """
+    Builds the response bodies of the upstream API for a synthetic catalog and synthetic users.
+
+    Args:
+        set_count (int, optional): The number of sets in the catalog. Defaults to 200.
+        pieces_per_set (int, optional): The number of piece entries in each set. Defaults to 30.
+        part_count (int, optional): The number of distinct design IDs. Defaults to 300.
+        color_count (int, optional): The number of distinct materials. Defaults to 20.
+        user_count (int, optional): The number of users, named user-0 to user-<user_count - 1>. Defaults to 100.
+        coverage (float, optional): The chance that a user owns a given (designID, material) pair. Defaults to 0.05.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        Dict[str, bytes]: The JSON body served for each request path.
+    """
+    lego_sets, set_details = generate_catalog(set_count, pieces_per_set, part_count, color_count, seed)
+    payloads = {"/api/sets": lego_sets}
+    for set_id, details in set_details.items():
+        payloads[f"/api/set/by-id/{set_id}"] = details
+
+    users = []
+    for number in range(user_count):
+        inventory = generate_inventory(part_count, color_count, coverage, max_count=20, seed=seed + number)
+        user = {'id': f"u{number}", 'username': f"user-{number}",
+                'brickCount': sum(variant['count'] for piece in inventory['collection']
+                                  for variant in piece['variants'])}
+        users.append(user)
+        payloads[f"/api/user/by-username/{user['username']}"] = user
+        payloads[f"/api/user/by-id/{user['id']}"] = dict(user, **inventory)
+    payloads["/api/users"] = {'Users': users}
+
+    return {path: json.dumps(body).encode() for path, body in payloads.items()}
+
+
+class MockUpstreamHandler(BaseHTTPRequestHandler):
+    """
+    Serves `payloads` after sleeping for `latency` seconds, with ETags and 304 answers to If-None-Match.
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which would otherwise stall on delayed ACKs over kept-alive connections.
+    disable_nagle_algorithm = True
+    payloads: Dict[str, bytes] = {}
+    latency: float = 0.0
+
+    def do_GET(self) -> None:
+        time.sleep(self.latency)
+        body = self.payloads.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def serve(port: int, latency: float, payloads: Dict[str, bytes]) -> ThreadingHTTPServer:
+    """
+    Starts the mock upstream on a background thread.
+
+    Args:
+        port (int): The port to listen on, or 0 for any free port.
+        latency (float): The number of seconds each request is delayed by.
+        payloads (Dict[str, bytes]): The bodies to serve, as returned by build_payloads.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Its port is `server.server_address[1]`; stop it with `shutdown`.
+    """
+    handler = type("Handler", (MockUpstreamHandler,), {"payloads": payloads, "latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8001
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    server = serve(port, latency_ms / 1000, build_payloads())
+    print(f"Serving the mock upstream on http://127.0.0.1:{port} with {latency_ms:g} ms latency")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,138 @@
+"""
+Times the hot paths on a synthetic catalog at a configurable scale: sort_user_inventory, user_can_build_set, the
+color-flexible checker, the catalog index, and both endpoints end to end through the Flask app against the mock
+upstream.
+
+Results can be saved as JSON and compared with an earlier run; the script exits with status 1 if any benchmark got
+slower than the tolerance allows. Log output is disabled while timing.
+
+Usage: python benchmarks/suite.py [--sets 2000] [--pieces-per-set 40] [--parts 400] [--colors 20] [--users 20]
+                                  [--coverage 0.5] [--latency-ms 0] [--save results.json] [--compare baseline.json]
+                                  [--tolerance 0.25]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.mock_upstream import build_payloads, serve
+
+
+def measure(run: Callable[[], object], repeat: int = 5) -> float:
+    """
+    Returns the fastest of `repeat` timings of `run`, in seconds per call.
+    """
+    timer = timeit.Timer(run)
+    runs, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=runs)) / runs
+
+
+def benchmarks(args: argparse.Namespace, payloads: Dict[str, bytes],
+               upstream_url: str) -> List[Tuple[str, Callable[[], object]]]:
+    # The app reads UPSTREAM_BASE_URL when it is imported.
+    os.environ["UPSTREAM_BASE_URL"] = upstream_url
+    os.environ["CACHE_BACKEND"] = "memory"
+    import main
+    from helpers import service
+    from helpers.cache_backends import MemoryCacheBackend
+    from helpers.catalog_index import CatalogIndex
+    from helpers.functions import sort_user_inventory, user_can_build_set
+    from helpers.functions import user_can_build_set_if_colors_are_changeable
+
+    lego_sets = json.loads(payloads["/api/sets"])
+    set_details = {lego_set['id']: json.loads(payloads[f"/api/set/by-id/{lego_set['id']}"])
+                   for lego_set in lego_sets['Sets']}
+    raw_inventory = json.loads(payloads["/api/user/by-id/u0"])
+    inventory = sort_user_inventory(raw_inventory)
+    index = CatalogIndex(lego_sets, set_details)
+    candidates = [set_details[set_id]['pieces'] for set_id in index.sets_with_all_parts(inventory)]
+
+    client = main.app.test_client()
+    usernames = [f"user-{number}" for number in range(args.users)]
+
+    def endpoint(path: str, cached: bool) -> Callable[[], object]:
+        def run() -> None:
+            if not cached:
+                service.shared_cache = MemoryCacheBackend(ttl=180)
+                service.result_cache = MemoryCacheBackend(ttl=3600)
+            for username in usernames:
+                response = client.get(path.format(username))
+                assert response.status_code == 200 and "message" not in response.get_json(), response.get_json()
+        return run
+
+    # Loads the catalog and its index once, as a running app would have.
+    endpoint("/api/v1.0/buildable-sets/{}", cached=False)()
+
+    per_user = f"x{len(usernames)} users"
+    return [
+        ("sort_user_inventory", lambda: sort_user_inventory(raw_inventory)),
+        ("user_can_build_set, every set",
+         lambda: [user_can_build_set(inventory, details['pieces']) for details in set_details.values()]),
+        (f"color-flexible checker, {len(candidates)} candidate sets",
+         lambda: [user_can_build_set_if_colors_are_changeable(inventory, pieces) for pieces in candidates]),
+        ("CatalogIndex.buildable_set_ids", lambda: index.buildable_set_ids(inventory)),
+        (f"GET buildable-sets, uncached ({per_user})", endpoint("/api/v1.0/buildable-sets/{}", cached=False)),
+        (f"GET buildable-sets, cached ({per_user})", endpoint("/api/v1.0/buildable-sets/{}", cached=True)),
+        (f"GET buildable-sets-additional, uncached ({per_user})",
+         endpoint("/api/v1.0/buildable-sets-additional/{}", cached=False)),
+        (f"GET buildable-sets-additional, cached ({per_user})",
+         endpoint("/api/v1.0/buildable-sets-additional/{}", cached=True)),
+    ]
+
+
+def main(args: argparse.Namespace) -> int:
+    payloads = build_payloads(args.sets, args.pieces_per_set, args.parts, args.colors, args.users, args.coverage)
+    upstream = serve(0, args.latency_ms / 1000, payloads)
+    logging.disable(logging.CRITICAL)
+    try:
+        suite = benchmarks(args, payloads, f"http://127.0.0.1:{upstream.server_address[1]}")
+        print(f"{args.sets} sets, {args.pieces_per_set} pieces per set, {args.parts} parts, {args.colors} colors, "
+              f"{args.coverage:g} coverage, {args.latency_ms:g} ms upstream latency")
+        results: Dict[str, float] = {}
+        for name, run in suite:
+            results[name] = measure(run)
+            print(f"  {name:<60}{results[name] * 1000:12.3f} ms")
+    finally:
+        logging.disable(logging.NOTSET)
+        upstream.shutdown()
+
+    if args.save:
+        with open(args.save, "w") as output:
+            json.dump({"parameters": vars(args), "results": results}, output, indent=2)
+
+    regressions = 0
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        print(f"Compared with {args.compare}:")
+        for name, seconds in results.items():
+            if name not in baseline:
+                continue
+            ratio = seconds / baseline[name]
+            is_regression = ratio > 1 + args.tolerance
+            regressions += is_regression
+            print(f"  {name:<60}{ratio:8.2f}x{'  REGRESSION' if is_regression else ''}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sets", type=int, default=2000)
+    parser.add_argument("--pieces-per-set", type=int, default=40)
+    parser.add_argument("--parts", type=int, default=400)
+    parser.add_argument("--colors", type=int, default=20)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--coverage", type=float, default=0.5,
+                        help="the chance that a user owns a given (designID, material) pair")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="the slowdown over the baseline reported as a regression, as a fraction")
+    sys.exit(main(parser.parse_args()))
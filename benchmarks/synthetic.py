@@ -0,0 +1,58 @@
+import random
+from typing import Dict, Tuple
+
+
+def generate_catalog(set_count: int, pieces_per_set: int, part_count: int, color_count: int,
+                     seed: int = 0) -> Tuple[Dict, Dict[str, Dict]]:
+    """
+    Generates a synthetic catalog in the shape returned by the upstream API.
+
+    Args:
+        set_count (int): The number of sets in the catalog.
+        pieces_per_set (int): The number of piece entries in each set.
+        part_count (int): The number of distinct design IDs.
+        color_count (int): The number of distinct materials.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        Tuple[Dict, Dict[str, Dict]]: The set list as returned by get_lego_sets, and the details of each set keyed by
+        set id as returned by get_lego_set_details.
+    """
+    rng = random.Random(seed)
+    lego_sets: Dict = {'Sets': []}
+    set_details: Dict[str, Dict] = {}
+
+    for number in range(set_count):
+        set_id = f"set-{number}"
+        pieces = [{'part': {'designID': str(rng.randrange(part_count)), 'material': rng.randrange(color_count)},
+                   'quantity': rng.randint(1, 8)} for _ in range(pieces_per_set)]
+        lego_sets['Sets'].append({'id': set_id, 'name': f"Synthetic Set {number}",
+                                  'totalPieces': sum(piece['quantity'] for piece in pieces)})
+        set_details[set_id] = {'id': set_id, 'name': f"Synthetic Set {number}", 'pieces': pieces}
+
+    return lego_sets, set_details
+
+
+def generate_inventory(part_count: int, color_count: int, coverage: float = 0.8, max_count: int = 40,
+                       seed: int = 0) -> Dict:
+    """
+    Generates a synthetic user inventory in the shape returned by get_user_inventory_details.
+
+    Args:
+        part_count (int): The number of distinct design IDs in the catalog.
+        color_count (int): The number of distinct materials in the catalog.
+        coverage (float, optional): The chance that the user owns a given (designID, material) pair. Defaults to 0.8.
+        max_count (int, optional): The largest number of bricks owned of one pair. Defaults to 40.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        Dict: The inventory, as {'collection': [{'pieceId': str, 'variants': [{'color': str, 'count': int}]}]}.
+    """
+    rng = random.Random(seed)
+    collection = []
+    for part in range(part_count):
+        variants = [{'color': str(color), 'count': rng.randint(1, max_count)}
+                    for color in range(color_count) if rng.random() < coverage]
+        if variants:
+            collection.append({'pieceId': str(part), 'variants': variants})
+    return {'collection': collection}
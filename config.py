@@ -0,0 +1,87 @@
+import os
+
+# Maximum number of set-detail requests find_buildable_sets keeps in flight at once.
+# A value of 1 fetches the sets one at a time.
+SET_DETAILS_MAX_WORKERS: int = int(os.environ.get("SET_DETAILS_MAX_WORKERS", "8"))
+
+# Size and freshness of the process-wide cache for the set list and set details.
+CATALOG_CACHE_MAXSIZE: int = int(os.environ.get("CATALOG_CACHE_MAXSIZE", "10000"))
+CATALOG_CACHE_TTL: float = float(os.environ.get("CATALOG_CACHE_TTL", "3600"))
+
+# Seconds a catalog index built while some set details could not be fetched is served before those sets are tried
+# again.
+PARTIAL_INDEX_TTL: float = float(os.environ.get("PARTIAL_INDEX_TTL", "30"))
+
+# The upstream API serving users, inventories and the catalog.
+UPSTREAM_BASE_URL: str = os.environ.get("UPSTREAM_BASE_URL", "https://d16m5wbro86fg2.cloudfront.net")
+
+# Pooled HTTP session used for every upstream request.
+HTTP_POOL_SIZE: int = int(os.environ.get("HTTP_POOL_SIZE", "32"))
+HTTP_CONNECT_TIMEOUT: float = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT: float = float(os.environ.get("HTTP_READ_TIMEOUT", "10"))
+HTTP_MAX_RETRIES: int = int(os.environ.get("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_FACTOR: float = float(os.environ.get("HTTP_BACKOFF_FACTOR", "0.25"))
+
+# How find_buildable_sets answers a request: "python" checks every set's piece list, "index" uses the
+# precomputed inverted index from (designID, material) to sets, "numpy" additionally answers exact matches
+# with a vectorized requirement matrix (requires the packages in requirements-numpy.txt), and "compact" checks
+# integer-coded piece lists held in flat arrays.
+BUILDABILITY_ENGINE: str = os.environ.get("BUILDABILITY_ENGINE", "index")
+
+# Batch resource: how many users are evaluated concurrently, and from how many users on the results are streamed
+# back as NDJSON.
+BATCH_MAX_WORKERS: int = int(os.environ.get("BATCH_MAX_WORKERS", "8"))
+BATCH_STREAM_THRESHOLD: int = int(os.environ.get("BATCH_STREAM_THRESHOLD", "20"))
+
+# Cache for user data, inventories and computed results: "memory" keeps one cache per process, "sqlite" shares a
+# database file between the workers on a host, and "redis" shares a Redis server between hosts.
+CACHE_BACKEND: str = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_TTL: float = float(os.environ.get("CACHE_TTL", "180"))
+CACHE_SQLITE_PATH: str = os.environ.get("CACHE_SQLITE_PATH", "cache.sqlite3")
+CACHE_REDIS_URL: str = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# In-process cache of computed results, keyed by the contents of the user's inventory and the catalog version.
+RESULT_CACHE_TTL: float = float(os.environ.get("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_MAX_BYTES: int = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Number of users whose buildable sets are kept in memory for the inventory-delta resource, and for how long.
+INCREMENTAL_STATE_MAXSIZE: int = int(os.environ.get("INCREMENTAL_STATE_MAXSIZE", "1000"))
+INCREMENTAL_STATE_TTL: float = float(os.environ.get("INCREMENTAL_STATE_TTL", "3600"))
+
+# A catalog snapshot written with `flask snapshot-catalog`. When the file exists, the set list and set details are
+# read from it instead of the upstream API.
+CATALOG_SNAPSHOT_PATH: str = os.environ.get("CATALOG_SNAPSHOT_PATH", "")
+
+# Whether request timings, upstream latencies and cache counters are recorded and served on /metrics.
+METRICS_ENABLED: bool = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Token that enables profiling a live request when sent in the X-Profile-Token header or the profile_token query
+# parameter. Profiling is off when it is empty. Profiles are written to PROFILE_DIR as pstats files.
+PROFILING_TOKEN: str = os.environ.get("PROFILING_TOKEN", "")
+PROFILE_DIR: str = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_HOTSPOTS: int = int(os.environ.get("PROFILE_HOTSPOTS", "20"))
+
+# Number of worker processes the color-flexible check is spread over when the catalog index is used (the "index"
+# and "numpy" engines), and the fewest sets worth sending to them. Each worker holds a copy of the catalog's piece
+# lists. 0 checks every set in the request thread.
+COLOR_CHECK_PROCESSES: int = int(os.environ.get("COLOR_CHECK_PROCESSES", "0"))
+COLOR_CHECK_MIN_SETS: int = int(os.environ.get("COLOR_CHECK_MIN_SETS", "200"))
+
+# Number of sets the nearly-buildable resource returns by default, and the most a request may ask for.
+NEARLY_BUILDABLE_LIMIT: int = int(os.environ.get("NEARLY_BUILDABLE_LIMIT", "10"))
+NEARLY_BUILDABLE_MAX_LIMIT: int = int(os.environ.get("NEARLY_BUILDABLE_MAX_LIMIT", "100"))
+
+# Seconds between polls of the set list by the background catalog warmer, which prefetches the catalog at startup
+# and rebuilds the index off the request path when the set list changes. 0 leaves loading to the requests.
+CATALOG_WARMER_INTERVAL: float = float(os.environ.get("CATALOG_WARMER_INTERVAL", "0"))
+
+# SQLite database in which upstream payloads are kept across restarts, with their ETags and fetch times. Payloads
+# younger than their max age are read from it, older ones are revalidated with a conditional request. Users and
+# inventories are kept fresh for PAYLOAD_STORE_USER_MAX_AGE seconds, the set list and set details for
+# CATALOG_CACHE_TTL. Empty disables the store.
+PAYLOAD_STORE_PATH: str = os.environ.get("PAYLOAD_STORE_PATH", "")
+PAYLOAD_STORE_USER_MAX_AGE: float = float(os.environ.get("PAYLOAD_STORE_USER_MAX_AGE", "180"))
+
+# JSON library used for upstream payloads, stored payloads and responses: "orjson" or "msgspec" when installed,
+# "stdlib" for the json module, or "auto" for the fastest one available.
+JSON_CODEC: str = os.environ.get("JSON_CODEC", "auto")
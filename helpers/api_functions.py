@@ -1,27 +1,155 @@
 import requests
 import logging
-from typing import Dict, Optional, Any
+import os
+import random
+import time
+from requests.adapters import HTTPAdapter
+from typing import Callable, Dict, Optional, Any
+from config import CATALOG_CACHE_MAXSIZE, CATALOG_CACHE_TTL
+from config import HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR
+from config import CATALOG_SNAPSHOT_PATH, UPSTREAM_BASE_URL, PAYLOAD_STORE_PATH, PAYLOAD_STORE_USER_MAX_AGE
+from helpers.cache import CatalogCache, NOT_MODIFIED
+from helpers import json_codec
+from helpers.metrics import registry, cache_stats_collector, endpoint_label
+from helpers.metrics import upstream_request_duration, upstream_request_errors, upstream_request_retries
+from helpers.payload_store import PayloadStore
+from helpers.snapshot import CatalogSnapshot
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Kept open for the lifetime of the process so that connections to the upstream are reused.
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+session.mount("http://", HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+
+# Shared by every request in the process; the set list and set details rarely change.
+catalog_cache = CatalogCache(maxsize=CATALOG_CACHE_MAXSIZE, ttl=CATALOG_CACHE_TTL)
+registry.register_collector(cache_stats_collector("catalog_cache", catalog_cache.stats))
+
+# Read instead of the upstream when configured; memory-mapped, so every worker shares the same pages.
+catalog_snapshot = CatalogSnapshot(CATALOG_SNAPSHOT_PATH) if os.path.isfile(CATALOG_SNAPSHOT_PATH) else None
+
+# Keeps upstream payloads across restarts when configured, so that a cold process revalidates instead of refetching.
+payload_store = PayloadStore(PAYLOAD_STORE_PATH) if PAYLOAD_STORE_PATH else None
+
+
+def retry_delay(attempt: int, response: Optional[requests.Response] = None) -> float:
+    """
+    Compute how long to wait before retrying a failed request, using exponential backoff with full jitter.
 
+    Args:
+        attempt (int): The number of the attempt that failed, starting at 0.
+        response (Optional[requests.Response], optional): The failed response. A numeric Retry-After header on it
+            is honoured, up to HTTP_READ_TIMEOUT seconds. Defaults to None.
 
-def make_get_request(url: str) -> Optional[requests.Response]:
+    Returns:
+        float: The number of seconds to wait.
+    """
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), HTTP_READ_TIMEOUT)
+    return random.uniform(0, HTTP_BACKOFF_FACTOR * (2 ** attempt))
+
+def make_get_request(url: str, headers: Optional[Dict[str, str]] = None) -> Optional[requests.Response]:
     """
     Send a GET request to the specified URL and return the response object.
 
+    The request goes through the pooled module-level session with connect and read timeouts. Connection errors,
+    timeouts and 429/5xx responses are retried up to HTTP_MAX_RETRIES times.
+
     Args:
         url (str): The URL to send the request to.
+        headers (Optional[Dict[str, str]], optional): Extra request headers. Defaults to None.
 
     Returns:
         Optional[requests.Response]: The response object if the request was successful, 
         otherwise None.
     """
-    with requests.Session() as session:
-        try:
-            response = session.get(url)
-            response.raise_for_status()
-            return response
-        except requests.exceptions.HTTPError as err:
-            logging.error(f"Request error: {err}")
+    endpoint = endpoint_label(url)
+    with upstream_request_duration.time(endpoint):
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            is_last_attempt = attempt == HTTP_MAX_RETRIES
+            try:
+                response = session.get(url, headers=headers, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                if is_last_attempt:
+                    logging.error(f"Request error: {err}")
+                    upstream_request_errors.inc(endpoint)
+                    return None
+                upstream_request_retries.inc(endpoint)
+                time.sleep(retry_delay(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and not is_last_attempt:
+                upstream_request_retries.inc(endpoint)
+                time.sleep(retry_delay(attempt, response))
+                continue
+
+            try:
+                response.raise_for_status()
+                return response
+            except requests.exceptions.HTTPError as err:
+                logging.error(f"Request error: {err}")
+                upstream_request_errors.inc(endpoint)
+                return None
+
+def make_conditional_fetch(url: str, max_age: float = CATALOG_CACHE_TTL) -> Callable[[Optional[str]], Any]:
+    """
+    Build a fetch function for CatalogCache that revalidates an expired entry with If-None-Match.
+
+    When the payload store is enabled, a payload stored less than `max_age` seconds ago is returned without asking
+    the upstream, an older one is revalidated with its stored ETag, and it is served as-is if the upstream cannot
+    be reached.
+
+    Args:
+        url (str): The URL to fetch.
+        max_age (float, optional): How long a stored payload is used without revalidating it. 0 always asks the
+            upstream. Defaults to CATALOG_CACHE_TTL.
+
+    Returns:
+        Callable[[Optional[str]], Any]: A function taking the cached ETag (or None) that returns a (json, etag) tuple,
+        NOT_MODIFIED if the upstream answered 304 to that ETag, or None if the request failed.
+    """
+    def fetch(etag: Optional[str]) -> Any:
+        stored = payload_store.get(url) if payload_store is not None else None
+        if stored is not None and payload_store.is_fresh(stored, max_age):
+            return NOT_MODIFIED if etag is not None and etag == stored.etag else (stored.value, stored.etag)
+
+        sent_etag = etag or (stored.etag if stored is not None else None)
+        headers = {"If-None-Match": sent_etag} if sent_etag else None
+        response = make_get_request(url, headers)
+        if response is None:
+            if stored is not None:
+                logging.warning(f"Serving the stored payload of {url}, fetched at {stored.fetched_at}")
+                return stored.value, stored.etag
             return None
+        if response.status_code == 304:
+            if stored is not None and stored.etag == sent_etag:
+                payload_store.touch(url)
+                if sent_etag != etag:
+                    return stored.value, stored.etag
+            return NOT_MODIFIED
+        value, new_etag = json_codec.loads(response.content), response.headers.get("ETag")
+        if payload_store is not None:
+            payload_store.set(url, value, new_etag)
+        return value, new_etag
+
+    return fetch
+
+def fetch_json(url: str, max_age: float) -> Optional[Any]:
+    """
+    Fetch a JSON payload, through the payload store when it is enabled.
+
+    Args:
+        url (str): The URL to fetch.
+        max_age (float): How long a stored payload is used without revalidating it.
+
+    Returns:
+        Optional[Any]: The payload, or None if the request failed.
+    """
+    result = make_conditional_fetch(url, max_age)(None)
+    return result[0] if result is not None else None
 
 def get_user_data(username: str) -> Optional[Dict[str, Any]]:
     """
@@ -34,26 +162,26 @@ def get_user_data(username: str) -> Optional[Dict[str, Any]]:
         Optional[Dict[str, Any]]: A dictionary containing the user data if the request was successful, 
         otherwise None.
     """
-    endpoint = f"https://d16m5wbro86fg2.cloudfront.net/api/user/by-username/{username}"
-    response = make_get_request(endpoint)
-    if response is not None:
-        return response.json()
-    else:
-        return None
+    endpoint = f"{UPSTREAM_BASE_URL}/api/user/by-username/{username}"
+    return fetch_json(endpoint, PAYLOAD_STORE_USER_MAX_AGE)
 
-def get_lego_sets() -> Dict[str, Any]:
+def get_lego_sets(use_snapshot: bool = True) -> Dict[str, Any]:
     """
     Retrieve a list of Lego sets from the web service.
 
+    The result is served from the catalog snapshot if one is loaded, otherwise from the process-wide catalog cache,
+    and must not be modified.
+
+    Args:
+        use_snapshot (bool, optional): Whether the catalog snapshot may be used. Defaults to True.
+
     Returns:
         Dict[str, Any]: A dictionary containing information about Lego sets.
     """
-    endpoint = "https://d16m5wbro86fg2.cloudfront.net/api/sets"
-    response = make_get_request(endpoint)
-    if response is not None:
-        return response.json()
-    else:
-        return None
+    if use_snapshot and catalog_snapshot is not None:
+        return catalog_snapshot.lego_sets()
+    endpoint = f"{UPSTREAM_BASE_URL}/api/sets"
+    return catalog_cache.get(endpoint, make_conditional_fetch(endpoint))
 
 def get_user_inventory_details(user_data) -> Dict[str, Any]:
     """
@@ -65,27 +193,27 @@ def get_user_inventory_details(user_data) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: A dictionary containing information about the user's Lego inventory.
     """
-    endpoint = f"https://d16m5wbro86fg2.cloudfront.net/api/user/by-id/{user_data['id']}"
-    response = make_get_request(endpoint)
-    if response is not None:
-        return response.json()
-    else:
-        return None
+    endpoint = f"{UPSTREAM_BASE_URL}/api/user/by-id/{user_data['id']}"
+    return fetch_json(endpoint, PAYLOAD_STORE_USER_MAX_AGE)
 
-def get_lego_set_details(lego_set_id: str) -> Dict:
+def get_lego_set_details(lego_set_id: str, use_snapshot: bool = True) -> Dict:
     """
     Retrieve the details of the specified Lego set.
 
+    The result is served from the catalog snapshot if one is loaded and holds the set, otherwise from the
+    process-wide catalog cache, and must not be modified.
+
     Args:
         lego_set_id (str): The ID of the Lego set to retrieve details for.
+        use_snapshot (bool, optional): Whether the catalog snapshot may be used. Defaults to True.
 
     Returns:
         Dict: A dictionary containing details about the Lego set.
     """
-    endpoint = f"https://d16m5wbro86fg2.cloudfront.net/api/set/by-id/{lego_set_id}"
-    response = make_get_request(endpoint)
-    if response is not None:
-        return response.json()
-    else:
-        return None
+    if use_snapshot and catalog_snapshot is not None:
+        lego_set_details = catalog_snapshot.set_details(lego_set_id)
+        if lego_set_details is not None:
+            return lego_set_details
+    endpoint = f"{UPSTREAM_BASE_URL}/api/set/by-id/{lego_set_id}"
+    return catalog_cache.get(endpoint, make_conditional_fetch(endpoint))
 
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+import httpx
+from config import CATALOG_CACHE_MAXSIZE, CATALOG_CACHE_TTL, UPSTREAM_BASE_URL
+from config import HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_RETRIES
+from helpers.api_functions import RETRY_STATUS_CODES, catalog_snapshot, retry_delay
+from helpers.cache import AsyncCatalogCache, NOT_MODIFIED
+from helpers import json_codec
+
+# Shared by every request handled by the event loop; the set list and set details rarely change.
+catalog_cache = AsyncCatalogCache(maxsize=CATALOG_CACHE_MAXSIZE, ttl=CATALOG_CACHE_TTL)
+
+
+def create_client() -> httpx.AsyncClient:
+    """
+    Create the pooled async HTTP client used for every upstream request, with the same pool size and timeouts as
+    the session in api_functions.
+
+    Returns:
+        httpx.AsyncClient: The client. It must be closed with `aclose` when the application shuts down.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT))
+
+
+async def make_get_request(client: httpx.AsyncClient, url: str,
+                           headers: Optional[Dict[str, str]] = None) -> Optional[httpx.Response]:
+    """
+    Send a GET request to the specified URL and return the response object.
+
+    Connection errors, timeouts and 429/5xx responses are retried up to HTTP_MAX_RETRIES times, waiting without
+    blocking the event loop.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        url (str): The URL to send the request to.
+        headers (Optional[Dict[str, str]], optional): Extra request headers. Defaults to None.
+
+    Returns:
+        Optional[httpx.Response]: The response object if the request was successful, otherwise None.
+    """
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        is_last_attempt = attempt == HTTP_MAX_RETRIES
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.TransportError as err:
+            if is_last_attempt:
+                logging.error(f"Request error: {err}")
+                return None
+            await asyncio.sleep(retry_delay(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUS_CODES and not is_last_attempt:
+            await asyncio.sleep(retry_delay(attempt, response))
+            continue
+
+        if response.is_error:
+            logging.error(f"Request error: {response.status_code} for url: {url}")
+            return None
+        return response
+
+
+def make_conditional_fetch(client: httpx.AsyncClient, url: str) -> Callable[[Optional[str]], Awaitable[Any]]:
+    """
+    Build a fetch function for AsyncCatalogCache that revalidates an expired entry with If-None-Match.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        url (str): The URL to fetch.
+
+    Returns:
+        Callable[[Optional[str]], Awaitable[Any]]: A coroutine function taking the cached ETag (or None) that returns
+        a (json, etag) tuple, NOT_MODIFIED if the upstream answered 304, or None if the request failed.
+    """
+    async def fetch(etag: Optional[str]) -> Any:
+        headers = {"If-None-Match": etag} if etag else None
+        response = await make_get_request(client, url, headers)
+        if response is None:
+            return None
+        if response.status_code == 304:
+            return NOT_MODIFIED
+        return json_codec.loads(response.content), response.headers.get("ETag")
+
+    return fetch
+
+
+async def get_user_data(client: httpx.AsyncClient, username: str) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve the user data for the specified username.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        username (str): The username of the user to retrieve data for.
+
+    Returns:
+        Optional[Dict[str, Any]]: A dictionary containing the user data if the request was successful,
+        otherwise None.
+    """
+    response = await make_get_request(client, f"{UPSTREAM_BASE_URL}/api/user/by-username/{username}")
+    return json_codec.loads(response.content) if response is not None else None
+
+
+async def get_lego_sets(client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve a list of Lego sets, from the catalog snapshot if one is loaded and from the catalog cache otherwise.
+    The result must not be modified.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+
+    Returns:
+        Optional[Dict[str, Any]]: A dictionary containing information about Lego sets, or None if the request failed.
+    """
+    if catalog_snapshot is not None:
+        return catalog_snapshot.lego_sets()
+    endpoint = f"{UPSTREAM_BASE_URL}/api/sets"
+    return await catalog_cache.get(endpoint, make_conditional_fetch(client, endpoint))
+
+
+async def get_user_inventory_details(client: httpx.AsyncClient, user_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve the user's Lego inventory details.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        user_data (Dict[str, Any]): A dictionary containing the user data.
+
+    Returns:
+        Optional[Dict[str, Any]]: A dictionary containing information about the user's Lego inventory, or None if the
+        request failed.
+    """
+    response = await make_get_request(client, f"{UPSTREAM_BASE_URL}/api/user/by-id/{user_data['id']}")
+    return json_codec.loads(response.content) if response is not None else None
+
+
+async def get_lego_set_details(client: httpx.AsyncClient, lego_set_id: str) -> Optional[Dict]:
+    """
+    Retrieve the details of the specified Lego set, from the catalog snapshot if it holds the set and from the
+    catalog cache otherwise. The result must not be modified.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        lego_set_id (str): The ID of the Lego set to retrieve details for.
+
+    Returns:
+        Optional[Dict]: A dictionary containing details about the Lego set, or None if the request failed.
+    """
+    if catalog_snapshot is not None:
+        lego_set_details = catalog_snapshot.set_details(lego_set_id)
+        if lego_set_details is not None:
+            return lego_set_details
+    endpoint = f"{UPSTREAM_BASE_URL}/api/set/by-id/{lego_set_id}"
+    return await catalog_cache.get(endpoint, make_conditional_fetch(client, endpoint))
@@ -0,0 +1,263 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Returned by a fetch function when the upstream answered 304 Not Modified to a conditional request.
+NOT_MODIFIED = object()
+
+
+class _CacheEntry:
+    __slots__ = ('value', 'etag', 'expires_at')
+
+    def __init__(self, value: Any, etag: Optional[str], expires_at: float):
+        self.value = value
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _AsyncFlight:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers arriving while a call for their key is in flight wait for it
+    and share its result, or its exception, instead of running their own.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Returns the result of `compute`, or of the call already in flight for `key`.
+
+        Args:
+            key (Hashable): Identifies calls that give the same result.
+            compute (Callable[[], Any]): Produces the result.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it was shared from a call made by another caller.
+        """
+        with self._lock:
+            flight = self._in_flight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._in_flight[key] = _Flight()
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+
+        try:
+            flight.value = compute()
+        except Exception as err:
+            flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+        return flight.value, False
+
+
+class CatalogCache:
+    """
+    A thread-safe cache for upstream payloads with a time-to-live, size-bounded LRU eviction, ETag revalidation
+    and single-flight deduplication of concurrent misses.
+
+    Expired entries are kept until they are evicted so that their ETag can be sent along with the next fetch.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            maxsize (int): The maximum number of entries kept in the cache.
+            ttl (float): The number of seconds an entry is served without asking the upstream again.
+            timer (Callable[[], float], optional): The clock used for expiry. Defaults to time.monotonic.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+        self._in_flight: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            'hits': 0, 'misses': 0, 'revalidations': 0, 'evictions': 0, 'coalesced': 0}
+
+    def get(self, key: Hashable, fetch: Callable[[Optional[str]], Any]) -> Any:
+        """
+        Returns the cached value for `key`, calling `fetch` if the entry is missing or expired.
+
+        Only one call to `fetch` per key is in flight at a time; callers arriving meanwhile wait for its result.
+
+        Args:
+            key (Hashable): The cache key.
+            fetch (Callable[[Optional[str]], Any]): Called with the ETag of the expired entry, or None. It returns a
+                (value, etag) tuple, NOT_MODIFIED if the expired entry is still current, or None if the fetch failed.
+                Failed fetches are not cached.
+
+        Returns:
+            Any: The cached or freshly fetched value, or None if the fetch failed.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > self._timer():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry.value
+
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                self._stats['coalesced'] += 1
+                is_leader = False
+            else:
+                flight = self._in_flight[key] = _Flight()
+                self._stats['misses'] += 1
+                is_leader = True
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            result = fetch(entry.etag if entry is not None else None)
+            flight.value = self._store(key, entry, result)
+        except Exception as err:
+            flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+        return flight.value
+
+    def _store(self, key: Hashable, entry: Optional[_CacheEntry], result: Any) -> Any:
+        with self._lock:
+            if result is NOT_MODIFIED:
+                if entry is None:
+                    return None
+                self._stats['revalidations'] += 1
+                entry.expires_at = self._timer() + self.ttl
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                return entry.value
+
+            if result is None:
+                return None
+
+            value, etag = result
+            self._entries[key] = _CacheEntry(value, etag, self._timer() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, etag: Optional[str] = None) -> None:
+        """
+        Stores a value fetched outside the cache, e.g. by a background refresher, as if it had just been fetched.
+
+        Args:
+            key (Hashable): The cache key.
+            value (Any): The value.
+            etag (Optional[str], optional): The ETag the upstream sent with it. Defaults to None.
+        """
+        self._store(key, None, (value, etag))
+
+    def clear(self) -> None:
+        """
+        Removes every entry from the cache. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit, miss, revalidation, eviction and coalesced-call counters along with the current size.
+
+        Returns:
+            Dict[str, int]: The cache counters.
+        """
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), maxsize=self.maxsize)
+
+
+class AsyncCatalogCache(CatalogCache):
+    """
+    A CatalogCache for use from an asyncio event loop, whose `get` is a coroutine awaiting an async fetch function.
+
+    Concurrent misses for the same key within the event loop share one fetch. An instance must only be used from
+    one event loop.
+    """
+
+    async def get(self, key: Hashable, fetch: Callable[[Optional[str]], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached value for `key`, awaiting `fetch` if the entry is missing or expired.
+
+        Args:
+            key (Hashable): The cache key.
+            fetch (Callable[[Optional[str]], Awaitable[Any]]): Called with the ETag of the expired entry, or None, and
+                awaited. See CatalogCache.get for what it returns.
+
+        Returns:
+            Any: The cached or freshly fetched value, or None if the fetch failed.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > self._timer():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry.value
+
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                self._stats['coalesced'] += 1
+                is_leader = False
+            else:
+                flight = self._in_flight[key] = _AsyncFlight()
+                self._stats['misses'] += 1
+                is_leader = True
+
+        if not is_leader:
+            await flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            result = await fetch(entry.etag if entry is not None else None)
+            flight.value = self._store(key, entry, result)
+        except BaseException as err:
+            # Also covers the leader being cancelled, so that waiters are not left hanging.
+            flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+        return flight.value
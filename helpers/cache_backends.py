@@ -0,0 +1,252 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from cachetools import LRUCache
+
+from helpers import json_codec
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional
+    redis = None
+
+
+def versioned_key(catalog_revision: Optional[str], *parts: str) -> str:
+    """
+    Builds a cache key, prefixed with the catalog revision it was computed against so that entries made for an older
+    catalog are never read again.
+
+    Args:
+        catalog_revision (Optional[str]): The catalog version, or None for entries that do not depend on the catalog.
+        *parts (str): The remaining key components, e.g. ("user", "brickfan35").
+
+    Returns:
+        str: The cache key.
+    """
+    return ":".join(("lego", catalog_revision or "any") + parts)
+
+
+class CacheBackend:
+    """
+    Base class for the caches holding user data, inventories and computed results. Values must be JSON-serializable
+    so that they can be shared between processes.
+    """
+
+    def __init__(self, ttl: float):
+        """
+        Args:
+            ttl (float): The default number of seconds an entry is kept.
+        """
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the value stored under `key`, or None if there is none or it has expired.
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Stores `value` under `key` for `ttl` seconds, or for the backend's default time-to-live.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """
+        Removes the value stored under `key`, if any.
+        """
+        raise NotImplementedError
+
+    def get_or_set(self, key: str, fetch: Callable[[], Any], ttl: Optional[float] = None) -> Optional[Any]:
+        """
+        Returns the value stored under `key`, calling `fetch` and storing its result on a miss. None results are not
+        stored.
+
+        Args:
+            key (str): The cache key.
+            fetch (Callable[[], Any]): Computes the value on a miss.
+            ttl (Optional[float], optional): The time-to-live of a new entry. Defaults to the backend's.
+
+        Returns:
+            Optional[Any]: The cached or freshly computed value.
+        """
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    A per-process LRU cache with a time-to-live per entry, bounded either by its number of entries or by the total
+    size of its values.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1000, timer: Callable[[], float] = time.monotonic,
+                 max_bytes: Optional[int] = None):
+        """
+        Args:
+            ttl (float): The default number of seconds an entry is kept.
+            maxsize (int, optional): The maximum number of entries. Defaults to 1000.
+            timer (Callable[[], float], optional): The clock used for expiry. Defaults to time.monotonic.
+            max_bytes (Optional[int], optional): If given, the cache is bounded by the total size of its values
+                instead, measured as the length of their JSON encoding. Defaults to None.
+        """
+        super().__init__(ttl)
+        if max_bytes is None:
+            self._entries = LRUCache(maxsize=maxsize)
+        else:
+            self._entries = LRUCache(maxsize=max_bytes, getsizeof=lambda entry: len(json_codec.dumps(entry[1])))
+        self._lock = threading.Lock()
+        self._timer = timer
+
+    @property
+    def currsize(self) -> float:
+        """
+        The number of entries, or the total size of the values when the cache is bounded by size.
+        """
+        return self._entries.currsize
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self._timer():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            try:
+                self._entries[key] = (self._timer() + (self.ttl if ttl is None else ttl), value)
+            except ValueError:
+                # The value alone is larger than the whole cache.
+                self._entries.pop(key, None)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    A cache stored in an SQLite database file, shared by every worker process on the host.
+    """
+
+    # Expired rows are deleted once every this many writes.
+    PURGE_INTERVAL = 256
+
+    def __init__(self, ttl: float, path: str):
+        """
+        Args:
+            ttl (float): The default number of seconds an entry is kept.
+            path (str): The path of the database file. It is created if it does not exist.
+        """
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        # Writes come from every request thread, each with its own connection.
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=30)
+        return connection
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return json_codec.loads(row[0]) if row is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        connection = self._connection()
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._writes_lock:
+            self._writes += 1
+            purge = self._writes % self.PURGE_INTERVAL == 0
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                               (key, json_codec.dumps(value), expires_at))
+            if purge:
+                connection.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key: str) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    A cache kept in a Redis-protocol server, shared by every worker on every host.
+    """
+
+    def __init__(self, ttl: float, client: Any):
+        """
+        Args:
+            ttl (float): The default number of seconds an entry is kept.
+            client (Any): A client with the get, set(ex=...) and delete methods of redis.Redis.
+        """
+        super().__init__(ttl)
+        self.client = client
+
+    @classmethod
+    def from_url(cls, ttl: float, url: str) -> "RedisCacheBackend":
+        """
+        Connects to the server at `url`, e.g. redis://localhost:6379/0.
+
+        Raises:
+            ImportError: If the redis package is not installed.
+        """
+        if redis is None:
+            raise ImportError("The redis cache backend requires the redis package to be installed.")
+        return cls(ttl, redis.Redis.from_url(url))
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(key)
+        return json_codec.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.client.set(key, json_codec.dumps(value), ex=max(1, int(self.ttl if ttl is None else ttl)))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+
+def create_cache_backend(name: str, ttl: float, sqlite_path: str = "", redis_url: str = "") -> CacheBackend:
+    """
+    Creates the cache backend selected in the configuration.
+
+    Args:
+        name (str): "memory", "sqlite" or "redis".
+        ttl (float): The default number of seconds an entry is kept.
+        sqlite_path (str, optional): The database file of the sqlite backend.
+        redis_url (str, optional): The server URL of the redis backend.
+
+    Returns:
+        CacheBackend: The backend.
+
+    Raises:
+        ValueError: If the name is not a known backend.
+    """
+    if name == "memory":
+        return MemoryCacheBackend(ttl)
+    if name == "sqlite":
+        return SQLiteCacheBackend(ttl, sqlite_path)
+    if name == "redis":
+        return RedisCacheBackend.from_url(ttl, redis_url)
+    raise ValueError(f"Unknown cache backend: {name}")
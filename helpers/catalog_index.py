@@ -0,0 +1,373 @@
+import hashlib
+import heapq
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import COLOR_CHECK_PROCESSES, PARTIAL_INDEX_TTL
+from helpers.cache import SingleFlight
+from helpers.functions import check_color_flexible_sets, fetch_lego_set_details
+from helpers.metrics import sets_checked
+
+PartColor = Tuple[str, str]
+
+# The buildability engines that answer requests from an index of the catalog rather than by scanning every set.
+INDEX_ENGINES = ("index", "numpy", "compact")
+
+
+# The versions of the set lists seen last, by id(). Each entry holds on to its set list, so that the id is not reused
+# by another object while the entry is kept.
+_versions: "OrderedDict[int, Tuple[Dict, str]]" = OrderedDict()
+_versions_lock = threading.Lock()
+_VERSIONS_KEPT = 8
+
+
+def catalog_version(lego_sets: Dict) -> str:
+    """
+    Computes a version string for a catalog, which changes whenever the list of sets returned by the upstream changes.
+
+    The set list is hashed once per object: the cached set list is shared by every request, so later calls for it
+    return the kept version without serializing the catalog again. Set lists must not be modified once hashed, as
+    get_lego_sets already requires.
+
+    Args:
+        lego_sets (Dict): A dictionary containing information about LEGO sets, where the 'Sets' key holds a list of sets.
+
+    Returns:
+        str: A hex digest of the catalog contents.
+    """
+    with _versions_lock:
+        entry = _versions.get(id(lego_sets))
+        if entry is not None and entry[0] is lego_sets:
+            _versions.move_to_end(id(lego_sets))
+            return entry[1]
+
+    version = hashlib.sha1(json.dumps(lego_sets, sort_keys=True).encode()).hexdigest()
+    with _versions_lock:
+        _versions[id(lego_sets)] = (lego_sets, version)
+        _versions.move_to_end(id(lego_sets))
+        while len(_versions) > _VERSIONS_KEPT:
+            _versions.popitem(last=False)
+    return version
+
+
+class CatalogIndex:
+    """
+    An inverted index from each (designID, material) pair to the sets that need it and in what quantity.
+
+    Answering a buildability query with the index costs time proportional to the user's inventory rather than to
+    the total number of pieces in the catalog.
+    """
+
+    def __init__(self, lego_sets: Dict, set_details: Dict[str, Dict], failed_sets: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            lego_sets (Dict): A dictionary containing information about LEGO sets, where the 'Sets' key holds a list of sets.
+            set_details (Dict[str, Dict]): The details of each set keyed by set id, as returned by get_lego_set_details.
+                Sets without details are left out of the index.
+            failed_sets (Optional[Dict[str, str]], optional): The sets whose details could not be fetched, mapped to
+                the reason. Defaults to None.
+        """
+        self.version: str = catalog_version(lego_sets)
+        self.failed_sets: Dict[str, str] = dict(failed_sets or {})
+        self.set_names: Dict[str, str] = {}
+        self.positions: Dict[str, int] = {}
+        self.requirements: Dict[PartColor, Dict[str, int]] = defaultdict(dict)
+        self.part_sets: Dict[str, Set[str]] = defaultdict(set)
+        self.requirement_counts: Dict[str, int] = {}
+        self.part_counts: Dict[str, int] = {}
+        self.brick_counts: Dict[str, int] = {}
+        self._pieces: Optional[Dict[str, List[Dict]]] = None
+
+        for lego_set in lego_sets['Sets']:
+            set_id = lego_set['id']
+            if set_id not in set_details:
+                continue
+            self.positions[set_id] = len(self.set_names)
+            self.set_names[set_id] = lego_set['name']
+            required: Set[PartColor] = set()
+            for lego in set_details[set_id]['pieces']:
+                key = (lego['part']['designID'], str(lego['part']['material']))
+                postings = self.requirements[key]
+                # Every entry is checked on its own in user_can_build_set, so the largest one decides.
+                postings[set_id] = max(postings.get(set_id, 0), lego['quantity'])
+                required.add(key)
+            parts = {part for part, _ in required}
+            for part in parts:
+                self.part_sets[part].add(set_id)
+            self.requirement_counts[set_id] = len(required)
+            self.part_counts[set_id] = len(parts)
+            self.brick_counts[set_id] = sum(self.requirements[key][set_id] for key in required)
+
+    def buildable_set_ids(self, user_inventory: Dict[str, Dict[str, int]]) -> List[str]:
+        """
+        Finds the sets the user can build from their inventory without changing any colors.
+
+        Gives the same answer as running user_can_build_set on every indexed set.
+
+        Args:
+            user_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+
+        Returns:
+            List[str]: The ids of the buildable sets, in catalog order.
+        """
+        if not user_inventory:
+            return []
+
+        satisfied: Dict[str, int] = defaultdict(int)
+        for part, colors in user_inventory.items():
+            for color, count in colors.items():
+                for set_id, quantity in self.requirements.get((part, color), {}).items():
+                    if quantity <= count:
+                        satisfied[set_id] += 1
+
+        return [set_id for set_id in self.set_names if satisfied[set_id] == self.requirement_counts[set_id]]
+
+    def sets_with_all_parts(self, user_inventory: Dict[str, Dict[str, int]]) -> List[str]:
+        """
+        Finds the sets for which the user owns every part in at least one color. Any other set needs a part the
+        user lacks entirely and cannot be built even when colors are changeable.
+
+        Args:
+            user_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+
+        Returns:
+            List[str]: The ids of the candidate sets, in catalog order.
+        """
+        if not user_inventory:
+            return []
+
+        parts_present: Dict[str, int] = defaultdict(int)
+        for part in user_inventory:
+            for set_id in self.part_sets.get(part, ()):
+                parts_present[set_id] += 1
+
+        return [set_id for set_id in self.set_names if parts_present[set_id] == self.part_counts[set_id]]
+
+    def pieces(self, set_id: str) -> List[Dict]:
+        """
+        Rebuilds a set's piece list from the index, with one entry per (designID, material) pair holding the largest
+        quantity any entry of the set needs. The checkers in helpers.functions give the same answer for it as for the
+        set's full piece list.
+
+        The piece lists of all sets are rebuilt on the first call and kept on the index.
+
+        Args:
+            set_id (str): The id of an indexed set.
+
+        Returns:
+            List[Dict]: The pieces, as in the set's details.
+        """
+        if self._pieces is None:
+            pieces: Dict[str, List[Dict]] = {set_id: [] for set_id in self.set_names}
+            for (part, color), postings in self.requirements.items():
+                for posting_set_id, quantity in postings.items():
+                    pieces[posting_set_id].append({'part': {'designID': part, 'material': color}, 'quantity': quantity})
+            self._pieces = pieces
+        return self._pieces[set_id]
+
+    def color_flexible_set_ids(self, user_inventory: Dict[str, Dict[str, int]]) -> List[str]:
+        """
+        Finds the sets the user can build only by changing colors, in catalog order. The sets from sets_with_all_parts
+        are checked against the piece lists rebuilt by pieces, spread over COLOR_CHECK_PROCESSES worker processes, so
+        no set details are fetched.
+
+        Args:
+            user_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+
+        Returns:
+            List[str]: The ids of the sets in catalog order.
+        """
+        candidates = self.sets_with_all_parts(user_inventory)
+        sets_checked.observe(len(candidates), "color-flexible")
+        results = check_color_flexible_sets(user_inventory, self, candidates, COLOR_CHECK_PROCESSES)
+        return [set_id for set_id, is_buildable in zip(candidates, results) if is_buildable]
+
+    def nearly_buildable_set_ids(self, user_inventory: Dict[str, Dict[str, int]], limit: int,
+                                 rank_by: str = "missing") -> List[Tuple[str, int, int]]:
+        """
+        Ranks the sets the user cannot build yet by how close they are, keeping only the best `limit` in a bounded
+        heap instead of sorting the whole catalog.
+
+        The bricks the user already covers are summed from the postings of their inventory, so the cost is
+        proportional to the inventory plus one pass over the sets.
+
+        Args:
+            user_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+            limit (int): The number of sets to return.
+            rank_by (str, optional): "missing" ranks by fewest missing bricks, "coverage" by the largest fraction
+                of the set's bricks the user owns. Ties keep catalog order. Defaults to "missing".
+
+        Returns:
+            List[Tuple[str, int, int]]: The id, the number of missing bricks and the number of bricks needed of each
+            set, closest first.
+        """
+        covered: Dict[str, int] = defaultdict(int)
+        requirements = self.requirements
+        for part, colors in user_inventory.items():
+            for color, count in colors.items():
+                postings = requirements.get((part, color)) if count > 0 else None
+                if postings:
+                    for set_id, quantity in postings.items():
+                        covered[set_id] += quantity if quantity < count else count
+
+        candidates = ((position, set_id, total - covered.get(set_id, 0), total)
+                      for position, (set_id, total) in enumerate(self.brick_counts.items())
+                      if total > covered.get(set_id, 0))
+        if rank_by == "coverage":
+            ranked = heapq.nsmallest(limit, candidates, key=lambda entry: (entry[2] / entry[3], entry[0]))
+        else:
+            ranked = heapq.nsmallest(limit, candidates, key=lambda entry: (entry[2], entry[0]))
+        return [(set_id, missing, total) for _, set_id, missing, total in ranked]
+
+    def missing_pieces(self, set_id: str, user_inventory: Dict[str, Dict[str, int]]) -> List[Dict]:
+        """
+        Lists the bricks of a set the user is short of, comparing each piece with the inventory as
+        user_can_build_set does.
+
+        Args:
+            set_id (str): The id of an indexed set.
+            user_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+
+        Returns:
+            List[Dict]: {'designID': str, 'material': str, 'needed': int, 'owned': int, 'missing': int} for each
+            (designID, material) pair the user has too few of.
+        """
+        missing_pieces: List[Dict] = []
+        for lego in self.pieces(set_id):
+            design_id, material = lego['part']['designID'], lego['part']['material']
+            owned = max(user_inventory.get(design_id, {}).get(material, 0), 0)
+            if owned < lego['quantity']:
+                missing_pieces.append({'designID': design_id, 'material': material, 'needed': lego['quantity'],
+                                       'owned': owned, 'missing': lego['quantity'] - owned})
+        return missing_pieces
+
+
+_index_lock = threading.Lock()
+_current_index: Optional[CatalogIndex] = None
+# The index replaced last, kept for requests that read the set list just before a new one was published.
+_previous_index: Optional[CatalogIndex] = None
+# An index built while some set details could not be fetched, and the time.monotonic() until which it is served.
+_partial_index: Optional[Tuple[Any, float]] = None
+# Requests missing the same index wait for one build instead of each fetching the catalog.
+_index_builds = SingleFlight()
+
+
+def catalog_index_class(engine: str) -> type:
+    """
+    Returns the class that builds the index for a buildability engine.
+
+    Args:
+        engine (str): "index" for a CatalogIndex, "numpy" for a NumpyCatalogIndex, or "compact" for a CompactCatalog.
+            The numpy engine falls back to a CatalogIndex when numpy is not installed.
+
+    Returns:
+        type: The index class, constructed with (lego_sets, set_details, failed_sets).
+    """
+    if engine == "compact":
+        from helpers.compact import CompactCatalog
+        return CompactCatalog
+    if engine == "numpy":
+        from helpers.numpy_engine import NumpyCatalogIndex, np
+        if np is not None:
+            return NumpyCatalogIndex
+        logging.warning("numpy is not installed, falling back to the index buildability engine.")
+    return CatalogIndex
+
+
+def get_catalog_index(lego_sets: Dict, max_workers: int = 1, engine: str = "index"):
+    """
+    Returns the index for the given catalog, building it only when the catalog version or the engine has changed.
+
+    The set details are fetched outside the lock guarding the kept indexes, and concurrent calls missing the same
+    index share one build. An index built while some set details could not be fetched is kept for
+    PARTIAL_INDEX_TTL seconds, after which the next call tries those sets again.
+
+    Args:
+        lego_sets (Dict): A dictionary containing information about LEGO sets, where the 'Sets' key holds a list of sets.
+        max_workers (int, optional): The maximum number of set details fetched concurrently. Defaults to 1.
+        engine (str, optional): "index" for a CatalogIndex, "numpy" for a NumpyCatalogIndex, or "compact" for a
+            CompactCatalog. The numpy engine falls back to a CatalogIndex when numpy is not installed.
+            Defaults to "index".
+
+    Returns:
+        CatalogIndex or CompactCatalog: The index for `lego_sets`.
+    """
+    index_class = catalog_index_class(engine)
+    version = catalog_version(lego_sets)
+    index = find_catalog_index(index_class, version)
+    if index is None:
+        index, _ = _index_builds.do(
+            (index_class, version), lambda: _build_index(index_class, version, lego_sets, max_workers))
+    return index
+
+
+def find_catalog_index(index_class: type, version: str):
+    """
+    Returns the kept index of the given class for a catalog version, or None if there is none or it has expired.
+
+    Args:
+        index_class (type): The index class, as returned by catalog_index_class.
+        version (str): The catalog version, as returned by catalog_version.
+
+    Returns:
+        CatalogIndex or CompactCatalog: The index, or None.
+    """
+    with _index_lock:
+        for index in (_current_index, _previous_index):
+            if type(index) is index_class and index.version == version:
+                return index
+        if _partial_index is not None:
+            index, expires_at = _partial_index
+            if type(index) is index_class and index.version == version and expires_at > time.monotonic():
+                return index
+    return None
+
+
+def _build_index(index_class: type, version: str, lego_sets: Dict, max_workers: int):
+    # Another build for this catalog may have finished between the caller's lookup and this one starting.
+    index = find_catalog_index(index_class, version)
+    if index is not None:
+        return index
+
+    set_details, failed_sets = fetch_lego_set_details(lego_sets, max_workers)
+    index = index_class(lego_sets, set_details, failed_sets)
+    store_catalog_index(index)
+    return index
+
+
+def store_catalog_index(index) -> None:
+    """
+    Keeps an index built for a request, for find_catalog_index to return. An index built while some set details could
+    not be fetched is only returned for PARTIAL_INDEX_TTL seconds.
+
+    Args:
+        index (CatalogIndex or CompactCatalog): The index.
+    """
+    global _partial_index
+    with _index_lock:
+        if index.failed_sets:
+            _partial_index = (index, time.monotonic() + PARTIAL_INDEX_TTL)
+        else:
+            _keep_index(index)
+
+
+def _keep_index(index) -> None:
+    global _current_index, _previous_index
+    if index is not _current_index:
+        _previous_index, _current_index = _current_index, index
+
+
+def publish_catalog_index(index) -> None:
+    """
+    Makes an index built outside get_catalog_index, e.g. by the catalog warmer, the one requests are answered with.
+    Requests holding the previous set list keep getting the previous index.
+
+    Args:
+        index (CatalogIndex or CompactCatalog): The index. Requests report the sets it lists as failed.
+    """
+    with _index_lock:
+        _keep_index(index)
@@ -0,0 +1,205 @@
+from array import array
+from typing import Dict, Hashable, List, Optional
+
+from helpers.catalog_index import catalog_version
+from helpers.functions import hopcroft_karp
+
+
+class Interner:
+    """
+    Maps values to dense integer codes, in order of first appearance.
+    """
+
+    __slots__ = ('codes', 'values')
+
+    def __init__(self):
+        self.codes: Dict[Hashable, int] = {}
+        self.values: List[Hashable] = []
+
+    def intern(self, value: Hashable) -> int:
+        """
+        Returns the code of `value`, assigning the next free code if it has none yet.
+        """
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class CompactCatalog:
+    """
+    The catalog's piece lists, with design IDs, materials and (designID, material) pairs interned to integers and
+    stored in flat `array` buffers. The pieces of the set at position s are the entries from offsets[s] up to
+    offsets[s + 1].
+
+    It answers the same queries as CatalogIndex, and also evaluates the color-flexible check itself, without
+    building a LegoBrick or a string per brick.
+    """
+
+    def __init__(self, lego_sets: Dict, set_details: Dict[str, Dict], failed_sets: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            lego_sets (Dict): A dictionary containing information about LEGO sets, where the 'Sets' key holds a list of sets.
+            set_details (Dict[str, Dict]): The details of each set keyed by set id, as returned by get_lego_set_details.
+                Sets without details are left out.
+            failed_sets (Optional[Dict[str, str]], optional): The sets whose details could not be fetched, mapped to
+                the reason. Defaults to None.
+        """
+        self.version: str = catalog_version(lego_sets)
+        self.failed_sets: Dict[str, str] = dict(failed_sets or {})
+        self.set_names: Dict[str, str] = {}
+        self.parts = Interner()
+        self.colors = Interner()
+        self.pairs = Interner()
+        self.offsets = array('i', [0])
+        self.part_codes = array('i')
+        self.color_codes = array('i')
+        self.pair_codes = array('i')
+        self.quantities = array('i')
+
+        for lego_set in lego_sets['Sets']:
+            set_id = lego_set['id']
+            if set_id not in set_details:
+                continue
+            self.set_names[set_id] = lego_set['name']
+            for lego in set_details[set_id]['pieces']:
+                design_id = lego['part']['designID']
+                color = str(lego['part']['material'])
+                self.part_codes.append(self.parts.intern(design_id))
+                self.color_codes.append(self.colors.intern(color))
+                self.pair_codes.append(self.pairs.intern((design_id, color)))
+                self.quantities.append(lego['quantity'])
+            self.offsets.append(len(self.quantities))
+
+        self.set_ids: List[str] = list(self.set_names)
+
+    def can_build(self, position: int, inventory: "CompactInventory") -> bool:
+        """
+        Checks whether the set at `position` can be built without changing colors. Same answer as user_can_build_set.
+        """
+        if inventory.is_empty:
+            return False
+        counts, pair_codes, quantities = inventory.pair_counts, self.pair_codes, self.quantities
+        for entry in range(self.offsets[position], self.offsets[position + 1]):
+            if counts[pair_codes[entry]] < quantities[entry]:
+                return False
+        return True
+
+    def can_build_if_colors_are_changeable(self, position: int, inventory: "CompactInventory") -> bool:
+        """
+        Checks whether the set at `position` can only be built by changing colors. Same answer as
+        user_can_build_set_if_colors_are_changeable.
+        """
+        if inventory.is_empty or self.can_build(position, inventory):
+            return False
+
+        # pair code -> the entry needing the most bricks of that component
+        required: Dict[int, int] = {}
+        pair_codes, quantities = self.pair_codes, self.quantities
+        for entry in range(self.offsets[position], self.offsets[position + 1]):
+            pair = pair_codes[entry]
+            if pair not in required or quantities[entry] > quantities[required[pair]]:
+                required[pair] = entry
+
+        candidates: Dict[int, List[tuple]] = {}
+        part_codes, color_codes = self.part_codes, self.color_codes
+        for pair, entry in required.items():
+            part, color = part_codes[entry], color_codes[entry]
+            owned = _bits(inventory.color_mask(part, quantities[entry]))
+            if not owned:
+                return False
+            candidates[pair] = [(part, owned_color) for owned_color in sorted(owned, key=lambda code: code != color)]
+        return len(hopcroft_karp(candidates)) == len(candidates)
+
+    def buildable_set_ids(self, user_inventory: Dict[str, Dict[str, int]]) -> List[str]:
+        """
+        Finds the sets the user can build from their inventory without changing any colors, in catalog order.
+        """
+        inventory = CompactInventory(self, user_inventory)
+        return [set_id for position, set_id in enumerate(self.set_ids) if self.can_build(position, inventory)]
+
+    def color_flexible_set_ids(self, user_inventory: Dict[str, Dict[str, int]]) -> List[str]:
+        """
+        Finds the sets the user can build only by changing colors, in catalog order.
+        """
+        inventory = CompactInventory(self, user_inventory)
+        return [set_id for position, set_id in enumerate(self.set_ids)
+                if self.can_build_if_colors_are_changeable(position, inventory)]
+
+    def sets_with_all_parts(self, user_inventory: Dict[str, Dict[str, int]]) -> List[str]:
+        """
+        Finds the sets for which the user owns every part in at least one color, in catalog order.
+        """
+        inventory = CompactInventory(self, user_inventory)
+        if inventory.is_empty:
+            return []
+        owned, part_codes = inventory.owned_parts, self.part_codes
+        return [set_id for position, set_id in enumerate(self.set_ids)
+                if all(owned[part_codes[entry]]
+                       for entry in range(self.offsets[position], self.offsets[position + 1]))]
+
+
+class CompactInventory:
+    """
+    A user's inventory encoded against a CompactCatalog. Pairs and parts the catalog does not use are dropped,
+    except that the user's colors are all kept since any of them can stand in for another.
+    """
+
+    def __init__(self, catalog: CompactCatalog, user_inventory: Dict[str, Dict[str, int]]):
+        """
+        Args:
+            catalog (CompactCatalog): The catalog to encode against.
+            user_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+        """
+        self.is_empty = not user_inventory
+        self.pair_counts = array('i', [0]) * len(catalog.pairs)
+        self.owned_parts = bytearray(len(catalog.parts))
+        # part code -> (color code, count) of every color the user owns the part in
+        self.part_colors: Dict[int, List[tuple]] = {}
+        self._masks: Dict[int, int] = {}
+
+        extra_colors: Dict[str, int] = {}
+        for design_id, colors in user_inventory.items():
+            part = catalog.parts.codes.get(design_id)
+            if part is None:
+                continue
+            self.owned_parts[part] = bool(colors)
+            owned = self.part_colors[part] = []
+            for color, count in colors.items():
+                pair = catalog.pairs.codes.get((design_id, color))
+                if pair is not None:
+                    self.pair_counts[pair] = count
+                code = catalog.colors.codes.get(color)
+                if code is None:
+                    code = extra_colors.setdefault(color, len(catalog.colors) + len(extra_colors))
+                owned.append((code, count))
+
+    def color_mask(self, part: int, quantity: int) -> int:
+        """
+        Returns a bitmask of the color codes the user owns at least `quantity` of `part` in.
+        """
+        key = (quantity << 32) | part
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = 0
+            for color, count in self.part_colors.get(part, ()):
+                if count >= quantity:
+                    mask |= 1 << color
+            self._masks[key] = mask
+        return mask
+
+
+def _bits(mask: int) -> List[int]:
+    """
+    Returns the positions of the set bits of `mask`, lowest first.
+    """
+    positions = []
+    while mask:
+        lowest = mask & -mask
+        positions.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return positions
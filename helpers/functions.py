@@ -1,7 +1,14 @@
-from typing import Dict
-from collections import namedtuple
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import logging
+import threading
 from helpers.api_functions import get_lego_set_details
+from helpers.metrics import set_check_duration, sets_checked
+from helpers.parallel import map_in_processes
+from config import COLOR_CHECK_MIN_SETS, METRICS_ENABLED
 import os
 import sys
 
@@ -34,7 +41,267 @@ def find_sets_with_less_bricks_than_users_inventory(lego_sets: Dict[str, any], b
     return matching_sets
 
 
-def find_buildable_sets(users_inventory: Dict, lego_sets: Dict, is_flexible_on_color: bool = False) -> Dict[str, Dict[str, str]]:
+# Summaries of the piece lists fetched so far, keyed by catalog version and then set id, so that later requests can
+# rule sets out without fetching their details again. Only the catalogs seen last are kept, so the summaries are
+# replaced along with the catalog.
+set_summaries: "OrderedDict[str, Dict[str, Dict]]" = OrderedDict()
+_set_summaries_lock = threading.Lock()
+SET_SUMMARY_VERSIONS = 2
+
+
+def summaries_for(lego_sets: Dict) -> Dict[str, Dict]:
+    """
+    Returns the summaries recorded for the catalog version of `lego_sets`, keyed by set id, dropping those of older
+    catalogs once SET_SUMMARY_VERSIONS catalogs have been seen.
+    """
+    from helpers.catalog_index import catalog_version
+
+    version = catalog_version(lego_sets)
+    with _set_summaries_lock:
+        summaries = set_summaries.get(version)
+        if summaries is None:
+            summaries = set_summaries[version] = {}
+            while len(set_summaries) > SET_SUMMARY_VERSIONS:
+                set_summaries.popitem(last=False)
+        set_summaries.move_to_end(version)
+        return summaries
+
+
+def summarize_set(lego_set: Dict, lego_bricks: List[Dict]) -> Dict:
+    """
+    Summarizes a set's piece list for prune_lego_sets.
+
+    Args:
+        lego_set (Dict): The set as listed by get_lego_sets.
+        lego_bricks (List[Dict]): The set's pieces, as in its details.
+
+    Returns:
+        Dict: {'totalPieces': the set's listed total, or None,
+               'brickTotal': the bricks needed across all parts and colors,
+               'partTotals': {designID: the bricks of that part needed across all its colors}}.
+        Like user_can_build_set, a (designID, material) pair listed on several lines needs its largest quantity, so
+        brickTotal can be lower than the listed total.
+    """
+    required: Dict[Tuple[str, str], int] = {}
+    for lego in lego_bricks:
+        key = (lego['part']['designID'], str(lego['part']['material']))
+        required[key] = max(required.get(key, 0), lego['quantity'])
+
+    part_totals: Dict[str, int] = {}
+    for (design_id, _), quantity in required.items():
+        part_totals[design_id] = part_totals.get(design_id, 0) + quantity
+
+    return {'totalPieces': lego_set.get('totalPieces'), 'brickTotal': sum(part_totals.values()),
+            'partTotals': part_totals}
+
+
+def prune_lego_sets(users_inventory: Dict[str, Dict[str, int]], lego_sets: Dict,
+                    pruning_stats: Optional[Dict[str, int]] = None,
+                    summaries: Optional[Dict[str, Dict]] = None) -> Dict:
+    """
+    Rules out sets the user cannot build, exactly or with changed colors, before any of their details are fetched.
+
+    The filters run from cheapest to most expensive:
+        - total_pieces: the set needs more bricks than the user owns.
+        - part_count: the set needs more distinct parts than the user owns.
+        - part_totals: the set needs more bricks of some part, across its colors, than the user owns of it.
+    They use the summaries recorded for the catalog and leave sets without one in place. The listed totalPieces is not a
+    bound on its own, since it counts every line of a pair that user_can_build_set only needs the largest of.
+
+    Args:
+        users_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+        lego_sets (Dict): A dictionary containing Lego set details, where the 'Sets' key holds a list of sets.
+        pruning_stats (Optional[Dict[str, int]], optional): If given, it is filled with the number of sets each
+            filter ruled out.
+        summaries (Optional[Dict[str, Dict]], optional): The summaries of the catalog `lego_sets` was taken from,
+            as returned by summaries_for. Defaults to those of `lego_sets` itself.
+
+    Returns:
+        Dict: A copy of `lego_sets` holding only the remaining sets, in the same order.
+    """
+    if summaries is None:
+        summaries = summaries_for(lego_sets)
+    owned_totals = {design_id: sum(colors.values()) for design_id, colors in users_inventory.items()}
+    brick_count = sum(owned_totals.values())
+    part_count = sum(1 for total in owned_totals.values() if total > 0)
+    pruned = {'total_pieces': 0, 'part_count': 0, 'part_totals': 0}
+
+    remaining = []
+    for lego_set in lego_sets['Sets']:
+        summary = summaries.get(lego_set['id'])
+        if summary is not None and summary['totalPieces'] == lego_set.get('totalPieces'):
+            if summary['brickTotal'] > brick_count:
+                pruned['total_pieces'] += 1
+                continue
+            part_totals = summary['partTotals']
+            if len(part_totals) > part_count:
+                pruned['part_count'] += 1
+                continue
+            if any(owned_totals.get(design_id, 0) < quantity for design_id, quantity in part_totals.items()):
+                pruned['part_totals'] += 1
+                continue
+
+        remaining.append(lego_set)
+
+    logging.debug(f"Pruned sets before fetching details: {pruned}, {len(remaining)} remaining")
+    if pruning_stats is not None:
+        pruning_stats.update(pruned)
+
+    return dict(lego_sets, Sets=remaining)
+
+
+def iter_lego_set_details(lego_sets: Dict, max_workers: int = 1,
+                          summaries: Optional[Dict[str, Dict]] = None) -> Iterator[Tuple[str, Optional[Dict], Optional[str]]]:
+    """
+    Fetches the details of every set in `lego_sets`, with at most `max_workers` requests in flight at once, and
+    yields each set as soon as it and every set before it have been fetched.
+
+    Args:
+        lego_sets (Dict): A dictionary containing Lego set details, where the 'Sets' key holds a list of sets.
+        max_workers (int, optional): The maximum number of concurrent requests. Defaults to 1, which fetches the
+            sets one at a time.
+        summaries (Optional[Dict[str, Dict]], optional): Where the summary of each fetched set is recorded, as
+            returned by summaries_for. Defaults to the summaries of `lego_sets` itself.
+
+    Yields:
+        Tuple[str, Optional[Dict], Optional[str]]: The set id, its details, and None, in the same order as
+        `lego_sets['Sets']`. For a set that could not be fetched the details are None and the reason is given instead.
+    """
+    if summaries is None:
+        summaries = summaries_for(lego_sets)
+
+    def fetch(lego_set: Dict) -> Tuple[str, Optional[Dict], Optional[str]]:
+        set_id = lego_set['id']
+        try:
+            lego_set_details = get_lego_set_details(set_id)
+        except Exception as err:
+            lego_set_details, error = None, str(err)
+        else:
+            error = None if lego_set_details is not None else "Set details could not be retrieved."
+        if error is not None:
+            logging.error(f"Could not fetch details for set {set_id}: {error}")
+        else:
+            summaries[set_id] = summarize_set(lego_set, lego_set_details['pieces'])
+        return set_id, lego_set_details, error
+
+    if max_workers <= 1:
+        yield from map(fetch, lego_sets['Sets'])
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        yield from executor.map(fetch, lego_sets['Sets'])
+    finally:
+        # Stops the remaining fetches if the consumer goes away before the end.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_lego_set_details(lego_sets: Dict, max_workers: int = 1) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+    """
+    Fetches the details of every set in `lego_sets`, with at most `max_workers` requests in flight at once.
+
+    Args:
+        lego_sets (Dict): A dictionary containing Lego set details, where the 'Sets' key holds a list of sets.
+        max_workers (int, optional): The maximum number of concurrent requests. Defaults to 1, which fetches the
+            sets one at a time.
+
+    Returns:
+        Tuple[Dict[str, Dict], Dict[str, str]]: The set details keyed by set id, in the same order as
+        `lego_sets['Sets']`, and a dictionary mapping the id of every set that could not be fetched to the reason.
+    """
+    details: Dict[str, Dict] = {}
+    failures: Dict[str, str] = {}
+
+    for set_id, lego_set_details, error in iter_lego_set_details(lego_sets, max_workers):
+        if error is not None:
+            failures[set_id] = error
+        else:
+            details[set_id] = lego_set_details
+
+    return details, failures
+
+
+def buildable_set_ids_from_index(users_inventory: Dict, catalog_index, is_flexible_on_color: bool = False) -> List[str]:
+    """
+    Answers which sets the user can build from a catalog index, without fetching any set details.
+
+    Args:
+        users_inventory (Dict): The user's inventory as returned by sort_user_inventory.
+        catalog_index (CatalogIndex or CompactCatalog): The index of the catalog.
+        is_flexible_on_color (bool, optional): Whether colors may be swapped. Defaults to False.
+
+    Returns:
+        List[str]: The ids of the buildable sets in catalog order.
+    """
+    if is_flexible_on_color:
+        return catalog_index.color_flexible_set_ids(users_inventory)
+    return catalog_index.buildable_set_ids(users_inventory)
+
+
+def set_check(is_flexible_on_color: bool = False) -> Callable[[Dict, List[Dict]], bool]:
+    """
+    Returns the function checking whether a user can build a set from its piece list, timed per set while
+    METRICS_ENABLED.
+
+    Args:
+        is_flexible_on_color (bool, optional): Whether colors may be swapped. Defaults to False.
+
+    Returns:
+        Callable[[Dict, List[Dict]], bool]: Called with the user's inventory and the set's pieces.
+    """
+    mode = "color-flexible" if is_flexible_on_color else "exact"
+    check = user_can_build_set_if_colors_are_changeable if is_flexible_on_color else user_can_build_set
+
+    def timed_check(user_inventory: Dict, lego_bricks: List[Dict]) -> bool:
+        with set_check_duration.time(mode):
+            return check(user_inventory, lego_bricks)
+
+    # Timing each set costs a context manager per check, only paid while metrics are recorded.
+    return timed_check if METRICS_ENABLED else check
+
+
+def iter_buildable_sets(users_inventory: Dict, lego_sets: Dict, is_flexible_on_color: bool = False,
+                        max_workers: int = 1, catalog_index=None,
+                        pruning_stats: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, str]]:
+    """
+    Finds the buildable sets from Lego sets using the user's inventory, yielding each one as soon as it has been
+    checked. See find_buildable_sets for the arguments.
+
+    Yields:
+        Dict[str, str]: {'name': str, 'id': str} for each buildable set in catalog order, and
+        {'id': str, 'error': str} for each set whose details could not be fetched.
+    """
+    if catalog_index is not None:
+        for set_id, error in catalog_index.failed_sets.items():
+            yield {'id': set_id, 'error': error}
+        for set_id in buildable_set_ids_from_index(users_inventory, catalog_index, is_flexible_on_color):
+            yield {'name': catalog_index.set_names[set_id], 'id': set_id}
+        return
+
+    if not users_inventory:
+        return
+    summaries = summaries_for(lego_sets)
+    lego_sets = prune_lego_sets(users_inventory, lego_sets, pruning_stats, summaries)
+
+    set_names = {lego_set['id']: lego_set['name'] for lego_set in lego_sets['Sets']}
+    mode = "color-flexible" if is_flexible_on_color else "exact"
+    can_build = set_check(is_flexible_on_color)
+    checked = 0
+    try:
+        for set_id, lego_set_details, error in iter_lego_set_details(lego_sets, max_workers, summaries):
+            if error is not None:
+                yield {'id': set_id, 'error': error}
+                continue
+            checked += 1
+            if can_build(users_inventory, lego_set_details['pieces']):
+                yield {'name': set_names[set_id], 'id': set_id}
+    finally:
+        sets_checked.observe(checked, mode)
+
+
+def find_buildable_sets(users_inventory: Dict, lego_sets: Dict, is_flexible_on_color: bool = False,
+                        max_workers: int = 1, failed_sets: Optional[Dict[str, str]] = None,
+                        catalog_index=None, pruning_stats: Optional[Dict[str, int]] = None) -> Dict[str, Dict[str, str]]:
     """
     Finds the buildable sets from Lego sets using the user's inventory.
 
@@ -42,22 +309,28 @@ def find_buildable_sets(users_inventory: Dict, lego_sets: Dict, is_flexible_on_c
         users_inventory (Dict): A dictionary containing the user's Lego pieces and their quantities.
         lego_sets (Dict): A dictionary containing Lego set details.
         is_flexible_on_color (bool, optional): A flag indicating whether to be flexible on colors. Defaults to False.
+        max_workers (int, optional): The maximum number of set details fetched concurrently. Defaults to 1.
+        failed_sets (Optional[Dict[str, str]], optional): If given, it is filled with the id of every set whose
+            details could not be fetched, mapped to the reason.
+        catalog_index (Optional[CatalogIndex], optional): A prebuilt index of `lego_sets`. Exact matches are then
+            answered from the index alone. When colors are changeable, indexes that cannot answer the check
+            themselves narrow it down to the sets for which the user owns every part. Defaults to None.
+        pruning_stats (Optional[Dict[str, int]], optional): If given, it is filled with the number of sets each
+            prune_lego_sets filter ruled out before their details were fetched.
 
     Returns:
         Dict[str, Dict[str, str]]: A dictionary containing the buildable sets that the user can build, with the set name
         as key and the set id as value.
     """
     buildable_sets: Dict[str, Dict[str, str]] = {}
-    for lego_set in lego_sets['Sets']:
-        lego_set_details = get_lego_set_details(lego_set['id'])
-        if lego_set_details is None:
-            continue
-        if is_flexible_on_color:
-            if user_can_build_set_if_colors_are_changeable(users_inventory, lego_set_details['pieces']):
-                buildable_sets[lego_set['name']] = {'id': lego_set['id']}
+
+    for record in iter_buildable_sets(users_inventory, lego_sets, is_flexible_on_color, max_workers, catalog_index,
+                                      pruning_stats):
+        if 'error' in record:
+            if failed_sets is not None:
+                failed_sets[record['id']] = record['error']
         else:
-            if user_can_build_set(users_inventory, lego_set_details['pieces']):
-                buildable_sets[lego_set['name']] = {'id': lego_set['id']}
+            buildable_sets[record['name']] = {'id': record['id']}
 
     return buildable_sets
 
@@ -90,6 +363,20 @@ def sort_user_inventory(users_inventory_raw: Dict) -> Dict[str, Dict[str, int]]:
     return sorted_inventory
 
 
+def inventory_fingerprint(users_inventory: Dict[str, Dict[str, int]]) -> str:
+    """
+    Computes a content hash of a sorted user inventory, which is equal for inventories with the same bricks
+    regardless of the order they were listed in.
+
+    Args:
+        users_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+
+    Returns:
+        str: A hex digest of the inventory contents.
+    """
+    return hashlib.sha1(json.dumps(users_inventory, sort_keys=True).encode()).hexdigest()
+
+
 def user_can_build_set(user_inventory: Dict[str, Dict[str, int]], lego_bricks: Dict) -> bool:
     """
     Check if a user has the right pieces in their inventory to build a given LEGO set.
@@ -120,11 +407,115 @@ def user_can_build_set(user_inventory: Dict[str, Dict[str, int]], lego_bricks: D
     return True
 
 
+def find_color_substitutions(user_inventory: Dict[str, Dict[str, int]],
+                             lego_bricks_in_set: List[Dict]) -> Optional[Dict[Tuple[str, str], str]]:
+    """
+    Finds a color substitution that lets the user build a given LEGO set. Every component of the set, the bricks of
+    one part in one required color, is built either in its own color, if the user owns enough of the part in it, or
+    in another color the user owns enough of the part in. e.g. a red roof becomes a pink roof while the red walls
+    stay red. Two components of the same part cannot be built in the same color.
+
+    The components and the (part, color) pairs the user owns form a bipartite graph, with an edge from a component
+    to each color of its part the user has enough of. A substitution exists exactly when the graph has a matching
+    covering every component, which is found with Hopcroft-Karp in polynomial time.
+
+    Args:
+        user_inventory (Dict[str, Dict[str, int]]): A dictionary representing the user's LEGO inventory.
+        lego_bricks_in_set (List[Dict[str, any]]): A list of dictionaries representing the LEGO bricks required to build the set.
+
+    Returns:
+        Optional[Dict[Tuple[str, str], str]]: A dictionary mapping each (designID, required color) component that has
+        to change to the color used instead, or None if no substitution lets the user build the set.
+    """
+    # The bricks needed of each component. A component listed on several lines needs its largest quantity, as in
+    # user_can_build_set. A brick that no color of its part covers rejects the set before the rest are read.
+    required: Dict[Tuple[str, str], int] = {}
+    most_owned: Dict[str, int] = {}
+    for lego in lego_bricks_in_set:
+        design_id, quantity = lego['part']['designID'], lego['quantity']
+        owned = most_owned.get(design_id)
+        if owned is None:
+            owned = most_owned[design_id] = max(user_inventory.get(design_id, {}).values(), default=-1)
+        if owned < quantity:
+            return None
+        key = (design_id, str(lego['part']['material']))
+        if quantity > required.get(key, -1):
+            required[key] = quantity
+
+    # Trying the required color first keeps as many components unchanged as possible.
+    candidates: Dict[Tuple[str, str], List[Tuple[str, str]]] = {
+        (design_id, color): sorted(((design_id, owned_color) for owned_color, count in user_inventory[design_id].items()
+                                    if count >= quantity), key=lambda pair: pair[1] != color)
+        for (design_id, color), quantity in required.items()}
+
+    matching = hopcroft_karp(candidates)
+    if len(matching) < len(candidates):
+        return None
+
+    return {component: substitute[1] for component, substitute in matching.items() if substitute[1] != component[1]}
+
+
+def hopcroft_karp(candidates: Dict[Hashable, List[Hashable]]) -> Dict[Hashable, Hashable]:
+    """
+    Finds a maximum matching in a bipartite graph with Hopcroft-Karp.
+
+    Args:
+        candidates (Dict[Hashable, List[Hashable]]): The neighbours on the right of each node on the left, in the
+            order they should be tried.
+
+    Returns:
+        Dict[Hashable, Hashable]: The matched right node of every matched left node.
+    """
+    match_left: Dict[Hashable, Optional[Hashable]] = {left: None for left in candidates}
+    match_right: Dict[Hashable, Hashable] = {}
+    unreached = float('inf')
+
+    while True:
+        # Breadth-first search from the free left nodes, layering the graph by alternating path length.
+        distance: Dict[Hashable, float] = {}
+        queue = deque()
+        for left, right in match_left.items():
+            if right is None:
+                distance[left] = 0
+                queue.append(left)
+        found_free_right = False
+        while queue:
+            left = queue.popleft()
+            for right in candidates[left]:
+                next_left = match_right.get(right)
+                if next_left is None:
+                    found_free_right = True
+                elif next_left not in distance:
+                    distance[next_left] = distance[left] + 1
+                    queue.append(next_left)
+        if not found_free_right:
+            break
+
+        # Depth-first search along the layers for vertex-disjoint shortest augmenting paths.
+        def augment(left: Hashable) -> bool:
+            for right in candidates[left]:
+                next_left = match_right.get(right)
+                if next_left is None or (distance.get(next_left) == distance[left] + 1 and augment(next_left)):
+                    match_left[left] = right
+                    match_right[right] = left
+                    return True
+            distance[left] = unreached
+            return False
+
+        for left in candidates:
+            if match_left[left] is None:
+                augment(left)
+
+    return {left: right for left, right in match_left.items() if right is not None}
+
+
 def user_can_build_set_if_colors_are_changeable(user_inventory, lego_bricks_in_set):
     """
     Checks if a given user's inventory contains enough bricks to build a given LEGO if a color substitution is okay with the user. 
     It will not find Lego sets buildable by the user without any substitutions in color.
 
+    See find_color_substitutions for what counts as a valid substitution.
+
     Args:
         user_inventory (Dict[str, Dict[str, int]]): A dictionary representing the user's LEGO inventory.
         lego_bricks_in_set (List[Dict[str, any]]): A list of dictionaries representing the LEGO bricks required to build the set.
@@ -132,66 +523,65 @@ def user_can_build_set_if_colors_are_changeable(user_inventory, lego_bricks_in_s
     Returns:
         bool: True if the user can build the set using their inventory or after making some possible substitutions for missing bricks, False otherwise.
     """
-    used_colors = set()
-    substitutions = {}
-    needs_substitution = False
-
     if not user_inventory:
         return False
 
     if user_can_build_set(user_inventory, lego_bricks_in_set):
         return False
 
-    for lego in lego_bricks_in_set:
-        lego_brick = LegoBrick(lego['part']['designID'], str(
-            lego['part']['material']), lego['quantity'])
+    substitutions = find_color_substitutions(user_inventory, lego_bricks_in_set)
 
-        if lego_brick.id in user_inventory:
-            # check if the required color is available
-            if lego_brick.color in user_inventory[lego_brick.id]:
-                # register the color as having been used.
-                used_colors.add(lego_brick.color)
-            else:
-                # try to find a substitute color
-                found_substitute = False
-                for color, count in user_inventory[lego_brick.id].items():
-                    if color not in used_colors and count >= lego_brick.quantity:
-                        # use the substitute color
-                        used_colors.add(color)
-                        substitutions[lego_brick.color] = color
-                        found_substitute = True
-                        break
-                if not found_substitute:
-                    needs_substitution = True
-                    break
-        else:
-            # the required brick is not available
-            needs_substitution = True
-            break
+    # helping function if we want to see the bricks being substituted.
+    #print_substitutions_to_file(lego_bricks_in_set, substitutions)
+    return substitutions is not None
 
-    if not needs_substitution:
-        return True
 
-    # Check if substitution is possible
-    for lego in lego_bricks_in_set:
-        lego_brick = LegoBrick(lego['part']['designID'], str(
-            lego['part']['material']), lego['quantity'])
-        if lego_brick.color not in substitutions:
-            needs_substitution = False
-            for color, count in user_inventory[lego_brick.id].items():
-                if color not in used_colors and count >= lego_brick.quantity:
-                    # register the color as having been used.
-                    used_colors.add(color)
-                    substitutions[lego_brick.color] = color
-                    needs_substitution = True
-                    break
-            if not needs_substitution:
-                # no substitute color found
-                return False
+# The piece lists of the catalog, set in each worker process started by check_color_flexible_sets.
+_worker_pieces: Dict[str, List[Dict]] = {}
 
-    # helping function if we want to see the bricks being substituted.
-    #print_substitutions_to_file(lego_bricks_in_set, substitutions)
-    return True
+
+def _load_worker_pieces(pieces: Dict[str, List[Dict]]) -> None:
+    global _worker_pieces
+    _worker_pieces = pieces
+
+
+def _can_build_catalog_set_if_colors_are_changeable(user_inventory: Dict[str, Dict[str, int]], set_id: str) -> bool:
+    return user_can_build_set_if_colors_are_changeable(user_inventory, _worker_pieces[set_id])
+
+
+def check_color_flexible_sets(users_inventory: Dict[str, Dict[str, int]], catalog_index, set_ids: List[str],
+                              processes: int = 0) -> List[bool]:
+    """
+    Runs user_can_build_set_if_colors_are_changeable for the given sets of a catalog index, spread over `processes`
+    worker processes when there are at least COLOR_CHECK_MIN_SETS of them.
+
+    Each worker receives the piece lists of the whole catalog once, when it starts, and the workers are replaced when
+    the catalog changes. A call then only sends the set ids and the parts of the inventory the catalog uses. If the
+    workers fail, the sets are checked in this process instead.
+
+    Args:
+        users_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+        catalog_index (CatalogIndex): The index holding the sets' piece lists.
+        set_ids (List[str]): The ids of the sets to check.
+        processes (int, optional): The number of worker processes. Defaults to 0, which checks every set here.
+
+    Returns:
+        List[bool]: Whether the user can build each set with changed colors, in the same order as `set_ids`.
+    """
+    if processes > 0 and len(set_ids) >= COLOR_CHECK_MIN_SETS:
+        inventory = {part: colors for part, colors in users_inventory.items() if part in catalog_index.part_sets}
+        # An index built while some sets failed to fetch holds fewer sets under the same catalog version.
+        key = (catalog_index.version, tuple(sorted(catalog_index.failed_sets)))
+        try:
+            return map_in_processes(
+                _can_build_catalog_set_if_colors_are_changeable, inventory, set_ids, processes, key,
+                _load_worker_pieces,
+                lambda: ({set_id: catalog_index.pieces(set_id) for set_id in catalog_index.set_names},))
+        except Exception as err:
+            logging.error(f"Could not check sets in worker processes, checking them here: {err}")
+
+    return [user_can_build_set_if_colors_are_changeable(users_inventory, catalog_index.pieces(set_id))
+            for set_id in set_ids]
 
 
 def print_substitutions_to_file(lego_bricks: Dict, substitutions: Dict):
@@ -203,7 +593,7 @@ def print_substitutions_to_file(lego_bricks: Dict, substitutions: Dict):
                        specifying the design ID, color, and quantity of a Lego brick required to build
                        the set.
     - substitutions: A dictionary containing the color substitutions made for each Lego brick in the set,
-                     where the keys are the original colors and the values are the substitute colors.
+                     where the keys are (design ID, original color) and the values are the substitute colors.
 
     Returns:
     - None
@@ -212,5 +602,6 @@ def print_substitutions_to_file(lego_bricks: Dict, substitutions: Dict):
         for building_block in lego_bricks:
             lego_brick = LegoBrick(building_block['part']['designID'], str(
                 building_block['part']['material']), building_block['quantity'])
-            if lego_brick.color in substitutions:
-                f.write(f"{lego_brick.quantity} x {lego_brick.color} (substituted with {substitutions[lego_brick.color]})\n")
\ No newline at end of file
+            if (lego_brick.id, lego_brick.color) in substitutions:
+                f.write(f"{lego_brick.quantity} x {lego_brick.color} "
+                        f"(substituted with {substitutions[(lego_brick.id, lego_brick.color)]})\n")
\ No newline at end of file
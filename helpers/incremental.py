@@ -0,0 +1,116 @@
+import threading
+from array import array
+from typing import Dict, List, Set, Tuple
+
+from helpers.catalog_index import CatalogIndex
+from helpers.functions import user_can_build_set_if_colors_are_changeable
+
+
+class IncrementalBuildability:
+    """
+    One user's buildable sets against a CatalogIndex, kept up to date as their inventory changes.
+
+    For every set, the number of (designID, material) pairs the user owns too few bricks of is kept, as in
+    CatalogIndex.buildable_set_ids. A change to the count of one pair then only touches the sets that need that pair.
+    With changeable colors, a change to a part re-checks the sets that use the part. The bricks a set is missing can
+    be looked up on demand with CatalogIndex.missing_pieces.
+    """
+
+    def __init__(self, catalog_index: CatalogIndex, users_inventory: Dict[str, Dict[str, int]],
+                 is_flexible_on_color: bool = False):
+        """
+        Args:
+            catalog_index (CatalogIndex): The index of the catalog.
+            users_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory. It
+                is copied.
+            is_flexible_on_color (bool, optional): Whether colors may be swapped, with the same meaning as in
+                find_buildable_sets. Defaults to False.
+        """
+        self.catalog_index = catalog_index
+        self.is_flexible_on_color = is_flexible_on_color
+        self.inventory: Dict[str, Dict[str, int]] = {}
+        for part, colors in users_inventory.items():
+            owned_colors = {color: count for color, count in colors.items() if count > 0}
+            if owned_colors:
+                self.inventory[part] = owned_colors
+        self.lock = threading.Lock()
+
+        # The number of unmet pairs of each set, by catalog position.
+        positions = catalog_index.positions
+        self.unmet = array('i', (catalog_index.requirement_counts[set_id] for set_id in catalog_index.set_names))
+        for part, colors in self.inventory.items():
+            for color, count in colors.items():
+                for set_id, quantity in catalog_index.requirements.get((part, color), {}).items():
+                    if quantity <= count:
+                        self.unmet[positions[set_id]] -= 1
+
+        if is_flexible_on_color:
+            candidates = catalog_index.sets_with_all_parts(self.inventory)
+        else:
+            candidates = catalog_index.set_names
+        self.buildable: Set[str] = {set_id for set_id in candidates if self._is_buildable(set_id)}
+
+    def _is_buildable(self, set_id: str) -> bool:
+        if self.is_flexible_on_color:
+            return user_can_build_set_if_colors_are_changeable(self.inventory, self.catalog_index.pieces(set_id))
+        # An empty inventory builds nothing, as in user_can_build_set.
+        return bool(self.inventory) and not self.unmet[self.catalog_index.positions[set_id]]
+
+    def buildable_set_ids(self) -> List[str]:
+        """
+        Returns the ids of the sets the user can currently build, in catalog order.
+        """
+        return sorted(self.buildable, key=self.catalog_index.positions.__getitem__)
+
+    def apply_delta(self, delta: Dict[str, Dict[str, int]]) -> Tuple[List[str], List[str]]:
+        """
+        Applies a change to the user's inventory and re-evaluates the sets it can affect.
+
+        Args:
+            delta (Dict[str, Dict[str, int]]): The change in count of each (designID, material) pair, as
+                {designID: {material: change}}. Counts do not go below zero.
+
+        Returns:
+            Tuple[List[str], List[str]]: The ids of the sets that became buildable and of the sets that stopped being
+            buildable, each in catalog order.
+        """
+        was_empty = not self.inventory
+        affected: Set[str] = set()
+        positions = self.catalog_index.positions
+
+        for part, changes in delta.items():
+            owned_colors = self.inventory.setdefault(part, {})
+            for color, change in changes.items():
+                previously_owned = owned_colors.get(color, 0)
+                owned = max(previously_owned + change, 0)
+                if owned:
+                    owned_colors[color] = owned
+                else:
+                    owned_colors.pop(color, None)
+
+                for set_id, quantity in self.catalog_index.requirements.get((part, color), {}).items():
+                    # A pair counts as met once it is owned at all, as in user_can_build_set.
+                    was_met, is_met = 0 < previously_owned >= quantity, 0 < owned >= quantity
+                    if was_met != is_met:
+                        self.unmet[positions[set_id]] += was_met - is_met
+                        affected.add(set_id)
+            if not owned_colors:
+                del self.inventory[part]
+            if self.is_flexible_on_color:
+                affected.update(self.catalog_index.part_sets.get(part, ()))
+
+        if was_empty != (not self.inventory):
+            affected = set(self.catalog_index.set_names)
+
+        became_buildable: List[str] = []
+        stopped_being_buildable: List[str] = []
+        for set_id in sorted(affected, key=positions.__getitem__):
+            is_buildable = self._is_buildable(set_id)
+            if is_buildable and set_id not in self.buildable:
+                self.buildable.add(set_id)
+                became_buildable.append(set_id)
+            elif not is_buildable and set_id in self.buildable:
+                self.buildable.discard(set_id)
+                stopped_being_buildable.append(set_id)
+
+        return became_buildable, stopped_being_buildable
@@ -0,0 +1,70 @@
+import json
+import logging
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - msgspec is optional
+    msgspec = None
+
+from config import JSON_CODEC
+
+_AVAILABLE = {"orjson": orjson is not None, "msgspec": msgspec is not None, "stdlib": True}
+
+
+def select_codec(name: str) -> str:
+    """
+    Returns the codec to use for a JSON_CODEC setting.
+
+    Args:
+        name (str): "orjson", "msgspec", "stdlib", or "auto" for the first of them that is installed. A codec that
+            is not installed falls back to "stdlib".
+
+    Returns:
+        str: The name of the codec.
+    """
+    if name == "auto":
+        return next(codec for codec, is_available in _AVAILABLE.items() if is_available)
+    if not _AVAILABLE.get(name, False):
+        logging.warning(f"The {name} JSON codec is not available, falling back to the json module.")
+        return "stdlib"
+    return name
+
+
+codec = select_codec(JSON_CODEC)
+
+if codec == "orjson":
+    _loads = orjson.loads
+
+    def _dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+elif codec == "msgspec":
+    _loads = msgspec.json.Decoder().decode
+    _encode = msgspec.json.Encoder().encode
+
+    def _dumps(value: Any) -> str:
+        return _encode(value).decode()
+else:
+    _loads = json.loads
+
+    def _dumps(value: Any) -> str:
+        return json.dumps(value, separators=(",", ":"))
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decodes a JSON document, preferably from the raw bytes of a response, with the selected codec.
+    """
+    return _loads(data)
+
+
+def dumps(value: Any) -> str:
+    """
+    Encodes a value as compact JSON with the selected codec. Keys are not sorted, so use json.dumps for hashing.
+    """
+    return _dumps(value)
@@ -0,0 +1,202 @@
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from config import METRICS_ENABLED
+
+# Upper bounds in seconds of the latency histogram buckets.
+LATENCY_BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS: Tuple[float, ...] = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """
+    A monotonically increasing count per combination of label values.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        """
+        Adds `amount` to the count for the given label values. Does nothing when metrics are disabled.
+        """
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    A distribution of observed values per combination of label values, counted into cumulative buckets.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Bucket counts (the last one for values above every bound), sum and count per label values.
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        """
+        Records one value for the given label values. Does nothing when metrics are disabled.
+        """
+        if not METRICS_ENABLED:
+            return
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(labelvalues, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[position] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        """
+        Records the number of seconds spent in the `with` block for the given label values.
+        """
+        if not METRICS_ENABLED:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labelvalues, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    labels = _format_labels(self.labelnames, labelvalues, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, labelvalues)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total[0])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics served on /metrics, along with callbacks that report values kept elsewhere, such as cache counters.
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect: Callable[[], List[str]]) -> None:
+        """
+        Adds a callback returning lines in the Prometheus text format, called on every render.
+        """
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+def endpoint_label(url: str) -> str:
+    """
+    Returns the path of an upstream URL with user names and ids replaced, for use as a low-cardinality label.
+    """
+    path = re.sub(r"^[a-z]+://[^/]+", "", url).split("?", 1)[0]
+    return re.sub(r"/by-(id|username)/[^/]+$", r"/by-\1/:\1", path)
+
+
+def cache_stats_collector(prefix: str, stats: Callable[[], Dict[str, int]]) -> Callable[[], List[str]]:
+    """
+    Builds a collector reporting the counters of a CatalogCache, as returned by its `stats` method.
+
+    Args:
+        prefix (str): The prefix of the metric names, e.g. "catalog_cache".
+        stats (Callable[[], Dict[str, int]]): Returns the counters.
+
+    Returns:
+        Callable[[], List[str]]: The collector, for Registry.register_collector.
+    """
+    def collect() -> List[str]:
+        lines: List[str] = []
+        for name, value in sorted(stats().items()):
+            kind = "gauge" if name in ("size", "maxsize") else "counter"
+            metric = f"{prefix}_{name}" if kind == "gauge" else f"{prefix}_{name}_total"
+            lines.extend([f"# TYPE {metric} {kind}", f"{metric} {value}"])
+        return lines
+
+    return collect
+
+
+registry = Registry()
+
+upstream_request_duration = registry.histogram(
+    "upstream_request_duration_seconds", "Time spent on each upstream request, including retries.", ["endpoint"])
+upstream_request_errors = registry.counter(
+    "upstream_request_errors_total", "Upstream requests that failed after all retries.", ["endpoint"])
+upstream_request_retries = registry.counter(
+    "upstream_request_retries_total", "Upstream requests that were retried.", ["endpoint"])
+request_duration = registry.histogram(
+    "request_duration_seconds", "Time spent answering each API request.", ["endpoint"])
+stage_duration = registry.histogram(
+    "request_stage_duration_seconds", "Time spent in each stage of the buildable-sets pipeline.", ["stage"])
+set_check_duration = registry.histogram(
+    "set_check_duration_seconds", "Time spent checking one set's piece list against an inventory.", ["mode"])
+sets_checked = registry.histogram(
+    "sets_checked_per_request", "Sets whose piece lists were checked one by one in a request.", ["mode"],
+    buckets=COUNT_BUCKETS)
+result_cache_lookups = registry.counter(
+    "result_cache_lookups_total", "Lookups of computed results, by where they were found.", ["result"])
+catalog_refreshes = registry.counter(
+    "catalog_refreshes_total", "Polls of the set list by the catalog warmer, by outcome.", ["result"])
+coalesced_requests = registry.counter(
+    "coalesced_requests_total", "Buildable-sets requests answered by joining an identical request in flight.", ["mode"])
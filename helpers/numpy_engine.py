@@ -0,0 +1,89 @@
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+from helpers.catalog_index import CatalogIndex
+
+
+class NumpyCatalogIndex(CatalogIndex):
+    """
+    A catalog index that also encodes the catalog as a sparse sets x (designID, material) requirement matrix, so that
+    exact-match queries check every set in one vectorized comparison instead of walking piece lists in Python.
+
+    The matrix is kept in coordinate form: entry i says that set `rows[i]` needs `quantities[i]` bricks of the
+    (designID, material) pair in column `columns[i]`.
+    """
+
+    def __init__(self, lego_sets: Dict, set_details: Dict[str, Dict], failed_sets: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            lego_sets (Dict): A dictionary containing information about LEGO sets, where the 'Sets' key holds a list of sets.
+            set_details (Dict[str, Dict]): The details of each set keyed by set id, as returned by get_lego_set_details.
+            failed_sets (Optional[Dict[str, str]], optional): The sets whose details could not be fetched, mapped to
+                the reason. Defaults to None.
+
+        Raises:
+            ImportError: If numpy is not installed.
+        """
+        if np is None:
+            raise ImportError("The numpy buildability engine requires numpy to be installed.")
+
+        super().__init__(lego_sets, set_details, failed_sets)
+
+        self.set_ids: List[str] = list(self.set_names)
+        set_positions = {set_id: position for position, set_id in enumerate(self.set_ids)}
+        self.column_of = {key: column for column, key in enumerate(self.requirements)}
+
+        entry_count = sum(len(postings) for postings in self.requirements.values())
+        self.rows = np.empty(entry_count, dtype=np.int64)
+        self.columns = np.empty(entry_count, dtype=np.int64)
+        self.quantities = np.empty(entry_count, dtype=np.int64)
+
+        position = 0
+        for column, postings in enumerate(self.requirements.values()):
+            end = position + len(postings)
+            self.rows[position:end] = [set_positions[set_id] for set_id in postings]
+            self.columns[position:end] = column
+            self.quantities[position:end] = list(postings.values())
+            position = end
+
+    def inventory_vector(self, user_inventory: Dict[str, Dict[str, int]]) -> "np.ndarray":
+        """
+        Encodes the user's inventory as a dense vector over the matrix columns. Pairs no set needs are dropped.
+
+        Args:
+            user_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+
+        Returns:
+            np.ndarray: The number of bricks the user owns of each column's (designID, material) pair.
+        """
+        vector = np.zeros(len(self.column_of), dtype=np.int64)
+        for part, colors in user_inventory.items():
+            for color, count in colors.items():
+                column = self.column_of.get((part, color))
+                if column is not None:
+                    vector[column] = count
+        return vector
+
+    def buildable_set_ids(self, user_inventory: Dict[str, Dict[str, int]]) -> List[str]:
+        """
+        Finds the sets the user can build from their inventory without changing any colors.
+
+        Gives the same answer as running user_can_build_set on every indexed set.
+
+        Args:
+            user_inventory (Dict[str, Dict[str, int]]): The user's inventory as returned by sort_user_inventory.
+
+        Returns:
+            List[str]: The ids of the buildable sets, in catalog order.
+        """
+        if not user_inventory:
+            return []
+
+        owned = self.inventory_vector(user_inventory)
+        short = owned[self.columns] < self.quantities
+        shortfalls = np.bincount(self.rows[short], minlength=len(self.set_ids))
+        return [self.set_ids[position] for position in np.flatnonzero(shortfalls == 0)]
@@ -0,0 +1,99 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+
+# The worker processes are started once and reused by every request, until they are needed with other state.
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_key: Optional[Tuple[int, Hashable]] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool(processes: int, key: Hashable = None, initializer: Optional[Callable[..., None]] = None,
+                     make_initargs: Optional[Callable[[], Tuple]] = None) -> ProcessPoolExecutor:
+    """
+    Returns the shared pool of `processes` worker processes, starting it on first use. The workers are spawned
+    rather than forked, so they do not inherit the locks of the server's threads.
+
+    Args:
+        processes (int): The number of worker processes.
+        key (Hashable, optional): Identifies the state `initializer` loads into each worker, e.g. a catalog version.
+            The pool is replaced when it changes. Defaults to None.
+        initializer (Optional[Callable[..., None]], optional): A module-level function each worker calls when it
+            starts. Defaults to None.
+        make_initargs (Optional[Callable[[], Tuple]], optional): Returns the arguments of `initializer`, which are
+            sent to each worker once. Only called when a pool is started, so that calls reusing the pool do not pay
+            for building them. Defaults to None, for no arguments.
+
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is None or _pool_key != (processes, key):
+            if _pool is not None:
+                # Calls already submitted to the old pool are left to finish.
+                _pool.shutdown(wait=False)
+            initargs = make_initargs() if make_initargs is not None else ()
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=initializer, initargs=initargs)
+            _pool_key = (processes, key)
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    """
+    Stops the shared pool's worker processes. The next call to get_process_pool starts new ones.
+    """
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = _pool_key = None
+
+
+def _run_chunk(check: Callable[[Any, Any], Any], shared: Any, items: Sequence[Any]) -> List[Any]:
+    return [check(shared, item) for item in items]
+
+
+def map_in_processes(check: Callable[[Any, Any], Any], shared: Any, items: Sequence[Any], processes: int,
+                     key: Hashable = None, initializer: Optional[Callable[..., None]] = None,
+                     make_initargs: Optional[Callable[[], Tuple]] = None) -> List[Any]:
+    """
+    Calls `check(shared, item)` for every item in the worker processes and returns the results in item order.
+
+    The items are split into one contiguous chunk per process, so `shared` is sent to each worker once per call
+    rather than once per item. State that outlives the call, such as the catalog, is better loaded once per worker
+    with `initializer`.
+
+    Args:
+        check (Callable[[Any, Any], Any]): A module-level function, so that it can be sent to the workers.
+        shared (Any): The first argument of every call, e.g. the user's inventory.
+        items (Sequence[Any]): The second argument of each call.
+        processes (int): The number of worker processes.
+        key, initializer, make_initargs: See get_process_pool.
+
+    Returns:
+        List[Any]: The result of each call, in the same order as `items`.
+
+    Raises:
+        BrokenProcessPool: If a worker died. The pool is dropped, so the next call starts new workers.
+    """
+    global _pool, _pool_key
+    if not items:
+        return []
+    chunk_size = -(-len(items) // processes)
+    chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+    pool = get_process_pool(processes, key, initializer, make_initargs)
+    results: List[Any] = []
+    try:
+        for chunk_results in pool.map(partial(_run_chunk, check, shared), chunks):
+            results.extend(chunk_results)
+    except BrokenProcessPool:
+        with _pool_lock:
+            if _pool is pool:
+                _pool = _pool_key = None
+        raise
+    return results
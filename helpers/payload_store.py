@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from typing import Any, Callable, Optional
+
+from helpers import json_codec
+
+StoredPayload = namedtuple('StoredPayload', ['value', 'etag', 'fetched_at'])
+
+
+class PayloadStore:
+    """
+    Upstream JSON payloads kept in an SQLite database file by URL, with the ETag they were served with and when they
+    were last fetched or revalidated. Unlike the caches, entries do not expire: a stale entry is revalidated with its
+    ETag, and served as-is if the upstream cannot be reached.
+    """
+
+    def __init__(self, path: str, timer: Callable[[], float] = time.time):
+        """
+        Args:
+            path (str): The path of the database file. It is created if it does not exist.
+            timer (Callable[[], float], optional): The clock used for fetch times. Defaults to time.time.
+        """
+        self.path = path
+        self._timer = timer
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS payloads "
+                           "(url TEXT PRIMARY KEY, body TEXT NOT NULL, etag TEXT, fetched_at REAL NOT NULL)")
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=30)
+        return connection
+
+    def get(self, url: str) -> Optional[StoredPayload]:
+        """
+        Returns the stored payload of `url`, or None if there is none.
+        """
+        row = self._connection().execute(
+            "SELECT body, etag, fetched_at FROM payloads WHERE url = ?", (url,)).fetchone()
+        return StoredPayload(json_codec.loads(row[0]), row[1], row[2]) if row is not None else None
+
+    def is_fresh(self, payload: StoredPayload, max_age: float) -> bool:
+        """
+        Returns True if `payload` was fetched or revalidated less than `max_age` seconds ago.
+        """
+        return payload.fetched_at + max_age > self._timer()
+
+    def set(self, url: str, value: Any, etag: Optional[str]) -> None:
+        """
+        Stores a payload just fetched from `url`.
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO payloads (url, body, etag, fetched_at) VALUES (?, ?, ?, ?)",
+                               (url, json_codec.dumps(value), etag, self._timer()))
+
+    def touch(self, url: str) -> None:
+        """
+        Records that the stored payload of `url` was just revalidated.
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute("UPDATE payloads SET fetched_at = ? WHERE url = ?", (self._timer(), url))
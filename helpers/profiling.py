@@ -0,0 +1,133 @@
+import cProfile
+import hmac
+import logging
+import os
+import pstats
+import re
+import time
+import uuid
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from flask import Response, request
+
+from config import PROFILING_TOKEN, PROFILE_DIR, PROFILE_HOTSPOTS
+
+
+def profile_requested() -> bool:
+    """
+    Returns True if the current request carries the profiling token, in the X-Profile-Token header or the
+    profile_token query parameter. Always False when PROFILING_TOKEN is not set.
+    """
+    if not PROFILING_TOKEN:
+        return False
+    token = request.headers.get("X-Profile-Token") or request.args.get("profile_token") or ""
+    return hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode())
+
+
+def hotspots(profile: cProfile.Profile, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Returns the functions that took the most time in a profile, excluding the time spent in the functions they call.
+
+    Args:
+        profile (cProfile.Profile): The finished profile.
+        limit (Optional[int], optional): How many functions to return. Defaults to PROFILE_HOTSPOTS.
+
+    Returns:
+        List[Dict[str, Any]]: One dictionary per function with its location, number of calls, own time and
+        cumulative time in seconds, slowest first.
+    """
+    stats = pstats.Stats(profile).stats
+    ranked = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:limit or PROFILE_HOTSPOTS]
+    return [{"function": f"{os.path.basename(filename)}:{line}({name})", "calls": calls,
+             "own_time": round(own_time, 6), "cumulative_time": round(cumulative_time, 6)}
+            for (filename, line, name), (_, calls, own_time, cumulative_time, _) in ranked]
+
+
+def profile_path(label: str, directory: Optional[str] = None) -> str:
+    """
+    Returns a new file path for a profile in `directory`, which defaults to PROFILE_DIR. `label` is included in the
+    file name, e.g. the endpoint and username.
+    """
+    safe_label = re.sub(r"[^A-Za-z0-9_.-]+", "-", label).strip("-")
+    return os.path.join(directory or PROFILE_DIR,
+                        f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}-{uuid.uuid4().hex[:8]}.pstats")
+
+
+def save_profile(profile: cProfile.Profile, label: str, directory: Optional[str] = None,
+                 path: Optional[str] = None) -> Optional[str]:
+    """
+    Writes a profile to `directory` as a pstats file, which `python -m pstats` and snakeviz can open.
+
+    Args:
+        profile (cProfile.Profile): The finished profile.
+        label (str): Included in the file name, e.g. the endpoint and username.
+        directory (Optional[str], optional): Where the file is written. Defaults to PROFILE_DIR.
+        path (Optional[str], optional): The file to write, as returned by profile_path, instead of a new one.
+            Defaults to None.
+
+    Returns:
+        Optional[str]: The path of the file, or None if it could not be written.
+    """
+    path = path or profile_path(label, directory)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profile.dump_stats(path)
+    except OSError as err:
+        logging.error(f"Could not write profile {path}: {err}")
+        return None
+    return path
+
+
+def _profile_stream(profile: cProfile.Profile, body: Iterable[Any], path: str) -> Iterator[Any]:
+    # Profiles producing and sending the body, then writes the profile once the stream ends or is closed.
+    profile.enable()
+    try:
+        yield from body
+    finally:
+        profile.disable()
+        save_profile(profile, "", path=path)
+        logging.info(f"Profiled {path}")
+
+
+def profiled(method: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Decorator for Resource methods that runs the method under cProfile when the request carries the profiling
+    token. Add it to a Resource's `method_decorators`.
+
+    The profile is written with save_profile, and its hotspots are added to a dictionary result under "profile".
+    A Response is returned with the path of the profile in the X-Profile header. For a streamed Response, such as
+    NDJSON, profiling goes on while its body is produced and sent, and the file is written when the stream ends.
+    Only the thread answering the request is profiled, so time spent waiting on worker threads shows up in the
+    calls that wait for them.
+    """
+    @wraps(method)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not profile_requested():
+            return method(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            profile.disable()
+
+        label = "-".join([request.endpoint or "request", *map(str, kwargs.values())])
+        if isinstance(result, Response) and result.is_streamed:
+            path = profile_path(label)
+            result.response = _profile_stream(profile, result.response, path)
+            result.headers["X-Profile"] = path
+            return result
+
+        path = save_profile(profile, label)
+        logging.info(f"Profiled {request.path} to {path}")
+        if isinstance(result, Response):
+            if path:
+                result.headers["X-Profile"] = path
+            return result
+        if isinstance(result, dict):
+            return dict(result, profile={"path": path, "hotspots": hotspots(profile)})
+        return result
+
+    return wrapper
@@ -0,0 +1,271 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+import requests
+from cachetools import TTLCache
+from config import SET_DETAILS_MAX_WORKERS, BUILDABILITY_ENGINE
+from config import CACHE_BACKEND, CACHE_TTL, CACHE_SQLITE_PATH, CACHE_REDIS_URL
+from config import RESULT_CACHE_TTL, RESULT_CACHE_MAX_BYTES, INCREMENTAL_STATE_MAXSIZE, INCREMENTAL_STATE_TTL
+from helpers.api_functions import get_lego_sets, get_user_data, get_user_inventory_details
+from helpers.cache import SingleFlight
+from helpers.cache_backends import create_cache_backend, versioned_key, MemoryCacheBackend
+from helpers.catalog_index import INDEX_ENGINES, CatalogIndex, get_catalog_index, catalog_version
+from helpers.functions import find_buildable_sets, find_sets_with_less_bricks_than_users_inventory
+from helpers.functions import sort_user_inventory, inventory_fingerprint
+from helpers.incremental import IncrementalBuildability
+from helpers.metrics import coalesced_requests, result_cache_lookups, stage_duration
+
+# Holds user data, inventories and computed results; shared between workers unless CACHE_BACKEND is "memory".
+shared_cache = create_cache_backend(CACHE_BACKEND, CACHE_TTL, CACHE_SQLITE_PATH, CACHE_REDIS_URL)
+
+# Computed results keyed by inventory contents and catalog version, so a changed input never hits a stale entry.
+result_cache = MemoryCacheBackend(RESULT_CACHE_TTL, max_bytes=RESULT_CACHE_MAX_BYTES)
+
+# The incremental state of each (username, mode) that has sent an inventory delta. Kept per process, as the state
+# holds references into the catalog index.
+incremental_states: TTLCache = TTLCache(maxsize=INCREMENTAL_STATE_MAXSIZE, ttl=INCREMENTAL_STATE_TTL)
+_incremental_states_lock = threading.Lock()
+
+# Concurrent requests for the same user and mode share one run of the pipeline.
+user_flights = SingleFlight()
+
+
+def load_catalog_index(lego_sets: Dict[str, Any]) -> Optional[Any]:
+    """
+    Returns the index of `lego_sets` for the configured BUILDABILITY_ENGINE, or None when the engine scans every set.
+    """
+    if BUILDABILITY_ENGINE in INDEX_ENGINES:
+        return get_catalog_index(lego_sets, SET_DETAILS_MAX_WORKERS, BUILDABILITY_ENGINE)
+    return None
+
+
+def buildable_sets_key(users_inventory: Dict[str, Any], lego_sets: Dict[str, Any], is_flexible_on_color: bool) -> str:
+    """
+    Returns the key under which the buildable sets for an inventory's contents, a catalog version and a mode are
+    cached.
+    """
+    mode = "color-flexible" if is_flexible_on_color else "exact"
+    return versioned_key(catalog_version(lego_sets), "buildable-sets", mode, inventory_fingerprint(users_inventory))
+
+
+def compute_buildable_sets(users_inventory: Dict[str, Any], lego_sets: Dict[str, Any], is_flexible_on_color: bool,
+                           catalog_index: Optional[Any]) -> Dict[str, Any]:
+    """
+    Finds the buildable sets, reusing an earlier result computed for the same inventory contents, catalog version
+    and mode. Results are looked up in the in-process result cache first and the shared cache second. Results in
+    which some sets could not be checked are not cached.
+
+    Args:
+        users_inventory (Dict[str, Any]): The user's inventory as returned by sort_user_inventory.
+        lego_sets (Dict[str, Any]): The set list as returned by get_lego_sets.
+        is_flexible_on_color (bool): Whether colors may be swapped.
+        catalog_index (Optional[CatalogIndex]): The index for `lego_sets`, or None to scan every set.
+
+    Returns:
+        A dictionary containing the buildable sets, and the sets that could not be checked if there were any.
+    """
+    result_key = buildable_sets_key(users_inventory, lego_sets, is_flexible_on_color)
+    result = result_cache.get(result_key)
+    if result is not None:
+        result_cache_lookups.inc("local")
+        return result
+    result = shared_cache.get(result_key)
+    if result is not None:
+        result_cache_lookups.inc("shared")
+        result_cache.set(result_key, result)
+        return result
+    result_cache_lookups.inc("miss")
+
+    failed_sets: Dict[str, str] = {}
+    with stage_duration.time("find_buildable_sets"):
+        buildable_sets: Dict[str, Dict[str, str]] = find_buildable_sets(
+            users_inventory, lego_sets, is_flexible_on_color, SET_DETAILS_MAX_WORKERS, failed_sets, catalog_index)
+
+    if failed_sets:
+        return {"buildable_sets": buildable_sets, "failed_sets": failed_sets}
+
+    result = {"buildable_sets": buildable_sets}
+    result_cache.set(result_key, result)
+    shared_cache.set(result_key, result)
+    return result
+
+
+def find_buildable_sets_for_user(username: str, is_flexible_on_color: bool,
+                                 lego_sets: Optional[Dict[str, Any]] = None, catalog_index: Optional[Any] = None,
+                                 respond: Optional[Callable[..., Any]] = None) -> Any:
+    """
+    Runs the buildable-sets pipeline for one user in-process. The REST resources, the batch resource and the HTML
+    routes all answer through it.
+
+    Calls that load the catalog themselves and return the computed dictionary are coalesced: while one is in flight
+    for a username and mode, identical calls wait for it and return the same result.
+
+    Args:
+        username (str): The username of the user whose inventory will look through to find buildable sets.
+        is_flexible_on_color (bool): Whether colors may be swapped.
+        lego_sets (Optional[Dict[str, Any]], optional): An already loaded set list, along with `catalog_index`, its
+            index. Both are loaded when None. Defaults to None.
+        catalog_index (Optional[CatalogIndex], optional): The index for `lego_sets`, or None to scan every set.
+            Only used when `lego_sets` is given. Defaults to None.
+        respond (Optional[Callable[..., Any]], optional): Called with (users_inventory, lego_sets,
+            is_flexible_on_color, catalog_index) to produce the result. Defaults to compute_buildable_sets.
+
+    Returns:
+        What `respond` returns, or a dictionary with a message if the user has too few bricks for any set or the
+        pipeline failed.
+    """
+    if lego_sets is None and respond is None:
+        # Requests arriving while the same user and mode are being computed wait for that result, since the
+        # result cache only helps once it has been stored.
+        mode = "color-flexible" if is_flexible_on_color else "exact"
+        result, is_shared = user_flights.do(
+            (username, mode), lambda: _find_buildable_sets_for_user(username, is_flexible_on_color))
+        if is_shared:
+            coalesced_requests.inc(mode)
+        return result
+    return _find_buildable_sets_for_user(username, is_flexible_on_color, lego_sets, catalog_index, respond)
+
+
+def _find_buildable_sets_for_user(username: str, is_flexible_on_color: bool,
+                                  lego_sets: Optional[Dict[str, Any]] = None, catalog_index: Optional[Any] = None,
+                                  respond: Optional[Callable[..., Any]] = None) -> Any:
+    try:
+        with stage_duration.time("user_data"):
+            user_data = shared_cache.get_or_set(
+                versioned_key(None, "user", username), lambda: get_user_data(username))
+        if user_data is None:
+            return {"message": "An error occurred while retrieving user data."}
+
+        loads_catalog = lego_sets is None
+        if loads_catalog:
+            with stage_duration.time("lego_sets"):
+                lego_sets = get_lego_sets()
+
+        if not find_sets_with_less_bricks_than_users_inventory(lego_sets, user_data['brickCount']):
+            return {"message": "No buildable sets found."}
+
+        with stage_duration.time("inventory"):
+            users_inventory: Dict[str, Any] = sort_user_inventory(shared_cache.get_or_set(
+                versioned_key(None, "inventory", str(user_data['id'])), lambda: get_user_inventory_details(user_data)))
+
+        if loads_catalog:
+            with stage_duration.time("catalog_index"):
+                catalog_index = load_catalog_index(lego_sets)
+
+        with stage_duration.time("respond"):
+            return (respond or compute_buildable_sets)(users_inventory, lego_sets, is_flexible_on_color, catalog_index)
+
+    except requests.exceptions.HTTPError as err:
+        logging.error(f"Request error for user {username}: {err}")
+        return {"message": "An error occurred while retrieving user data."}
+
+    except Exception as err:
+        logging.error(f"An error occurred for user {username}: {err}")
+        return {"message": "An error occurred."}
+
+
+def load_inverted_index(lego_sets: Dict[str, Any]) -> CatalogIndex:
+    """
+    Returns the inverted index of `lego_sets`, which incremental updates and rankings need whichever engine answers
+    the other requests.
+    """
+    catalog_index = load_catalog_index(lego_sets)
+    if not isinstance(catalog_index, CatalogIndex):
+        catalog_index = get_catalog_index(lego_sets, SET_DETAILS_MAX_WORKERS, "index")
+    return catalog_index
+
+
+def find_nearly_buildable_sets(username: str, limit: int, rank_by: str = "missing") -> Dict[str, Any]:
+    """
+    Finds the sets a user is closest to being able to build, along with the bricks they are missing for each.
+
+    Args:
+        username (str): The username of the user whose inventory will look through.
+        limit (int): The number of sets to return.
+        rank_by (str, optional): "missing" ranks by fewest missing bricks, "coverage" by the largest fraction of the
+            set's bricks the user owns. Defaults to "missing".
+
+    Returns:
+        A dictionary containing the ranked sets, closest first, or a dictionary with a message if the pipeline failed.
+    """
+    try:
+        user_data = shared_cache.get_or_set(versioned_key(None, "user", username), lambda: get_user_data(username))
+        if user_data is None:
+            return {"message": "An error occurred while retrieving user data."}
+        lego_sets: Dict[str, Any] = get_lego_sets()
+        users_inventory: Dict[str, Any] = sort_user_inventory(shared_cache.get_or_set(
+            versioned_key(None, "inventory", str(user_data['id'])), lambda: get_user_inventory_details(user_data)))
+        catalog_index = load_inverted_index(lego_sets)
+
+        with stage_duration.time("nearly_buildable_sets"):
+            ranked = catalog_index.nearly_buildable_set_ids(users_inventory, limit, rank_by)
+            return {"nearly_buildable_sets": [
+                {"name": catalog_index.set_names[set_id], "id": set_id, "missing_bricks": missing,
+                 "coverage": round((total - missing) / total, 4),
+                 "missing_pieces": catalog_index.missing_pieces(set_id, users_inventory)}
+                for set_id, missing, total in ranked]}
+
+    except requests.exceptions.HTTPError as err:
+        logging.error(f"Request error for user {username}: {err}")
+        return {"message": "An error occurred while retrieving user data."}
+
+    except Exception as err:
+        logging.error(f"An error occurred for user {username}: {err}")
+        return {"message": "An error occurred."}
+
+
+def apply_inventory_delta(username: str, delta: Dict[str, Dict[str, int]], is_flexible_on_color: bool) -> Dict[str, Any]:
+    """
+    Applies a change to a user's inventory and reports the sets that became buildable or stopped being buildable,
+    re-evaluating only the sets that use the changed parts.
+
+    The first delta for a user and mode, and the first one after the catalog changed, starts from the user's
+    inventory as returned by the upstream. Later deltas build on the inventory left by the previous ones.
+
+    Args:
+        username (str): The username of the user whose inventory changed.
+        delta (Dict[str, Dict[str, int]]): The change in count of each brick, as {designID: {material: change}}.
+        is_flexible_on_color (bool): Whether colors may be swapped.
+
+    Returns:
+        A dictionary containing the sets that became buildable and the sets that stopped being buildable, or a
+        dictionary with a message if the pipeline failed. Without color changes, each set that stopped being
+        buildable lists the bricks it is now missing, as in find_nearly_buildable_sets.
+    """
+    try:
+        lego_sets: Dict[str, Any] = get_lego_sets()
+        catalog_index = load_inverted_index(lego_sets)
+
+        key = (username, "color-flexible" if is_flexible_on_color else "exact")
+        with _incremental_states_lock:
+            state: Optional[IncrementalBuildability] = incremental_states.get(key)
+        if state is None or state.catalog_index.version != catalog_index.version:
+            user_data = shared_cache.get_or_set(versioned_key(None, "user", username), lambda: get_user_data(username))
+            if user_data is None:
+                return {"message": "An error occurred while retrieving user data."}
+            users_inventory: Dict[str, Any] = sort_user_inventory(shared_cache.get_or_set(
+                versioned_key(None, "inventory", str(user_data['id'])), lambda: get_user_inventory_details(user_data)))
+            state = IncrementalBuildability(catalog_index, users_inventory, is_flexible_on_color)
+            with _incremental_states_lock:
+                # A concurrent first delta may have stored its state meanwhile; both deltas then go to that one.
+                stored: Optional[IncrementalBuildability] = incremental_states.get(key)
+                if stored is not None and stored.catalog_index.version == catalog_index.version:
+                    state = stored
+                else:
+                    incremental_states[key] = state
+
+        set_names = catalog_index.set_names
+        with state.lock:
+            became_buildable, stopped_being_buildable = state.apply_delta(delta)
+            no_longer_buildable = {set_names[set_id]: {'id': set_id} for set_id in stopped_being_buildable}
+            if not is_flexible_on_color:
+                for set_id in stopped_being_buildable:
+                    no_longer_buildable[set_names[set_id]]['missing_pieces'] = catalog_index.missing_pieces(
+                        set_id, state.inventory)
+
+        return {"became_buildable": {set_names[set_id]: {'id': set_id} for set_id in became_buildable},
+                "no_longer_buildable": no_longer_buildable}
+
+    except Exception as err:
+        logging.error(f"An error occurred for user {username}: {err}")
+        return {"message": "An error occurred."}
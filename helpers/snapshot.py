@@ -0,0 +1,186 @@
+import json
+import mmap
+import sys
+from array import array
+from typing import Dict, List, Optional
+
+MAGIC = b"LEGOSNP1"
+
+# The columns of a snapshot, each a flat array of fixed-width integers. Columns ending in "_string" hold indexes
+# into the string table.
+COLUMNS = {
+    'set_string': 'I',           # per set: the set's entry in the /api/sets list, as JSON
+    'set_details_string': 'I',   # per set: the set details without the pieces, as JSON
+    'set_piece_offset': 'I',     # per set, plus one: where the set's pieces start in the piece columns
+    'piece_design_string': 'I',  # per piece: designID
+    'piece_material_string': 'I',  # per piece: material, as JSON so its type is kept
+    'piece_quantity': 'i',       # per piece: quantity
+    'piece_extra_string': 'I',   # per piece: every other field of the piece and its part, as JSON
+    'string_offset': 'I',        # per string, plus one: where the string starts in the string blob
+}
+
+
+class _Writer:
+
+    def __init__(self):
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        self.string_codes: Dict[str, int] = {}
+        self.strings: List[bytes] = []
+
+    def string(self, value: str) -> int:
+        code = self.string_codes.get(value)
+        if code is None:
+            code = self.string_codes[value] = len(self.strings)
+            self.strings.append(value.encode())
+        return code
+
+
+def write_catalog_snapshot(path: str, lego_sets: Dict, set_details: Dict[str, Dict]) -> None:
+    """
+    Writes the set list and the details of every set in it to one compact binary file.
+
+    The file starts with MAGIC, the length of a JSON header as an 8-byte little-endian integer and the header itself,
+    which gives the byte range of each column and of the string blob. Repeated strings, such as design IDs, are
+    stored once.
+
+    Args:
+        path (str): The file to write.
+        lego_sets (Dict): The set list as returned by get_lego_sets.
+        set_details (Dict[str, Dict]): The details of each set keyed by set id, as returned by get_lego_set_details.
+            Every set in `lego_sets` must have details.
+    """
+    writer = _Writer()
+    columns = writer.columns
+    columns['set_piece_offset'].append(0)
+
+    for lego_set in lego_sets['Sets']:
+        details = dict(set_details[lego_set['id']])
+        pieces = details.pop('pieces')
+        columns['set_string'].append(writer.string(json.dumps(lego_set, sort_keys=True)))
+        columns['set_details_string'].append(writer.string(json.dumps(details, sort_keys=True)))
+        for piece in pieces:
+            part = dict(piece['part'])
+            extra = {key: value for key, value in piece.items() if key not in ('part', 'quantity')}
+            extra['part'] = {key: value for key, value in part.items() if key not in ('designID', 'material')}
+            columns['piece_design_string'].append(writer.string(part['designID']))
+            columns['piece_material_string'].append(writer.string(json.dumps(part['material'])))
+            columns['piece_quantity'].append(piece['quantity'])
+            columns['piece_extra_string'].append(writer.string(json.dumps(extra, sort_keys=True)))
+        columns['set_piece_offset'].append(len(columns['piece_quantity']))
+
+    offset = 0
+    for string in writer.strings:
+        columns['string_offset'].append(offset)
+        offset += len(string)
+    columns['string_offset'].append(offset)
+
+    sections = [(name, column.tobytes() if sys.byteorder == 'little' else _byteswapped(column))
+                for name, column in columns.items()]
+    sections.append(('strings', b"".join(writer.strings)))
+
+    layout = {}
+    position = 0
+    for name, data in sections:
+        layout[name] = [position, len(data)]
+        position += _padded(len(data))
+    header = json.dumps({'sections': layout, 'set_count': len(lego_sets['Sets'])}).encode()
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        f.write(b"\0" * (_padded(len(header)) - len(header)))
+        for _, data in sections:
+            f.write(data)
+            f.write(b"\0" * (_padded(len(data)) - len(data)))
+
+
+class CatalogSnapshot:
+    """
+    A catalog snapshot written by write_catalog_snapshot, memory-mapped read-only so that every worker process
+    reading the same file shares its pages. Columns are read in place; only the set ids are decoded when opening.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The snapshot file.
+
+        Raises:
+            ValueError: If the file is not a catalog snapshot.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot.")
+
+        header_length = int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 8], 'little')
+        header_start = len(MAGIC) + 8
+        header = json.loads(self._mmap[header_start:header_start + header_length])
+        data_start = header_start + _padded(header_length)
+
+        view = memoryview(self._mmap)
+        self._columns = {}
+        for name, (start, length) in header['sections'].items():
+            section = view[data_start + start:data_start + start + length]
+            self._columns[name] = section.cast(COLUMNS[name]) if name in COLUMNS else section
+        if sys.byteorder != 'little':
+            self._columns.update({name: _byteswapped_array(self._columns[name], typecode)
+                                  for name, typecode in COLUMNS.items()})
+
+        self.set_count: int = header['set_count']
+        self._lego_sets: Optional[Dict] = None
+        self._positions: Dict[str, int] = {
+            json.loads(self._string(self._columns['set_string'][position]))['id']: position
+            for position in range(self.set_count)}
+
+    def _string(self, code: int) -> str:
+        offsets = self._columns['string_offset']
+        return bytes(self._columns['strings'][offsets[code]:offsets[code + 1]]).decode()
+
+    def lego_sets(self) -> Dict:
+        """
+        Returns the set list, shaped like the response of get_lego_sets. It is decoded once and must not be modified.
+        """
+        if self._lego_sets is None:
+            self._lego_sets = {'Sets': [json.loads(self._string(self._columns['set_string'][position]))
+                                        for position in range(self.set_count)]}
+        return self._lego_sets
+
+    def set_details(self, lego_set_id: str) -> Optional[Dict]:
+        """
+        Returns the details of a set, shaped like the response of get_lego_set_details, or None if the snapshot
+        does not hold the set.
+        """
+        position = self._positions.get(lego_set_id)
+        if position is None:
+            return None
+
+        columns = self._columns
+        details = json.loads(self._string(columns['set_details_string'][position]))
+        pieces = []
+        for entry in range(columns['set_piece_offset'][position], columns['set_piece_offset'][position + 1]):
+            piece = json.loads(self._string(columns['piece_extra_string'][entry]))
+            piece['part']['designID'] = self._string(columns['piece_design_string'][entry])
+            piece['part']['material'] = json.loads(self._string(columns['piece_material_string'][entry]))
+            piece['quantity'] = columns['piece_quantity'][entry]
+            pieces.append(piece)
+        details['pieces'] = pieces
+        return details
+
+
+def _padded(length: int) -> int:
+    return (length + 7) // 8 * 8
+
+
+def _byteswapped(column: array) -> bytes:
+    swapped = array(column.typecode, column)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _byteswapped_array(view: memoryview, typecode: str) -> array:
+    swapped = array(typecode, view)
+    swapped.byteswap()
+    return swapped
@@ -1,10 +1,13 @@
-import requests, json
 from typing import Dict
+from helpers import json_codec
+from helpers.api_functions import make_get_request
 
 def call_api(url: str) -> Dict:
     """
     Calls a web API at the given URL and returns the JSON response as a dictionary.
 
+    The call goes through the same pooled session, timeouts and retries as make_get_request.
+
     Args:
         url (str): The URL of the API to call.
 
@@ -12,9 +15,9 @@ def call_api(url: str) -> Dict:
         Dict: A dictionary containing the JSON response from the API. If the API returns a non-200 HTTP status code, 
         returns None instead.
     """
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = json.loads(response.content)
+    response = make_get_request(url)
+    if response is not None and response.status_code == 200:
+        data = json_codec.loads(response.content)
         return data
     else:
         return None
\ No newline at end of file
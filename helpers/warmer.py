@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from config import BUILDABILITY_ENGINE, SET_DETAILS_MAX_WORKERS, UPSTREAM_BASE_URL
+from helpers.api_functions import catalog_cache, catalog_snapshot, make_conditional_fetch
+from helpers.cache import NOT_MODIFIED
+from helpers.catalog_index import INDEX_ENGINES, catalog_index_class, publish_catalog_index
+from helpers.metrics import catalog_refreshes
+
+
+def _entry_hash(lego_set: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(lego_set, sort_keys=True).encode()).hexdigest()
+
+
+class CatalogWarmer:
+    """
+    Keeps the catalog loaded from a background thread, so that no request pays for fetching it.
+
+    Each poll revalidates the set list with its ETag. When it changed, only the sets that are new or whose entry in
+    the list changed are fetched again, the index is rebuilt from those and the details already held, and the new set
+    list and index are published together. Until then requests keep using the previous ones.
+
+    Sets that cannot be fetched are published as failed sets of the index, and only those are tried again on the
+    next poll, even if the set list did not change.
+    """
+
+    def __init__(self, interval: float, max_workers: int = SET_DETAILS_MAX_WORKERS,
+                 engine: str = BUILDABILITY_ENGINE):
+        """
+        Args:
+            interval (float): The number of seconds between polls.
+            max_workers (int, optional): The maximum number of set details fetched concurrently.
+                Defaults to SET_DETAILS_MAX_WORKERS.
+            engine (str, optional): The buildability engine whose index is built. No index is built for "python".
+                Defaults to BUILDABILITY_ENGINE.
+        """
+        self.interval = interval
+        self.max_workers = max_workers
+        self.engine = engine
+        self.lego_sets: Optional[Dict[str, Any]] = None
+        self._sets_etag: Optional[str] = None
+        # What the details held below were fetched for: the hash of each set's entry in the set list.
+        self._entry_hashes: Dict[str, str] = {}
+        self._set_details: Dict[str, Dict] = {}
+        self._etags: Dict[str, Optional[str]] = {}
+        # The sets of the published index whose details could not be fetched, mapped to the reason.
+        self.failed_sets: Dict[str, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Starts polling in a daemon thread, beginning with a full load of the catalog.
+        """
+        self._thread = threading.Thread(target=self._run, name="catalog-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops polling and waits for a poll in progress to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as err:
+                catalog_refreshes.inc("failed")
+                logging.error(f"Could not refresh the catalog: {err}")
+            self._stop.wait(self.interval)
+
+    def refresh(self) -> bool:
+        """
+        Polls the set list once and publishes a new catalog if it changed, or if sets that failed before could be
+        fetched this time.
+
+        Returns:
+            bool: True if a new set list and index were published.
+        """
+        sets_url = f"{UPSTREAM_BASE_URL}/api/sets"
+        # A max age of 0 revalidates even a freshly stored set list, so that changes are seen on every poll.
+        result = make_conditional_fetch(sets_url, 0)(self._sets_etag if self.lego_sets is not None else None)
+        if result is None:
+            catalog_refreshes.inc("failed")
+            return False
+        if result is NOT_MODIFIED:
+            # Keeps the cached set list fresh, so that request threads do not revalidate it themselves.
+            catalog_cache.put(sets_url, self.lego_sets, self._sets_etag)
+            if not self.failed_sets:
+                catalog_refreshes.inc("unchanged")
+                return False
+            lego_sets, sets_etag = self.lego_sets, self._sets_etag
+        else:
+            lego_sets, sets_etag = result
+
+        entry_hashes = {lego_set['id']: _entry_hash(lego_set) for lego_set in lego_sets['Sets']}
+        # Sets that failed before are not in _set_details, so they are fetched again.
+        changed = [set_id for set_id, entry_hash in entry_hashes.items()
+                   if self._entry_hashes.get(set_id) != entry_hash or set_id not in self._set_details]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            fetched = list(executor.map(self._fetch_set_details, changed))
+        failed_sets: Dict[str, str] = {}
+        for set_id, (lego_set_details, etag) in zip(changed, fetched):
+            if lego_set_details is None:
+                failed_sets[set_id] = "Set details could not be retrieved."
+                continue
+            self._set_details[set_id] = lego_set_details
+            self._etags[set_id] = etag
+            self._entry_hashes[set_id] = entry_hashes[set_id]
+        for set_id in set(self._set_details) - set(entry_hashes):
+            del self._set_details[set_id]
+            self._etags.pop(set_id, None)
+            self._entry_hashes.pop(set_id, None)
+
+        if failed_sets:
+            logging.error(f"Could not fetch {len(failed_sets)} sets of the catalog: {', '.join(failed_sets)}")
+        if result is NOT_MODIFIED and len(failed_sets) == len(self.failed_sets):
+            # None of the sets that failed before could be fetched this time either.
+            catalog_refreshes.inc("failed")
+            return False
+
+        if self.engine in INDEX_ENGINES:
+            index = catalog_index_class(self.engine)(lego_sets, self._set_details, failed_sets)
+            publish_catalog_index(index)
+        for set_id in changed:
+            if set_id not in failed_sets:
+                catalog_cache.put(self._set_details_url(set_id), self._set_details[set_id], self._etags[set_id])
+        catalog_cache.put(sets_url, lego_sets, sets_etag)
+        self.lego_sets, self._sets_etag, self.failed_sets = lego_sets, sets_etag, failed_sets
+
+        logging.info(f"Published a catalog of {len(entry_hashes)} sets, {len(changed)} of them fetched again, "
+                     f"{len(failed_sets)} failed")
+        catalog_refreshes.inc("partial" if failed_sets else "published")
+        return True
+
+    @staticmethod
+    def _set_details_url(set_id: str) -> str:
+        return f"{UPSTREAM_BASE_URL}/api/set/by-id/{set_id}"
+
+    def _fetch_set_details(self, set_id: str) -> Tuple[Optional[Dict], Optional[str]]:
+        etag = self._etags.get(set_id) if set_id in self._set_details else None
+        try:
+            result = make_conditional_fetch(self._set_details_url(set_id), 0)(etag)
+        except Exception as err:
+            logging.error(f"Could not fetch details for set {set_id}: {err}")
+            return None, None
+        if result is NOT_MODIFIED:
+            return self._set_details[set_id], etag
+        if result is None:
+            return None, None
+        return result
+
+
+def start_catalog_warmer(interval: float) -> Optional[CatalogWarmer]:
+    """
+    Starts a CatalogWarmer polling every `interval` seconds, unless `interval` is 0 or the catalog is served from a
+    snapshot.
+
+    Returns:
+        Optional[CatalogWarmer]: The started warmer, or None.
+    """
+    if interval <= 0 or catalog_snapshot is not None:
+        return None
+    warmer = CatalogWarmer(interval)
+    warmer.start()
+    return warmer
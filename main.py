@@ -1,29 +1,121 @@
-from flask import Flask
+import click
+import time
+from flask import Flask, Response, g, request
 from flask_restful import Api, Resource
-from cachetools import TTLCache
-import requests
+from concurrent.futures import ThreadPoolExecutor
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional
 from helpers.api_functions import *
-from helpers.functions import find_buildable_sets
-from helpers.functions import find_sets_with_less_bricks_than_users_inventory
-from helpers.functions import sort_user_inventory
+from helpers import json_codec
+from helpers.functions import iter_buildable_sets
+from helpers.service import find_buildable_sets_for_user, load_catalog_index, apply_inventory_delta
+from helpers.service import find_nearly_buildable_sets
 from routes import routes_bp
+from helpers.snapshot import write_catalog_snapshot
+from helpers.metrics import registry, request_duration
+from helpers.profiling import profiled
+from helpers.warmer import start_catalog_warmer
+from config import SET_DETAILS_MAX_WORKERS, BATCH_MAX_WORKERS, BATCH_STREAM_THRESHOLD, METRICS_ENABLED
+from config import NEARLY_BUILDABLE_LIMIT, NEARLY_BUILDABLE_MAX_LIMIT, CATALOG_WARMER_INTERVAL
 
 app = Flask(__name__)
 api = Api(app)
 
 
+@api.representation("application/json")
+def output_json(data: Any, code: int, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Encodes the results of the resources with the configured JSON codec.
+    """
+    response = Response(json_codec.dumps(data) + "\n", status=code, mimetype="application/json")
+    response.headers.extend(headers or {})
+    return response
+
+
 app.register_blueprint(routes_bp)
 
+catalog_warmer = start_catalog_warmer(CATALOG_WARMER_INTERVAL)
+
+
+@app.before_request
+def start_request_timer() -> None:
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response: Response) -> Response:
+    started = g.pop("request_started", None)
+    if started is None or request.url_rule is None:
+        return response
+    endpoint = request.url_rule.rule
+    if response.is_streamed:
+        # The body of a stream, such as NDJSON, is computed while it is sent, after this hook has run.
+        response.call_on_close(lambda: request_duration.observe(time.perf_counter() - started, endpoint))
+    else:
+        request_duration.observe(time.perf_counter() - started, endpoint)
+    return response
+
+
+@app.route("/metrics")
+def metrics() -> Response:
+    """
+    Serves the request, upstream and cache metrics of this process in the Prometheus text format.
+    """
+    if not METRICS_ENABLED:
+        return Response("Metrics are disabled.\n", status=404, mimetype="text/plain")
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+def wants_ndjson() -> bool:
+    """
+    Returns True if the current request asked for a streamed NDJSON response, either with ?stream=1 or by
+    preferring application/x-ndjson in its Accept header.
+    """
+    return request.args.get("stream") == "1" or request.accept_mimetypes.best == "application/x-ndjson"
+
+
+def stream_buildable_sets(users_inventory: Dict[str, Any], lego_sets: Dict[str, Any], is_flexible_on_color: bool,
+                          catalog_index: Optional[Any]) -> Response:
+    """
+    Streams the buildable sets as NDJSON, one {"buildable_set": {...}} or {"failed_set": {...}} line per set as soon
+    as it has been checked, followed by a {"summary": {...}} line.
+
+    Args:
+        users_inventory (Dict[str, Any]): The user's inventory as returned by sort_user_inventory.
+        lego_sets (Dict[str, Any]): The set list as returned by get_lego_sets.
+        is_flexible_on_color (bool): Whether colors may be swapped.
+        catalog_index (Optional[CatalogIndex]): The index for `lego_sets`, or None to scan every set.
+
+    Returns:
+        Response: The streaming response.
+    """
+    def lines() -> Iterator[str]:
+        counts = {"buildable_sets": 0, "failed_sets": 0}
+        try:
+            for record in iter_buildable_sets(
+                    users_inventory, lego_sets, is_flexible_on_color, SET_DETAILS_MAX_WORKERS, catalog_index):
+                if 'error' in record:
+                    counts["failed_sets"] += 1
+                    yield json_codec.dumps({"failed_set": record}) + "\n"
+                else:
+                    counts["buildable_sets"] += 1
+                    yield json_codec.dumps({"buildable_set": record}) + "\n"
+        except Exception as err:
+            logging.error(f"An error occurred: {err}")
+            yield json_codec.dumps({"message": "An error occurred."}) + "\n"
+            return
+        yield json_codec.dumps({"summary": counts}) + "\n"
+
+    return Response(lines(), mimetype="application/x-ndjson")
+
 
 class BuildableSetsFromCurrentInventory(Resource):
     """
     Resource class for finding buildable sets from a user's current inventory.
     """
 
+    method_decorators = [profiled]
     logging.basicConfig(level=logging.DEBUG)
-    cache = TTLCache(maxsize=1000, ttl=180)
 
     def get(self, username: str) -> Dict[str, Any]:
         """
@@ -33,83 +125,170 @@ class BuildableSetsFromCurrentInventory(Resource):
             username (str): The username of the user whose inventory will look through to find buildable sets.
 
         Returns:
-            A dictionary containing a list of buildable sets from current inventory
+            A dictionary containing a list of buildable sets from current inventory, or an NDJSON stream of them
+            if the request asked for one with ?stream=1 or an Accept header.
         """
-        try:
-            user_data = get_user_data(username)
+        respond = stream_buildable_sets if wants_ndjson() else None
+        return find_buildable_sets_for_user(username, False, respond=respond)
 
-            lego_sets: Dict[str, Any] = get_lego_sets()
 
-            sets_buildable_with_users_lego_count: Dict[str, str] = find_sets_with_less_bricks_than_users_inventory(
-                lego_sets, user_data['brickCount'])
+class BuildableSetsWithColorFlexibility(Resource):
+    """
+    Resource class for finding sets that can be build from a user's current inventory if they're swapping out at least one color.
+    """
+    method_decorators = [profiled]
+    logging.basicConfig(level=logging.DEBUG)
+
+    def get(self, username: str) -> Dict[str, Any]:
+        """
+        Returns a list of sets a user could build if they're willing to swap at least one color out with another 
+        unused color in the inventory for an entire compoent. e.g. a red roof becomes a pink roof.
+
+        Args:
+            username (str): The username of the user whose inventory will look through to find buildable sets.
+
+        Returns:
+            A dictionary containing a list of sets a user can build if they're swapping colors out, or an NDJSON
+            stream of them if the request asked for one with ?stream=1 or an Accept header.
+        """
+        respond = stream_buildable_sets if wants_ndjson() else None
+        return find_buildable_sets_for_user(username, True, respond=respond)
 
-            if not sets_buildable_with_users_lego_count:
-                return {"message": "No buildable sets found."}
 
-            users_inventory: Dict[str, Any] = sort_user_inventory(
-                get_user_inventory_details(user_data))
+class BuildableSetsBatch(Resource):
+    """
+    Resource class for finding buildable sets for many users in one call.
+    """
 
-            buildable_sets: Dict[str, Dict[str, str]] = find_buildable_sets(
-                users_inventory, lego_sets, False)
+    def post(self) -> Any:
+        """
+        Returns the buildable sets of every user in the request body, which looks like
+        {"usernames": ["brickfan35", ...], "is_flexible_on_color": false}.
 
-            return {"buildable_sets": buildable_sets}
+        The catalog is loaded and indexed once and the users are evaluated concurrently against it. Batches of
+        BATCH_STREAM_THRESHOLD users or more, and requests asking for NDJSON, are answered with one
+        JSON line per user in request order.
 
-        except requests.exceptions.HTTPError as err:
-            logging.error(f"Request error: {err}")
-            return {"message": "An error occurred while retrieving user data."}
+        Returns:
+            A dictionary mapping each username to its result, or an NDJSON stream of the results.
+        """
+        body = request.get_json(silent=True)
+        usernames = body.get("usernames") if isinstance(body, dict) else None
+        if not isinstance(usernames, list) or not all(isinstance(username, str) for username in usernames):
+            return {"message": "The request body must contain a list of usernames."}, 400
+        is_flexible_on_color = body.get("is_flexible_on_color", False)
+        if not isinstance(is_flexible_on_color, bool):
+            return {"message": "is_flexible_on_color must be true or false."}, 400
 
+        try:
+            lego_sets: Dict[str, Any] = get_lego_sets()
+            catalog_index = load_catalog_index(lego_sets)
         except Exception as err:
             logging.error(f"An error occurred: {err}")
-            return {"message": "An error occurred."}
+            return {"message": "An error occurred while retrieving the catalog."}
 
+        def results() -> Iterator[Dict[str, Any]]:
+            with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+                yield from executor.map(
+                    lambda username: dict(find_buildable_sets_for_user(
+                        username, is_flexible_on_color, lego_sets, catalog_index), username=username),
+                    usernames)
 
-class BuildableSetsWithColorFlexibility(Resource):
+        if wants_ndjson() or len(usernames) >= BATCH_STREAM_THRESHOLD:
+            return Response((json_codec.dumps(result) + "\n" for result in results()), mimetype="application/x-ndjson")
+
+        return {"results": {result.pop("username"): result for result in results()}}
+
+
+class BuildableSetsInventoryDelta(Resource):
     """
-    Resource class for finding sets that can be build from a user's current inventory if they're swapping out at least one color.
+    Resource class for updating a user's buildable sets after a change to their inventory.
     """
-    logging.basicConfig(level=logging.DEBUG)
-    cache = TTLCache(maxsize=1000, ttl=180)
 
-    def get(self, username: str) -> Dict[str, Any]:
+    def post(self, username: str) -> Any:
         """
-        Returns a list of sets a user could build if they're willing to swap at least one color out with another 
-        unused color in the inventory for an entire compoent. e.g. a red roof becomes a pink roof.
+        Applies the inventory change in the request body, which looks like
+        {"delta": [{"pieceId": "3023", "color": "5", "count": 4}, ...], "is_flexible_on_color": false}, where a
+        negative count removes bricks. Only the sets that use the changed parts are evaluated again.
 
         Args:
-            username (str): The username of the user whose inventory will look through to find buildable sets.
+            username (str): The username of the user whose inventory changed.
 
         Returns:
-            A dictionary containing a list of sets a user can build if they're swapping colors out.
+            A dictionary containing the sets that became buildable and the sets that stopped being buildable, the
+            latter with the bricks each is missing when colors are not changeable.
         """
-        try:
-            if username not in self.cache:
-                self.cache[username] = get_user_data(username)
+        body = request.get_json(silent=True)
+        changes = body.get("delta") if isinstance(body, dict) else None
+        if not isinstance(changes, list) or not all(
+                isinstance(change, dict) and isinstance(change.get("pieceId"), str)
+                and isinstance(change.get("color"), (str, int)) and type(change.get("count")) is int
+                for change in changes):
+            return {"message": "The request body must contain a list of changes with a pieceId, color and count."}, 400
+        is_flexible_on_color = body.get("is_flexible_on_color", False)
+        if not isinstance(is_flexible_on_color, bool):
+            return {"message": "is_flexible_on_color must be true or false."}, 400
+
+        delta: Dict[str, Dict[str, int]] = {}
+        for change in changes:
+            colors = delta.setdefault(change["pieceId"], {})
+            color = str(change["color"])
+            colors[color] = colors.get(color, 0) + change["count"]
+
+        return apply_inventory_delta(username, delta, is_flexible_on_color)
+
+
+class NearlyBuildableSets(Resource):
+    """
+    Resource class for finding the sets a user is closest to being able to build.
+    """
 
-            user_data = self.cache[username]
+    method_decorators = [profiled]
 
-            lego_sets: Dict[str, Any] = get_lego_sets()
+    def get(self, username: str) -> Any:
+        """
+        Returns the sets the user cannot build yet that need the fewest extra bricks, with the bricks missing for
+        each. ?limit= sets how many are returned, and ?rank_by=coverage ranks by the fraction of each set the user
+        already owns instead.
 
-            sets_buildable_with_users_lego_count: Dict[str, str] = find_sets_with_less_bricks_than_users_inventory(
-                lego_sets, user_data['brickCount'])
+        Args:
+            username (str): The username of the user whose inventory will look through.
 
-            if not sets_buildable_with_users_lego_count:
-                return {"message": "No buildable sets found."}
+        Returns:
+            A dictionary containing the ranked sets, closest first.
+        """
+        limit = request.args.get("limit", str(NEARLY_BUILDABLE_LIMIT))
+        # isdigit alone accepts digits such as "²" that int() rejects.
+        if not (limit.isascii() and limit.isdigit()) or not 1 <= int(limit) <= NEARLY_BUILDABLE_MAX_LIMIT:
+            return {"message": f"limit must be a number from 1 to {NEARLY_BUILDABLE_MAX_LIMIT}."}, 400
+        rank_by = request.args.get("rank_by", "missing")
+        if rank_by not in ("missing", "coverage"):
+            return {"message": "rank_by must be missing or coverage."}, 400
 
-            users_inventory: Dict[str, Any] = sort_user_inventory(
-                get_user_inventory_details(user_data))
+        return find_nearly_buildable_sets(username, int(limit), rank_by)
 
-            buildable_sets: Dict[str, Dict[str, str]] = find_buildable_sets(
-                users_inventory, lego_sets, True)
 
-            return {"buildable_sets": buildable_sets}
+@app.cli.command("snapshot-catalog")
+@click.argument("path")
+def snapshot_catalog(path: str) -> None:
+    """
+    Downloads the set list and the details of every set from the upstream API and writes them to a catalog
+    snapshot at PATH. Point CATALOG_SNAPSHOT_PATH at the file to serve the catalog from it.
+    """
+    lego_sets = get_lego_sets(use_snapshot=False)
+    if lego_sets is None:
+        raise click.ClickException("The set list could not be retrieved.")
 
-        except requests.exceptions.HTTPError as err:
-            logging.error(f"Request error: {err}")
-            return {"message": "An error occurred while retrieving user data."}
+    set_ids = [lego_set['id'] for lego_set in lego_sets['Sets']]
+    with ThreadPoolExecutor(max_workers=SET_DETAILS_MAX_WORKERS) as executor:
+        details = list(executor.map(lambda set_id: get_lego_set_details(set_id, use_snapshot=False), set_ids))
 
-        except Exception as err:
-            logging.error(f"An error occurred: {err}")
-            return {"message": "An error occurred."}
+    missing = [set_id for set_id, set_details in zip(set_ids, details) if set_details is None]
+    if missing:
+        raise click.ClickException(f"The details of {len(missing)} sets could not be retrieved: {', '.join(missing)}")
+
+    write_catalog_snapshot(path, lego_sets, dict(zip(set_ids, details)))
+    click.echo(f"Wrote {len(set_ids)} sets to {path}.")
 
 
 api.add_resource(BuildableSetsFromCurrentInventory,
@@ -118,6 +297,15 @@ api.add_resource(BuildableSetsFromCurrentInventory,
 api.add_resource(BuildableSetsWithColorFlexibility,
                  "/api/v1.0/buildable-sets-additional/<string:username>")
 
+api.add_resource(BuildableSetsBatch,
+                 "/api/v1.0/buildable-sets:batch")
+
+api.add_resource(BuildableSetsInventoryDelta,
+                 "/api/v1.0/buildable-sets/<string:username>/inventory-delta")
+
+api.add_resource(NearlyBuildableSets,
+                 "/api/v1.0/nearly-buildable-sets/<string:username>")
+
 
 if __name__ == "__main__":
     app.run(debug=True)  # TODO DO NOT INCLUDE IN PRODUCTION ENVIRONMENT
@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import requests
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers.api_functions import *
+
+
+def fake_response(status_code: int, headers=None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response.url = "https://example.com"
+    return response
+
+
+class TestMakeGetRequest(unittest.TestCase):
+
+    def test_make_get_request_retries_server_errors(self):
+        """
+        Test that 5xx and 429 responses are retried and the first successful response is returned.
+        """
+        responses = [fake_response(503), fake_response(429, {"Retry-After": "1"}), fake_response(200)]
+        with mock.patch('helpers.api_functions.session') as session, mock.patch('time.sleep') as sleep:
+            session.get.side_effect = responses
+            response = make_get_request("https://example.com")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.get.call_count, 3)
+        self.assertEqual(sleep.call_args_list[1], mock.call(1.0))
+        self.assertEqual(session.get.call_args.kwargs['timeout'], (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+
+    def test_make_get_request_returns_none_after_last_retry(self):
+        """
+        Test that None is returned once every attempt has timed out.
+        """
+        with mock.patch('helpers.api_functions.session') as session, mock.patch('time.sleep'):
+            session.get.side_effect = requests.exceptions.Timeout("read timed out")
+            response = make_get_request("https://example.com")
+
+        self.assertIsNone(response)
+        self.assertEqual(session.get.call_count, HTTP_MAX_RETRIES + 1)
+
+    def test_make_get_request_does_not_retry_client_errors(self):
+        """
+        Test that a 404 response is not retried and None is returned.
+        """
+        with mock.patch('helpers.api_functions.session') as session, mock.patch('time.sleep'):
+            session.get.return_value = fake_response(404)
+            response = make_get_request("https://example.com")
+
+        self.assertIsNone(response)
+        self.assertEqual(session.get.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
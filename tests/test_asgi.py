@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+try:
+    import httpx
+    from starlette.testclient import TestClient
+    import asgi
+    from helpers import async_api_functions
+except ImportError:
+    asgi = None
+
+from helpers import catalog_index
+from helpers.cache import AsyncCatalogCache
+from helpers.cache_backends import MemoryCacheBackend
+from test_main import LEGO_SETS, SET_DETAILS, USERS, INVENTORIES
+
+
+@unittest.skipIf(asgi is None, "starlette and httpx are not installed")
+class TestAsgiApp(unittest.TestCase):
+    """
+    Runs the ASGI app against an upstream served from the fixtures in test_main.
+    """
+
+    def setUp(self):
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requested_paths = []
+        self.loop_threads = set()
+        patches = [
+            mock.patch.object(asgi, 'create_client', lambda: httpx.AsyncClient(transport=httpx.MockTransport(
+                self.upstream))),
+            mock.patch.object(asgi, 'result_cache', MemoryCacheBackend(ttl=3600)),
+            mock.patch.object(catalog_index, '_current_index', None),
+            mock.patch.object(catalog_index, '_previous_index', None),
+            mock.patch.object(catalog_index, '_partial_index', None),
+            mock.patch.object(async_api_functions, 'catalog_cache', AsyncCatalogCache(maxsize=100, ttl=3600)),
+            mock.patch.object(async_api_functions, 'catalog_snapshot', None),
+            mock.patch.dict('helpers.functions.set_summaries', clear=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def upstream(self, request):
+        path = request.url.path
+        self.requested_paths.append(path)
+        self.loop_threads.add(threading.get_ident())
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            # Lets the other requests of the same batch start before this one completes.
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+
+        if path == "/api/sets":
+            return httpx.Response(200, json=LEGO_SETS)
+        if path.startswith("/api/set/by-id/"):
+            return httpx.Response(200, json=SET_DETAILS[path.rsplit("/", 1)[1]])
+        if path.startswith("/api/user/by-username/"):
+            user = USERS.get(path.rsplit("/", 1)[1])
+            return httpx.Response(200, json=user) if user is not None else httpx.Response(404)
+        if path.startswith("/api/user/by-id/"):
+            return httpx.Response(200, json=INVENTORIES[path.rsplit("/", 1)[1]])
+        return httpx.Response(404)
+
+    def get(self, url):
+        with TestClient(asgi.app) as client:
+            return client.get(url)
+
+    def test_returns_the_same_body_as_the_wsgi_app(self):
+        """
+        Test that both endpoints answer with the same response shapes as the Flask resources.
+        """
+        for engine in ("python", "index"):
+            with self.subTest(engine=engine), mock.patch.object(asgi, 'BUILDABILITY_ENGINE', engine):
+                self.assertEqual(self.get("/api/v1.0/buildable-sets/brickfan35").json(),
+                                 {"buildable_sets": {"Small House": {"id": "a"}}})
+                self.assertEqual(self.get("/api/v1.0/buildable-sets/landscape-artist").json(),
+                                 {"buildable_sets": {"Big House": {"id": "b"}}})
+                self.assertEqual(self.get("/api/v1.0/buildable-sets-additional/landscape-artist").json(),
+                                 {"buildable_sets": {}})
+
+    def test_unknown_user_returns_a_message(self):
+        """
+        Test that a user the upstream does not know is answered with an error message instead of a server error.
+        """
+        response = self.get("/api/v1.0/buildable-sets/nobody")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"message": "An error occurred while retrieving user data."})
+
+    def test_upstream_calls_are_awaited_concurrently(self):
+        """
+        Test that the user data and the set list are requested together, and that the set details are fetched
+        concurrently.
+        """
+        with mock.patch.object(asgi, 'BUILDABILITY_ENGINE', "python"):
+            self.get("/api/v1.0/buildable-sets/landscape-artist")
+
+        self.assertEqual(set(self.requested_paths[:2]), {"/api/user/by-username/landscape-artist", "/api/sets"})
+        self.assertGreater(self.peak_in_flight, 1)
+
+    def test_set_details_are_served_from_the_catalog_cache(self):
+        """
+        Test that a second request does not fetch the set list or the set details again.
+        """
+        with mock.patch.object(asgi, 'BUILDABILITY_ENGINE', "python"):
+            self.get("/api/v1.0/buildable-sets/landscape-artist")
+            self.requested_paths.clear()
+            self.get("/api/v1.0/buildable-sets-additional/landscape-artist")
+
+        self.assertEqual(sorted(self.requested_paths),
+                         ["/api/user/by-id/u2", "/api/user/by-username/landscape-artist"])
+
+    def test_sets_are_checked_off_the_event_loop(self):
+        """
+        Test that the fetched sets are checked in a worker thread, so that the checks do not block the event loop.
+        """
+        check_threads = set()
+        check = asgi.set_check(False)
+
+        def recording_check(user_inventory, lego_bricks):
+            check_threads.add(threading.get_ident())
+            return check(user_inventory, lego_bricks)
+
+        with mock.patch.object(asgi, 'BUILDABILITY_ENGINE', "python"), \
+                mock.patch.object(asgi, 'set_check', lambda is_flexible_on_color: recording_check):
+            response = self.get("/api/v1.0/buildable-sets/landscape-artist")
+
+        self.assertEqual(response.json(), {"buildable_sets": {"Big House": {"id": "b"}}})
+        self.assertTrue(check_threads)
+        self.assertFalse(check_threads & self.loop_threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import asyncio
+import os
+import sys
+import threading
+import unittest
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers.cache import AsyncCatalogCache, CatalogCache, NOT_MODIFIED, SingleFlight
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCatalogCache(unittest.TestCase):
+
+    def test_cache_serves_hits_until_ttl_expires(self):
+        """
+        Test that a cached value is served without fetching again until its time-to-live has passed.
+        """
+        clock = FakeClock()
+        cache = CatalogCache(maxsize=10, ttl=60, timer=clock)
+        calls = []
+
+        def fetch(etag):
+            calls.append(etag)
+            return {'Sets': []}, None
+
+        self.assertEqual(cache.get('sets', fetch), {'Sets': []})
+        clock.now = 59
+        self.assertEqual(cache.get('sets', fetch), {'Sets': []})
+        self.assertEqual(len(calls), 1)
+
+        clock.now = 61
+        cache.get('sets', fetch)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_cache_evicts_least_recently_used_entry(self):
+        """
+        Test that the least recently used entry is evicted once the cache grows past its maximum size.
+        """
+        cache = CatalogCache(maxsize=2, ttl=60)
+        cache.get('a', lambda etag: ('A', None))
+        cache.get('b', lambda etag: ('B', None))
+        cache.get('a', lambda etag: ('A', None))
+        cache.get('c', lambda etag: ('C', None))
+
+        self.assertEqual(cache.get('a', lambda etag: ('new A', None)), 'A')
+        self.assertEqual(cache.get('b', lambda etag: ('new B', None)), 'new B')
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_cache_revalidates_expired_entry_with_etag(self):
+        """
+        Test that an expired entry is revalidated with its ETag and kept when the upstream reports it unchanged.
+        """
+        clock = FakeClock()
+        cache = CatalogCache(maxsize=10, ttl=60, timer=clock)
+        cache.get('sets', lambda etag: ({'Sets': [1]}, '"v1"'))
+        clock.now = 61
+
+        seen_etags = []
+
+        def fetch(etag):
+            seen_etags.append(etag)
+            return NOT_MODIFIED
+
+        self.assertEqual(cache.get('sets', fetch), {'Sets': [1]})
+        self.assertEqual(seen_etags, ['"v1"'])
+        self.assertEqual(cache.stats()['revalidations'], 1)
+
+    def test_cache_does_not_store_failed_fetches(self):
+        """
+        Test that a failed fetch is returned as None and not cached.
+        """
+        cache = CatalogCache(maxsize=10, ttl=60)
+        self.assertIsNone(cache.get('sets', lambda etag: None))
+        self.assertEqual(cache.get('sets', lambda etag: ('ok', None)), 'ok')
+
+    def test_cache_coalesces_concurrent_misses(self):
+        """
+        Test that concurrent misses for the same key cause a single fetch.
+        """
+        cache = CatalogCache(maxsize=10, ttl=60)
+        release = threading.Event()
+        calls = []
+
+        def fetch(etag):
+            calls.append(etag)
+            release.wait(5)
+            return 'value', None
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('sets', fetch))) for _ in range(50)]
+        for thread in threads:
+            thread.start()
+        while cache.stats()['coalesced'] < 49:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 50)
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_result_or_error(self):
+        """
+        Test that callers arriving while a call is in flight get its result, or its exception, without running their
+        own, and that the next call after it finished runs again.
+        """
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute(outcome):
+            def run():
+                calls.append(outcome)
+                started.set()
+                release.wait()
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return outcome
+            return run
+
+        for outcome in ("result", ValueError("upstream down")):
+            started.clear()
+            release.clear()
+            results = []
+
+            def call():
+                try:
+                    results.append(flights.do("key", compute(outcome)))
+                except ValueError as err:
+                    results.append(err)
+
+            leader = threading.Thread(target=call)
+            leader.start()
+            started.wait()
+            followers = [threading.Thread(target=call) for _ in range(3)]
+            for follower in followers:
+                follower.start()
+            # Gives the followers time to join the flight before it completes.
+            for follower in followers:
+                follower.join(timeout=0.05)
+            release.set()
+            for thread in [leader, *followers]:
+                thread.join()
+
+            if isinstance(outcome, Exception):
+                self.assertEqual(results, [outcome] * 4)
+            else:
+                self.assertEqual(sorted(results, key=lambda result: result[1]),
+                                 [("result", False)] + [("result", True)] * 3)
+        self.assertEqual(len(calls), 2)
+
+
+class TestAsyncCatalogCache(unittest.TestCase):
+
+    def test_cache_coalesces_concurrent_misses(self):
+        """
+        Test that concurrent misses for the same key within the event loop cause a single fetch, and that the next
+        call is a hit.
+        """
+        cache = AsyncCatalogCache(maxsize=10, ttl=60)
+        calls = []
+
+        async def fetch(etag):
+            calls.append(etag)
+            await asyncio.sleep(0.01)
+            return 'value', None
+
+        async def run():
+            results = await asyncio.gather(*(cache.get('sets', fetch) for _ in range(50)))
+            return results, await cache.get('sets', fetch)
+
+        results, cached = asyncio.run(run())
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 50)
+        self.assertEqual(cached, 'value')
+        self.assertEqual(cache.stats()['coalesced'], 49)
+
+    def test_cache_shares_fetch_errors_with_waiters(self):
+        """
+        Test that a failing fetch raises in every waiting caller and is not cached.
+        """
+        cache = AsyncCatalogCache(maxsize=10, ttl=60)
+
+        async def fetch(etag):
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream down")
+
+        async def run():
+            return await asyncio.gather(*(cache.get('sets', fetch) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(run())
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(cache.stats()['size'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers.cache_backends import *
+
+
+class FakeRedis:
+    """
+    A local stand-in for a Redis server, implementing the commands the backend uses.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key, (None, None))[0]
+
+    def set(self, key, value, ex=None):
+        self.values[key] = (value.encode(), ex)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class CacheBackendContract:
+    """
+    Tests every backend must pass. Subclasses provide make_backend.
+    """
+
+    def make_backend(self, ttl: float) -> CacheBackend:
+        raise NotImplementedError
+
+    def test_set_then_get_round_trips_json_values(self):
+        backend = self.make_backend(ttl=60)
+        backend.set("lego:any:user:brickfan35", {"id": "u1", "brickCount": 10})
+
+        self.assertEqual(backend.get("lego:any:user:brickfan35"), {"id": "u1", "brickCount": 10})
+        self.assertIsNone(backend.get("lego:any:user:nobody"))
+
+    def test_delete_removes_value(self):
+        backend = self.make_backend(ttl=60)
+        backend.set("key", [1, 2])
+        backend.delete("key")
+
+        self.assertIsNone(backend.get("key"))
+
+    def test_get_or_set_does_not_store_none(self):
+        backend = self.make_backend(ttl=60)
+        calls = []
+
+        self.assertIsNone(backend.get_or_set("key", lambda: calls.append(1)))
+        self.assertEqual(backend.get_or_set("key", lambda: "value"), "value")
+        self.assertEqual(backend.get_or_set("key", lambda: "other"), "value")
+
+
+class TestMemoryCacheBackend(CacheBackendContract, unittest.TestCase):
+
+    def make_backend(self, ttl):
+        return MemoryCacheBackend(ttl)
+
+    def test_entries_expire(self):
+        now = [0.0]
+        backend = MemoryCacheBackend(ttl=60, timer=lambda: now[0])
+        backend.set("key", "value")
+        now[0] = 61
+
+        self.assertIsNone(backend.get("key"))
+
+    def test_size_bounded_cache_evicts_least_recently_used(self):
+        """
+        Test that a cache bounded by size evicts the least recently used values to stay under its cap, and skips
+        values larger than the cap.
+        """
+        backend = MemoryCacheBackend(ttl=60, max_bytes=20)
+        backend.set("a", "x" * 8)
+        backend.set("b", "y" * 8)
+        backend.get("a")
+        backend.set("c", "z" * 8)
+        backend.set("huge", "h" * 100)
+
+        self.assertIsNotNone(backend.get("a"))
+        self.assertIsNone(backend.get("b"))
+        self.assertIsNone(backend.get("huge"))
+        self.assertLessEqual(backend.currsize, 20)
+
+
+class TestSQLiteCacheBackend(CacheBackendContract, unittest.TestCase):
+
+    def make_backend(self, ttl):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SQLiteCacheBackend(ttl, os.path.join(directory.name, "cache.sqlite3"))
+
+    def test_entries_are_shared_between_instances(self):
+        """
+        Test that two backends on the same file, as in two worker processes, see each other's entries.
+        """
+        first = self.make_backend(ttl=60)
+        second = SQLiteCacheBackend(60, first.path)
+        first.set("key", {"shared": True})
+
+        self.assertEqual(second.get("key"), {"shared": True})
+
+    def test_expired_entries_are_not_returned(self):
+        backend = self.make_backend(ttl=60)
+        backend.set("key", "value", ttl=-1)
+
+        self.assertIsNone(backend.get("key"))
+
+    def test_concurrent_writes_are_all_counted(self):
+        """
+        Test that writes from several threads are each counted once towards the purge of expired rows.
+        """
+        backend = self.make_backend(ttl=60)
+
+        def write(thread):
+            for count in range(32):
+                backend.set(f"{thread}-{count}", count)
+
+        threads = [threading.Thread(target=write, args=(thread,)) for thread in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(backend._writes, 8 * 32)
+
+
+class TestRedisCacheBackend(CacheBackendContract, unittest.TestCase):
+
+    def make_backend(self, ttl):
+        return RedisCacheBackend(ttl, FakeRedis())
+
+    def test_set_passes_ttl_to_server(self):
+        client = FakeRedis()
+        RedisCacheBackend(180, client).set("key", "value")
+
+        self.assertEqual(client.values["key"][1], 180)
+
+
+class TestVersionedKey(unittest.TestCase):
+
+    def test_versioned_key_includes_catalog_revision(self):
+        self.assertEqual(versioned_key("abc", "result", "brickfan35"), "lego:abc:result:brickfan35")
+        self.assertEqual(versioned_key(None, "user", "brickfan35"), "lego:any:user:brickfan35")
+
+
+if __name__ == '__main__':
+    unittest.main()
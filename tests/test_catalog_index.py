@@ -0,0 +1,197 @@
+import json
+import os
+import random
+import sys
+import threading
+import unittest
+from unittest import mock
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers.functions import user_can_build_set
+from helpers import catalog_index
+from helpers.catalog_index import CatalogIndex, catalog_version, get_catalog_index
+
+
+def random_catalog(rng: random.Random, set_count: int, part_count: int, color_count: int):
+    lego_sets = {'Sets': []}
+    set_details = {}
+    for number in range(set_count):
+        set_id = f"set-{number}"
+        pieces = [{'part': {'designID': str(rng.randrange(part_count)), 'material': rng.randrange(color_count)},
+                   'quantity': rng.randint(1, 4)} for _ in range(rng.randint(0, 6))]
+        lego_sets['Sets'].append({'id': set_id, 'name': f"Set {number}", 'totalPieces': len(pieces)})
+        set_details[set_id] = {'pieces': pieces}
+    return lego_sets, set_details
+
+
+def random_inventory(rng: random.Random, part_count: int, color_count: int):
+    inventory = {}
+    for part in rng.sample(range(part_count), rng.randint(0, part_count)):
+        inventory[str(part)] = {str(color): rng.randint(1, 5)
+                                for color in rng.sample(range(color_count), rng.randint(1, color_count))}
+    return inventory
+
+
+class TestCatalogIndex(unittest.TestCase):
+
+    def test_buildable_set_ids_matches_user_can_build_set(self):
+        """
+        Test that the index finds exactly the sets user_can_build_set accepts, on randomized catalogs and inventories.
+        """
+        rng = random.Random(1234)
+        for _ in range(50):
+            lego_sets, set_details = random_catalog(rng, set_count=40, part_count=6, color_count=3)
+            index = CatalogIndex(lego_sets, set_details)
+            inventory = random_inventory(rng, part_count=6, color_count=3)
+
+            expected = [lego_set['id'] for lego_set in lego_sets['Sets']
+                        if user_can_build_set(inventory, set_details[lego_set['id']]['pieces'])]
+
+            self.assertEqual(index.buildable_set_ids(inventory), expected)
+
+    def test_sets_with_all_parts_rules_out_sets_with_missing_parts(self):
+        """
+        Test that a set needing a part the user does not own in any color is ruled out, while a set needing only
+        other colors of owned parts is kept.
+        """
+        lego_sets = {'Sets': [{'id': 'a', 'name': 'A'}, {'id': 'b', 'name': 'B'}]}
+        set_details = {
+            'a': {'pieces': [{'part': {'designID': '3001', 'material': 1}, 'quantity': 2}]},
+            'b': {'pieces': [{'part': {'designID': '3001', 'material': 1}, 'quantity': 2},
+                             {'part': {'designID': '3002', 'material': 1}, 'quantity': 1}]},
+        }
+        index = CatalogIndex(lego_sets, set_details)
+
+        self.assertEqual(index.sets_with_all_parts({'3001': {'5': 2}}), ['a'])
+        self.assertEqual(index.sets_with_all_parts({}), [])
+
+    def test_nearly_buildable_set_ids_matches_sorting_every_set(self):
+        """
+        Test that the bounded ranking returns the same sets as computing the missing bricks of every set piece by
+        piece and sorting the whole catalog, for both rankings.
+        """
+        rng = random.Random(99)
+        for _ in range(30):
+            lego_sets, set_details = random_catalog(rng, set_count=40, part_count=6, color_count=3)
+            index = CatalogIndex(lego_sets, set_details)
+            inventory = random_inventory(rng, part_count=6, color_count=3)
+
+            shortfalls = []
+            for position, set_id in enumerate(index.set_names):
+                missing = sum(piece['missing'] for piece in index.missing_pieces(set_id, inventory))
+                total = index.brick_counts[set_id]
+                if missing:
+                    shortfalls.append((position, set_id, missing, total))
+
+            by_missing = sorted(shortfalls, key=lambda entry: (entry[2], entry[0]))[:5]
+            by_coverage = sorted(shortfalls, key=lambda entry: (entry[2] / entry[3], entry[0]))[:5]
+            self.assertEqual(index.nearly_buildable_set_ids(inventory, 5),
+                             [(set_id, missing, total) for _, set_id, missing, total in by_missing])
+            self.assertEqual(index.nearly_buildable_set_ids(inventory, 5, "coverage"),
+                             [(set_id, missing, total) for _, set_id, missing, total in by_coverage])
+
+    def test_missing_pieces_reports_each_short_pair(self):
+        """
+        Test that the missing pieces list every (designID, material) pair the user has too few of, and no others.
+        """
+        lego_sets = {'Sets': [{'id': 'a', 'name': 'A'}]}
+        set_details = {'a': {'pieces': [{'part': {'designID': '3001', 'material': 1}, 'quantity': 4},
+                                        {'part': {'designID': '3002', 'material': 2}, 'quantity': 1},
+                                        {'part': {'designID': '3003', 'material': 1}, 'quantity': 2}]}}
+        index = CatalogIndex(lego_sets, set_details)
+
+        missing_pieces = index.missing_pieces('a', {'3001': {'1': 1}, '3002': {'2': 5}})
+
+        self.assertEqual(missing_pieces, [
+            {'designID': '3001', 'material': '1', 'needed': 4, 'owned': 1, 'missing': 3},
+            {'designID': '3003', 'material': '1', 'needed': 2, 'owned': 0, 'missing': 2},
+        ])
+        self.assertEqual(index.nearly_buildable_set_ids({'3001': {'1': 1}, '3002': {'2': 5}}, 3), [('a', 5, 7)])
+
+    def test_catalog_version_changes_with_catalog(self):
+        """
+        Test that the catalog version is stable for equal catalogs and changes when the set list changes.
+        """
+        lego_sets = {'Sets': [{'id': 'a', 'name': 'A'}]}
+
+        self.assertEqual(catalog_version(lego_sets), catalog_version({'Sets': [{'name': 'A', 'id': 'a'}]}))
+        self.assertNotEqual(catalog_version(lego_sets), catalog_version({'Sets': []}))
+
+    def test_catalog_version_hashes_a_set_list_once(self):
+        """
+        Test that asking again for the version of the same set list object does not serialize the catalog again.
+        """
+        lego_sets = {'Sets': [{'id': 'a', 'name': 'A'}]}
+        with mock.patch('helpers.catalog_index.json.dumps', wraps=json.dumps) as dumps:
+            version = catalog_version(lego_sets)
+            self.assertEqual(catalog_version(lego_sets), version)
+            self.assertEqual(catalog_version({'Sets': [{'id': 'a', 'name': 'A'}]}), version)
+
+        self.assertEqual(dumps.call_count, 2)
+
+
+class TestGetCatalogIndex(unittest.TestCase):
+
+    lego_sets = {'Sets': [{'id': 'a', 'name': 'A'}, {'id': 'b', 'name': 'B'}]}
+    set_details = {'a': {'pieces': [{'part': {'designID': '3001', 'material': 1}, 'quantity': 2}]}}
+
+    def setUp(self):
+        patches = [mock.patch.object(catalog_index, name, None)
+                   for name in ('_current_index', '_previous_index', '_partial_index')]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_index_with_failed_sets_is_kept_until_it_expires(self):
+        """
+        Test that an index built while a set failed to fetch is reused by later calls, and rebuilt once it expired.
+        """
+        fetch = mock.Mock(return_value=(self.set_details, {'b': "Set details could not be retrieved."}))
+        with mock.patch('helpers.catalog_index.fetch_lego_set_details', fetch):
+            index = get_catalog_index(self.lego_sets)
+            self.assertIs(get_catalog_index(self.lego_sets), index)
+            self.assertEqual(fetch.call_count, 1)
+
+            catalog_index._partial_index = (index, 0)
+            self.assertIsNot(get_catalog_index(self.lego_sets), index)
+            self.assertEqual(fetch.call_count, 2)
+
+    def test_concurrent_misses_share_one_build_outside_the_lock(self):
+        """
+        Test that calls missing the same index wait for one build, and that the build does not block calls for an
+        index that is already kept.
+        """
+        kept = CatalogIndex({'Sets': []}, {})
+        catalog_index._current_index = kept
+        fetching, release = threading.Event(), threading.Event()
+
+        def fetch_lego_set_details(lego_sets, max_workers):
+            fetching.set()
+            release.wait()
+            return self.set_details, {}
+
+        indexes = []
+        with mock.patch('helpers.catalog_index.fetch_lego_set_details', side_effect=fetch_lego_set_details) as fetch:
+            threads = [threading.Thread(target=lambda: indexes.append(get_catalog_index(self.lego_sets)))
+                       for _ in range(3)]
+            threads[0].start()
+            fetching.wait()
+            for thread in threads[1:]:
+                thread.start()
+            self.assertIs(get_catalog_index({'Sets': []}), kept)
+            # Gives the later calls time to join the build in flight.
+            for thread in threads[1:]:
+                thread.join(timeout=0.05)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(len(indexes), 3)
+        self.assertTrue(all(index is indexes[0] for index in indexes))
+
+
+if __name__ == '__main__':
+    unittest.main()
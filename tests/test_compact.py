@@ -0,0 +1,56 @@
+import os
+import random
+import sys
+import unittest
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers.functions import user_can_build_set, user_can_build_set_if_colors_are_changeable
+from helpers.compact import CompactCatalog, CompactInventory, Interner
+from test_catalog_index import random_catalog, random_inventory
+
+
+class TestCompactCatalog(unittest.TestCase):
+
+    def test_checkers_match_dict_checkers(self):
+        """
+        Test that both compact checkers accept exactly the sets the dictionary-based checkers accept, on randomized
+        catalogs and inventories. The inventories also hold colors no set uses.
+        """
+        rng = random.Random(2024)
+        for _ in range(80):
+            lego_sets, set_details = random_catalog(rng, set_count=40, part_count=5, color_count=3)
+            catalog = CompactCatalog(lego_sets, set_details)
+            inventory = random_inventory(rng, part_count=6, color_count=5)
+            pieces = [set_details[lego_set['id']]['pieces'] for lego_set in lego_sets['Sets']]
+
+            self.assertEqual(catalog.buildable_set_ids(inventory),
+                             [lego_set['id'] for lego_set, set_pieces in zip(lego_sets['Sets'], pieces)
+                              if user_can_build_set(inventory, set_pieces)])
+            self.assertEqual(catalog.color_flexible_set_ids(inventory),
+                             [lego_set['id'] for lego_set, set_pieces in zip(lego_sets['Sets'], pieces)
+                              if user_can_build_set_if_colors_are_changeable(inventory, set_pieces)])
+
+    def test_inventory_drops_unused_pairs_but_keeps_colors(self):
+        """
+        Test that a color no set uses can still stand in for a required color.
+        """
+        lego_sets = {'Sets': [{'id': 'a', 'name': 'A'}]}
+        set_details = {'a': {'pieces': [{'part': {'designID': '3001', 'material': 1}, 'quantity': 2}]}}
+        catalog = CompactCatalog(lego_sets, set_details)
+        inventory = CompactInventory(catalog, {'3001': {'99': 4}, '9999': {'1': 1}})
+
+        self.assertEqual(list(inventory.pair_counts), [0])
+        self.assertFalse(catalog.can_build(0, inventory))
+        self.assertTrue(catalog.can_build_if_colors_are_changeable(0, inventory))
+
+    def test_interner_assigns_dense_codes(self):
+        interner = Interner()
+
+        self.assertEqual([interner.intern(value) for value in ('a', 'b', 'a', 'c')], [0, 1, 0, 2])
+        self.assertEqual(len(interner), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
+import itertools
 import os
+import random
 import sys
 import unittest
+from unittest import mock
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, parent_dir)
@@ -90,6 +93,17 @@ class TestSortUserInventory(unittest.TestCase):
         self.assertEqual(sort_user_inventory(
             user_inventory_raw), expected_result_after_sort)
 
+    def test_inventory_fingerprint_ignores_listing_order(self):
+        """
+        Test that inventories with the same bricks listed in a different order get the same fingerprint, and that
+        changing a count changes it.
+        """
+        inventory = {'1234': {'5': 5, '4': 10}, '5678': {'3': 3}}
+        reordered = {'5678': {'3': 3}, '1234': {'4': 10, '5': 5}}
+
+        self.assertEqual(inventory_fingerprint(inventory), inventory_fingerprint(reordered))
+        self.assertNotEqual(inventory_fingerprint(inventory), inventory_fingerprint({'1234': {'5': 5, '4': 9}, '5678': {'3': 3}}))
+
 
 class TestCanBuildSet(unittest.TestCase):
 
@@ -253,5 +267,352 @@ def test_user_can_build_set_if_colors_are_changeable():
         user_inventory, lego_bricks_in_set) == False
 
 
+class TestFindBuildableSets(unittest.TestCase):
+
+    user_inventory = {
+        '1234': {'5': 5, '4': 10},
+        '5678': {'3': 3, '2': 8}
+    }
+
+    lego_sets = {
+        'Sets': [
+            {'id': 'a', 'name': 'Small House', 'totalPieces': 3},
+            {'id': 'b', 'name': 'Big House', 'totalPieces': 20},
+            {'id': 'c', 'name': 'Tiny House', 'totalPieces': 1},
+        ]
+    }
+
+    set_details = {
+        'a': {'pieces': [{'part': {'designID': '1234', 'material': 5}, 'quantity': 2},
+                         {'part': {'designID': '5678', 'material': 3}, 'quantity': 1}]},
+        'b': {'pieces': [{'part': {'designID': '1234', 'material': 5}, 'quantity': 20}]},
+        'c': {'pieces': [{'part': {'designID': '5678', 'material': 2}, 'quantity': 1}]},
+    }
+
+    def test_find_buildable_sets_concurrent_matches_serial(self):
+        """
+        Test that fetching the set details concurrently gives the same buildable sets, in the same order, as
+        fetching them one at a time.
+        """
+        with mock.patch('helpers.functions.get_lego_set_details', side_effect=self.set_details.get):
+            serial = find_buildable_sets(self.user_inventory, self.lego_sets, False, 1)
+            concurrent = find_buildable_sets(self.user_inventory, self.lego_sets, False, 4)
+
+        self.assertEqual(serial, {'Small House': {'id': 'a'}, 'Tiny House': {'id': 'c'}})
+        self.assertEqual(list(concurrent.items()), list(serial.items()))
+
+    def test_find_buildable_sets_reports_failed_sets(self):
+        """
+        Test that sets whose details cannot be fetched are reported in `failed_sets` instead of being skipped silently.
+        """
+        def get_details(set_id):
+            if set_id == 'a':
+                return None
+            if set_id == 'c':
+                raise ConnectionError("connection reset")
+            return self.set_details[set_id]
+
+        failed_sets = {}
+        with mock.patch('helpers.functions.get_lego_set_details', side_effect=get_details):
+            buildable_sets = find_buildable_sets(self.user_inventory, self.lego_sets, False, 4, failed_sets)
+
+        self.assertEqual(buildable_sets, {})
+        self.assertEqual(set(failed_sets), {'a', 'c'})
+        self.assertEqual(failed_sets['c'], "connection reset")
+
+
+    def test_find_buildable_sets_with_catalog_index_matches_scan(self):
+        """
+        Test that passing a catalog index gives the same buildable sets as scanning every set's piece list.
+        """
+        from helpers.catalog_index import CatalogIndex
+        catalog_index = CatalogIndex(self.lego_sets, self.set_details)
+
+        with mock.patch('helpers.functions.get_lego_set_details', side_effect=self.set_details.get):
+            scanned = find_buildable_sets(self.user_inventory, self.lego_sets, False)
+            indexed = find_buildable_sets(self.user_inventory, self.lego_sets, False, catalog_index=catalog_index)
+
+        self.assertEqual(list(indexed.items()), list(scanned.items()))
+
+    def test_color_flexible_sets_are_checked_from_the_catalog_index(self):
+        """
+        Test that with a catalog index the color-flexible sets are checked against the index's piece lists, giving
+        the same sets as scanning without fetching any set details.
+        """
+        from helpers.catalog_index import CatalogIndex
+        catalog_index = CatalogIndex(self.lego_sets, self.set_details)
+        user_inventory = {'1234': {'5': 5, '4': 10}, '5678': {'3': 3}}
+
+        with mock.patch('helpers.functions.get_lego_set_details', side_effect=self.set_details.get) as get_details:
+            scanned = find_buildable_sets(user_inventory, self.lego_sets, True)
+            get_details.reset_mock()
+            indexed = find_buildable_sets(user_inventory, self.lego_sets, True, catalog_index=catalog_index)
+
+        self.assertEqual(scanned, {'Tiny House': {'id': 'c'}})
+        self.assertEqual(list(indexed.items()), list(scanned.items()))
+        get_details.assert_not_called()
+
+    def test_color_flexible_check_in_worker_processes_matches_serial(self):
+        """
+        Test that spreading the color-flexible check over worker processes gives the same buildable sets, in the
+        same order, as checking every set in the request thread.
+        """
+        import random
+        from helpers.catalog_index import CatalogIndex
+        from helpers.parallel import shutdown_process_pool
+        from test_catalog_index import random_catalog, random_inventory
+        self.addCleanup(shutdown_process_pool)
+
+        rng = random.Random(7)
+        for _ in range(3):
+            lego_sets, set_details = random_catalog(rng, set_count=60, part_count=6, color_count=4)
+            inventory = random_inventory(rng, part_count=6, color_count=4)
+            catalog_index = CatalogIndex(lego_sets, set_details)
+            with mock.patch('helpers.functions.get_lego_set_details', side_effect=set_details.get):
+                serial = find_buildable_sets(inventory, lego_sets, True)
+                with mock.patch('helpers.catalog_index.COLOR_CHECK_PROCESSES', 2), \
+                        mock.patch('helpers.functions.COLOR_CHECK_MIN_SETS', 1), \
+                        self.assertNoLogs(level='ERROR'):
+                    parallel = find_buildable_sets(inventory, lego_sets, True, catalog_index=catalog_index)
+
+            self.assertEqual(list(parallel.items()), list(serial.items()))
+
+    def test_worker_state_is_only_built_when_the_pool_starts(self):
+        """
+        Test that the arguments loaded into the workers are built when a pool is started, and not again by calls
+        that reuse it.
+        """
+        from helpers.parallel import get_process_pool, shutdown_process_pool
+        self.addCleanup(shutdown_process_pool)
+        make_initargs = mock.Mock(return_value=())
+
+        pool = get_process_pool(1, 'catalog-1', None, make_initargs)
+        self.assertIs(get_process_pool(1, 'catalog-1', None, make_initargs), pool)
+        self.assertEqual(make_initargs.call_count, 1)
+
+        self.assertIsNot(get_process_pool(1, 'catalog-2', None, make_initargs), pool)
+        self.assertEqual(make_initargs.call_count, 2)
+
+
+class TestColorSubstitutions(unittest.TestCase):
+
+    def test_substitution_found_where_first_fit_fails(self):
+        """
+        Test that a substitution is found even when taking the first usable color for the first component would leave
+        no color for a later one.
+        """
+        user_inventory = {'3001': {'yellow': 5, 'green': 1}}
+        lego_bricks_in_set = [
+            {'part': {'designID': '3001', 'material': 'red'}, 'quantity': 1},
+            {'part': {'designID': '3001', 'material': 'blue'}, 'quantity': 3},
+        ]
+
+        self.assertEqual(find_color_substitutions(user_inventory, lego_bricks_in_set),
+                         {('3001', 'red'): 'green', ('3001', 'blue'): 'yellow'})
+        self.assertTrue(user_can_build_set_if_colors_are_changeable(user_inventory, lego_bricks_in_set))
+
+    def test_substitution_swaps_only_the_components_that_need_it(self):
+        """
+        Test that a component whose color the user owns keeps it while another component of the same color is
+        swapped, e.g. a red roof stays red while the red walls become blue.
+        """
+        user_inventory = {'roof': {'red': 5}, 'wall': {'blue': 5}}
+        lego_bricks_in_set = [
+            {'part': {'designID': 'roof', 'material': 'red'}, 'quantity': 2},
+            {'part': {'designID': 'wall', 'material': 'red'}, 'quantity': 2},
+        ]
+
+        self.assertEqual(find_color_substitutions(user_inventory, lego_bricks_in_set), {('wall', 'red'): 'blue'})
+        self.assertTrue(user_can_build_set_if_colors_are_changeable(user_inventory, lego_bricks_in_set))
+
+    def test_substitution_keeps_one_color_per_component(self):
+        """
+        Test that two components of one part cannot be built in the same owned color, and that a component listed on
+        several lines needs its largest quantity in the color it is swapped to.
+        """
+        user_inventory = {'3001': {'5': 10}, '3003': {'5': 3, '2': 1}}
+
+        self.assertIsNone(find_color_substitutions(user_inventory, [
+            {'part': {'designID': '3001', 'material': '1'}, 'quantity': 2},
+            {'part': {'designID': '3001', 'material': '3'}, 'quantity': 2},
+        ]))
+        self.assertIsNone(find_color_substitutions(user_inventory, [
+            {'part': {'designID': '3003', 'material': '3'}, 'quantity': 2},
+            {'part': {'designID': '3003', 'material': '3'}, 'quantity': 4},
+        ]))
+        self.assertEqual(find_color_substitutions(user_inventory, [
+            {'part': {'designID': '3003', 'material': '3'}, 'quantity': 2},
+            {'part': {'designID': '3003', 'material': '3'}, 'quantity': 3},
+        ]), {('3003', '3'): '5'})
+
+    def test_substitution_plan_is_empty_when_no_color_changes(self):
+        """
+        Test that required colors the user owns enough of are kept, so a set buildable as is needs no substitutions.
+        """
+        user_inventory = {'3001': {'5': 10, '3': 10}}
+        lego_bricks_in_set = [{'part': {'designID': '3001', 'material': 5}, 'quantity': 2}]
+
+        self.assertEqual(find_color_substitutions(user_inventory, lego_bricks_in_set), {})
+
+    def test_substitution_rejects_missing_part(self):
+        """
+        Test that a set needing a part the user does not own in any color cannot be built.
+        """
+        user_inventory = {'3001': {'5': 10}}
+        lego_bricks_in_set = [
+            {'part': {'designID': '3001', 'material': 1}, 'quantity': 2},
+            {'part': {'designID': '9999', 'material': 1}, 'quantity': 1},
+        ]
+
+        self.assertIsNone(find_color_substitutions(user_inventory, lego_bricks_in_set))
+        self.assertFalse(user_can_build_set_if_colors_are_changeable(user_inventory, lego_bricks_in_set))
+
+    def test_substitution_matches_brute_force_search(self):
+        """
+        Test that the color-flexible check agrees with trying every assignment of owned colors to the components of
+        randomized sets and inventories, and that every substitution found is one of those assignments.
+        """
+        def brute_force(user_inventory, lego_bricks_in_set):
+            if not user_inventory or user_can_build_set(user_inventory, lego_bricks_in_set):
+                return False
+            required = {}
+            for lego in lego_bricks_in_set:
+                key = (lego['part']['designID'], str(lego['part']['material']))
+                required[key] = max(required.get(key, 0), lego['quantity'])
+            components = list(required)
+            options = [[color for color, count in user_inventory.get(design_id, {}).items()
+                        if count >= required[(design_id, required_color)]]
+                       for design_id, required_color in components]
+            for colors in itertools.product(*options):
+                used = [(design_id, color) for (design_id, _), color in zip(components, colors)]
+                if len(set(used)) == len(used):
+                    return True
+            return False
+
+        rng = random.Random(1234)
+        parts, colors = ['3001', '3002', '3003'], ['1', '2', '3', '4']
+        for _ in range(2000):
+            user_inventory = {part: {color: rng.randint(1, 4) for color in rng.sample(colors, rng.randint(1, 4))}
+                              for part in rng.sample(parts, rng.randint(0, 3))}
+            lego_bricks_in_set = [{'part': {'designID': rng.choice(parts), 'material': rng.choice(colors)},
+                                   'quantity': rng.randint(1, 4)} for _ in range(rng.randint(1, 5))]
+
+            expected = brute_force(user_inventory, lego_bricks_in_set)
+            self.assertEqual(user_can_build_set_if_colors_are_changeable(user_inventory, lego_bricks_in_set), expected,
+                             (user_inventory, lego_bricks_in_set))
+
+            substitutions = find_color_substitutions(user_inventory, lego_bricks_in_set)
+            if substitutions is not None:
+                used = {}
+                for lego in lego_bricks_in_set:
+                    component = (lego['part']['designID'], str(lego['part']['material']))
+                    color = substitutions.get(component, component[1])
+                    self.assertGreaterEqual(user_inventory[component[0]].get(color, 0), lego['quantity'])
+                    used[component] = (component[0], color)
+                self.assertEqual(len(set(used.values())), len(used), (user_inventory, lego_bricks_in_set))
+
+
+class TestPruneLegoSets(unittest.TestCase):
+
+    user_inventory = {
+        '3001': {'1': 4, '2': 4},
+        '3002': {'1': 2},
+    }
+
+    def setUp(self):
+        patcher = mock.patch.dict('helpers.functions.set_summaries', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prune_runs_each_stage_and_reports_counts(self):
+        """
+        Test that each filter rules out the sets it is responsible for and reports how many it pruned, while sets
+        without a summary are kept for their details to be fetched.
+        """
+        lego_sets = {'Sets': [
+            {'id': 'too-big', 'name': 'Too Big', 'totalPieces': 11},
+            {'id': 'many-parts', 'name': 'Many Parts', 'totalPieces': 3},
+            {'id': 'short-part', 'name': 'Short Part', 'totalPieces': 3},
+            {'id': 'fits', 'name': 'Fits', 'totalPieces': 9},
+            {'id': 'unknown', 'name': 'Unknown', 'totalPieces': 1},
+        ]}
+        pieces = {
+            'too-big': [{'part': {'designID': '3001', 'material': 1}, 'quantity': 11}],
+            'many-parts': [{'part': {'designID': part, 'material': 1}, 'quantity': 1} for part in ('3001', '3002', '3003')],
+            'short-part': [{'part': {'designID': '3002', 'material': 1}, 'quantity': 2},
+                           {'part': {'designID': '3002', 'material': 2}, 'quantity': 1}],
+            'fits': [{'part': {'designID': '3001', 'material': 3}, 'quantity': 8},
+                     {'part': {'designID': '3002', 'material': 1}, 'quantity': 1}],
+        }
+        for lego_set in lego_sets['Sets']:
+            if lego_set['id'] in pieces:
+                summaries_for(lego_sets)[lego_set['id']] = summarize_set(lego_set, pieces[lego_set['id']])
+
+        pruning_stats = {}
+        remaining = prune_lego_sets(self.user_inventory, lego_sets, pruning_stats)
+
+        self.assertEqual([lego_set['id'] for lego_set in remaining['Sets']], ['fits', 'unknown'])
+        self.assertEqual(pruning_stats, {'total_pieces': 1, 'part_count': 1, 'part_totals': 1})
+
+    def test_prune_counts_the_largest_line_of_a_repeated_pair(self):
+        """
+        Test that a set listing one pair on several lines is bounded by its largest line, as user_can_build_set
+        checks it, rather than by the listed total of every line.
+        """
+        lego_set = {'id': 'a', 'name': 'A', 'totalPieces': 10}
+        pieces = [{'part': {'designID': '0', 'material': 0}, 'quantity': quantity} for quantity in (3, 2, 2, 3)]
+        user_inventory = {'0': {'0': 3}}
+        summaries_for({'Sets': [lego_set]})['a'] = summarize_set(lego_set, pieces)
+
+        remaining = prune_lego_sets(user_inventory, {'Sets': [lego_set]})
+
+        self.assertEqual(remaining['Sets'], [lego_set])
+        self.assertTrue(user_can_build_set(user_inventory, pieces))
+        with mock.patch('helpers.functions.get_lego_set_details', return_value={'pieces': pieces}):
+            self.assertEqual(find_buildable_sets(user_inventory, {'Sets': [lego_set]}), {'A': {'id': 'a'}})
+
+    def test_prune_ignores_summary_of_changed_set(self):
+        """
+        Test that a summary recorded for a different total piece count is not trusted.
+        """
+        lego_set = {'id': 'a', 'name': 'A', 'totalPieces': 5}
+        summaries_for({'Sets': [lego_set]})['a'] = summarize_set(dict(lego_set, totalPieces=2),
+                                                                 [{'part': {'designID': '9999', 'material': 1}, 'quantity': 2}])
+
+        remaining = prune_lego_sets(self.user_inventory, {'Sets': [lego_set]})
+
+        self.assertEqual(remaining['Sets'], [lego_set])
+
+    def test_prune_ignores_summaries_of_another_catalog(self):
+        """
+        Test that summaries recorded for one catalog are not used for a changed catalog, and that only the latest
+        catalogs keep theirs.
+        """
+        lego_set = {'id': 'a', 'name': 'A', 'totalPieces': 2}
+        old_catalog = {'Sets': [lego_set]}
+        summaries_for(old_catalog)['a'] = summarize_set(lego_set, [{'part': {'designID': '9999', 'material': 1},
+                                                                    'quantity': 2}])
+        new_catalog = {'Sets': [lego_set, {'id': 'b', 'name': 'B', 'totalPieces': 1}]}
+
+        remaining = prune_lego_sets(self.user_inventory, new_catalog)
+
+        self.assertEqual([lego_set['id'] for lego_set in remaining['Sets']], ['a', 'b'])
+        for count in range(SET_SUMMARY_VERSIONS):
+            summaries_for({'Sets': [{'id': str(count), 'name': str(count), 'totalPieces': 1}]})
+        self.assertEqual(summaries_for(old_catalog), {})
+        self.assertLessEqual(len(set_summaries), SET_SUMMARY_VERSIONS)
+
+    def test_find_buildable_sets_skips_fetching_pruned_sets(self):
+        """
+        Test that the details of a set already known to need a missing part are not fetched again.
+        """
+        lego_sets = {'Sets': [{'id': 'a', 'name': 'A', 'totalPieces': 2}]}
+        details = {'pieces': [{'part': {'designID': '9999', 'material': 1}, 'quantity': 2}]}
+        with mock.patch('helpers.functions.get_lego_set_details', return_value=details) as get_details:
+            find_buildable_sets(self.user_inventory, lego_sets, False)
+            find_buildable_sets(self.user_inventory, lego_sets, True)
+
+        self.assertEqual(get_details.call_count, 1)
+
 if __name__ == '__main__':
     unittest.main()
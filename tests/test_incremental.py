@@ -0,0 +1,90 @@
+import os
+import random
+import sys
+import unittest
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers.functions import user_can_build_set, user_can_build_set_if_colors_are_changeable
+from helpers.catalog_index import CatalogIndex
+from helpers.incremental import IncrementalBuildability
+from test_catalog_index import random_catalog, random_inventory
+
+
+def random_delta(rng: random.Random, part_count: int, color_count: int):
+    delta = {}
+    for _ in range(rng.randint(1, 3)):
+        colors = delta.setdefault(str(rng.randrange(part_count)), {})
+        colors[str(rng.randrange(color_count))] = rng.randint(-5, 5)
+    return delta
+
+
+def apply_to_inventory(inventory, delta):
+    for part, changes in delta.items():
+        colors = inventory.setdefault(part, {})
+        for color, change in changes.items():
+            count = max(colors.get(color, 0) + change, 0)
+            if count:
+                colors[color] = count
+            else:
+                colors.pop(color, None)
+        if not colors:
+            del inventory[part]
+
+
+class TestIncrementalBuildability(unittest.TestCase):
+
+    def test_deltas_match_a_full_recomputation(self):
+        """
+        Test that after every delta the buildable sets, and the sets reported as changed, match checking every set
+        against the changed inventory from scratch, in both modes.
+        """
+        rng = random.Random(2024)
+        for is_flexible_on_color, check in ((False, user_can_build_set),
+                                            (True, user_can_build_set_if_colors_are_changeable)):
+            for _ in range(20):
+                lego_sets, set_details = random_catalog(rng, set_count=30, part_count=5, color_count=3)
+                inventory = random_inventory(rng, part_count=5, color_count=3)
+                state = IncrementalBuildability(CatalogIndex(lego_sets, set_details), inventory, is_flexible_on_color)
+
+                def expected():
+                    return [lego_set['id'] for lego_set in lego_sets['Sets']
+                            if check(inventory, set_details[lego_set['id']]['pieces'])]
+
+                previous = expected()
+                self.assertEqual(state.buildable_set_ids(), previous)
+                for _ in range(15):
+                    delta = random_delta(rng, part_count=5, color_count=3)
+                    became_buildable, stopped_being_buildable = state.apply_delta(delta)
+                    apply_to_inventory(inventory, delta)
+
+                    current = expected()
+                    self.assertEqual(state.buildable_set_ids(), current)
+                    self.assertEqual(became_buildable, [set_id for set_id in current if set_id not in previous])
+                    self.assertEqual(stopped_being_buildable, [set_id for set_id in previous if set_id not in current])
+                    previous = current
+
+    def test_missing_pieces_follow_the_changed_inventory(self):
+        """
+        Test that the bricks a set is missing, looked up against the state's inventory, follow each delta and are
+        gone once the set becomes buildable.
+        """
+        lego_sets = {'Sets': [{'id': 'a', 'name': 'House', 'totalPieces': 5}]}
+        set_details = {'a': {'pieces': [{'part': {'designID': '1', 'material': 5}, 'quantity': 3},
+                                        {'part': {'designID': '2', 'material': 7}, 'quantity': 2}]}}
+        catalog_index = CatalogIndex(lego_sets, set_details)
+        state = IncrementalBuildability(catalog_index, {'1': {'5': 1}})
+
+        def missing():
+            return {(piece['designID'], piece['material']): piece['missing']
+                    for piece in catalog_index.missing_pieces('a', state.inventory)}
+
+        self.assertEqual(missing(), {('1', '5'): 2, ('2', '7'): 2})
+        self.assertEqual(state.apply_delta({'1': {'5': 2}}), ([], []))
+        self.assertEqual(missing(), {('2', '7'): 2})
+        self.assertEqual(state.apply_delta({'2': {'7': 2}}), (['a'], []))
+        self.assertEqual(missing(), {})
+
+if __name__ == '__main__':
+    unittest.main()
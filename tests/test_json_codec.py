@@ -0,0 +1,52 @@
+import importlib
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers import json_codec
+
+
+class TestJsonCodec(unittest.TestCase):
+
+    payload = {'pieces': [{'part': {'designID': '3001', 'material': 5, 'partType': 'rigid'}, 'quantity': 4}],
+               'name': 'Maison été', 'ratio': 0.25, 'tags': None}
+
+    def test_round_trip_matches_the_json_module(self):
+        """
+        Test that the selected codec decodes and encodes to the same values as the json module.
+        """
+        encoded = json.dumps(self.payload).encode()
+
+        self.assertEqual(json_codec.loads(encoded), self.payload)
+        self.assertEqual(json_codec.loads(encoded.decode()), self.payload)
+        self.assertEqual(json.loads(json_codec.dumps(self.payload)), self.payload)
+
+    def test_output_is_compact_with_every_codec(self):
+        """
+        Test that encoded output has no whitespace between tokens, also when the json module is used.
+        """
+        self.addCleanup(importlib.reload, json_codec)
+        for name in ("stdlib", json_codec.select_codec("auto")):
+            with mock.patch('config.JSON_CODEC', name):
+                importlib.reload(json_codec)
+            self.assertEqual(json_codec.codec, name)
+            self.assertEqual(json_codec.dumps({'a': [1, 2], 'b': None}), '{"a":[1,2],"b":null}')
+
+    def test_unavailable_codec_falls_back_to_the_json_module(self):
+        """
+        Test that asking for a codec that is not installed selects the json module, and that "auto" picks an
+        installed one.
+        """
+        with mock.patch.dict(json_codec._AVAILABLE, {'msgspec': False, 'orjson': False}):
+            self.assertEqual(json_codec.select_codec("msgspec"), "stdlib")
+            self.assertEqual(json_codec.select_codec("auto"), "stdlib")
+        self.assertTrue(json_codec._AVAILABLE[json_codec.select_codec("auto")])
+
+
+if __name__ == '__main__':
+    unittest.main()
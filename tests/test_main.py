@@ -0,0 +1,471 @@
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+import main
+from helpers import service
+from helpers.cache_backends import MemoryCacheBackend
+from helpers.metrics import coalesced_requests
+from helpers.snapshot import CatalogSnapshot
+
+LEGO_SETS = {
+    'Sets': [
+        {'id': 'a', 'name': 'Small House', 'totalPieces': 3},
+        {'id': 'b', 'name': 'Big House', 'totalPieces': 20},
+    ]
+}
+
+SET_DETAILS = {
+    'a': {'pieces': [{'part': {'designID': '1234', 'material': 5}, 'quantity': 2},
+                     {'part': {'designID': '5678', 'material': 3}, 'quantity': 1}]},
+    'b': {'pieces': [{'part': {'designID': '1234', 'material': 5}, 'quantity': 20}]},
+}
+
+USERS = {
+    'brickfan35': {'id': 'u1', 'username': 'brickfan35', 'brickCount': 10},
+    'landscape-artist': {'id': 'u2', 'username': 'landscape-artist', 'brickCount': 30},
+}
+
+INVENTORIES = {
+    'u1': {'collection': [{'pieceId': '1234', 'variants': [{'color': '5', 'count': 5}]},
+                          {'pieceId': '5678', 'variants': [{'color': '3', 'count': 3}]}]},
+    'u2': {'collection': [{'pieceId': '1234', 'variants': [{'color': '5', 'count': 25}]}]},
+}
+
+
+class UpstreamTestCase(unittest.TestCase):
+    """
+    Base class that replaces every upstream call with the fixtures above.
+    """
+
+    def setUp(self):
+        self.cache = MemoryCacheBackend(ttl=180)
+        patches = [
+            mock.patch.object(service, 'shared_cache', self.cache),
+            mock.patch.object(service, 'result_cache', MemoryCacheBackend(ttl=3600, max_bytes=1024 * 1024)),
+            mock.patch('main.get_lego_sets', return_value=LEGO_SETS),
+            mock.patch('helpers.service.get_lego_sets', return_value=LEGO_SETS),
+            mock.patch('helpers.service.get_user_data', side_effect=USERS.get),
+            mock.patch('helpers.service.get_user_inventory_details', side_effect=lambda user: INVENTORIES[user['id']]),
+            mock.patch('helpers.functions.get_lego_set_details', side_effect=SET_DETAILS.get),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = main.app.test_client()
+
+
+class TestBuildableSetsBatch(UpstreamTestCase):
+
+    def test_batch_returns_results_for_every_user(self):
+        """
+        Test that the batch resource returns the same result for each user as the single-user resource.
+        """
+        response = self.client.post("/api/v1.0/buildable-sets:batch",
+                                    json={"usernames": ["brickfan35", "landscape-artist", "nobody"]})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()["results"]
+        self.assertEqual(results["brickfan35"], {"buildable_sets": {"Small House": {"id": "a"}}})
+        self.assertEqual(results["landscape-artist"], {"buildable_sets": {"Big House": {"id": "b"}}})
+        self.assertIn("message", results["nobody"])
+
+    def test_batch_streams_ndjson_when_requested(self):
+        """
+        Test that the results come back as one JSON line per user, in request order, when NDJSON is accepted.
+        """
+        response = self.client.post("/api/v1.0/buildable-sets:batch",
+                                    json={"usernames": ["landscape-artist", "brickfan35"]},
+                                    headers={"Accept": "application/x-ndjson"})
+
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([line["username"] for line in lines], ["landscape-artist", "brickfan35"])
+
+    def test_batch_rejects_missing_usernames(self):
+        """
+        Test that a request body without a list of usernames is rejected.
+        """
+        response = self.client.post("/api/v1.0/buildable-sets:batch", json={"usernames": "brickfan35"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_rejects_a_body_that_is_not_an_object(self):
+        """
+        Test that a JSON body other than an object is rejected instead of failing the request.
+        """
+        for body in (["brickfan35"], "brickfan35", 1):
+            response = self.client.post("/api/v1.0/buildable-sets:batch", json=body)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("usernames", response.get_json()["message"])
+
+    def test_batch_rejects_a_color_flag_that_is_not_a_boolean(self):
+        """
+        Test that is_flexible_on_color must be a JSON boolean, so that "false" is not read as true.
+        """
+        response = self.client.post("/api/v1.0/buildable-sets:batch",
+                                    json={"usernames": ["brickfan35"], "is_flexible_on_color": "false"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TestBuildableSetsStreaming(UpstreamTestCase):
+
+    def test_stream_yields_sets_then_summary(self):
+        """
+        Test that ?stream=1 returns one NDJSON line per buildable set followed by a summary line.
+        """
+        response = self.client.get("/api/v1.0/buildable-sets/brickfan35?stream=1")
+
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(lines, [
+            {"buildable_set": {"name": "Small House", "id": "a"}},
+            {"summary": {"buildable_sets": 1, "failed_sets": 0}},
+        ])
+
+    def test_without_stream_returns_single_document(self):
+        """
+        Test that the non-streaming response is unchanged.
+        """
+        response = self.client.get("/api/v1.0/buildable-sets/brickfan35")
+
+        self.assertEqual(response.get_json(), {"buildable_sets": {"Small House": {"id": "a"}}})
+
+class TestResourceCache(UpstreamTestCase):
+
+    def test_repeated_request_is_served_from_cache(self):
+        """
+        Test that a second request for the same user does not call the upstream again.
+        """
+        first = self.client.get("/api/v1.0/buildable-sets/brickfan35").get_json()
+        with mock.patch('helpers.service.get_user_data') as get_user_data, \
+                mock.patch('helpers.service.get_user_inventory_details') as get_user_inventory_details:
+            second = self.client.get("/api/v1.0/buildable-sets/brickfan35").get_json()
+
+        self.assertEqual(first, second)
+        get_user_data.assert_not_called()
+        get_user_inventory_details.assert_not_called()
+
+    def test_cached_result_is_not_used_for_a_new_catalog(self):
+        """
+        Test that a computed result is recomputed once the catalog changes.
+        """
+        self.client.get("/api/v1.0/buildable-sets/brickfan35")
+        new_catalog = {'Sets': [dict(LEGO_SETS['Sets'][0], name='Renamed House'), LEGO_SETS['Sets'][1]]}
+        with mock.patch('helpers.service.get_lego_sets', return_value=new_catalog):
+            response = self.client.get("/api/v1.0/buildable-sets/brickfan35").get_json()
+
+        self.assertEqual(response, {"buildable_sets": {"Renamed House": {"id": "a"}}})
+
+    def test_cached_result_is_not_used_for_a_changed_inventory(self):
+        """
+        Test that a computed result is recomputed once the user's inventory contents change.
+        """
+        self.client.get("/api/v1.0/buildable-sets/brickfan35")
+        self.cache.delete("lego:any:inventory:u1")
+        smaller = {'collection': [{'pieceId': '1234', 'variants': [{'color': '5', 'count': 1}]}]}
+        with mock.patch('helpers.service.get_user_inventory_details', return_value=smaller):
+            response = self.client.get("/api/v1.0/buildable-sets/brickfan35").get_json()
+
+        self.assertEqual(response, {"buildable_sets": {}})
+
+    def test_equal_inventories_share_a_result(self):
+        """
+        Test that two users with the same bricks are answered from one computed result.
+        """
+        self.client.get("/api/v1.0/buildable-sets/brickfan35")
+        with mock.patch('helpers.service.find_buildable_sets') as find_buildable_sets, \
+                mock.patch.dict(USERS, {'twin': dict(USERS['brickfan35'], id='u1', username='twin')}):
+            response = self.client.get("/api/v1.0/buildable-sets/twin").get_json()
+
+        find_buildable_sets.assert_not_called()
+        self.assertEqual(response, {"buildable_sets": {"Small House": {"id": "a"}}})
+
+class TestResultPage(UpstreamTestCase):
+
+    def test_result_page_runs_the_pipeline_in_process(self):
+        """
+        Test that the result page lists the buildable sets without sending a request to the app's own API.
+        """
+        with mock.patch('helpers.api_functions.session') as session:
+            response = self.client.post("/result", data={"username": "brickfan35", "button": "buildable_sets"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Small House", response.get_data(as_text=True))
+        session.get.assert_not_called()
+
+    def test_result_page_shows_the_message_for_an_unknown_user(self):
+        """
+        Test that the result page shows the pipeline's message instead of failing when there are no results.
+        """
+        response = self.client.post("/result", data={"username": "nobody", "button": "buildable_sets_additional"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("An error occurred while retrieving user data.", response.get_data(as_text=True))
+
+
+class TestInventoryDelta(UpstreamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patch = mock.patch.object(service, 'incremental_states', {})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def post_delta(self, delta, **body):
+        return self.client.post("/api/v1.0/buildable-sets/brickfan35/inventory-delta", json=dict(body, delta=delta))
+
+    def test_delta_reports_sets_that_became_and_stopped_being_buildable(self):
+        """
+        Test that adding bricks reports the sets that became buildable, and that a later delta builds on it.
+        """
+        added = self.post_delta([{"pieceId": "1234", "color": "5", "count": 15}]).get_json()
+        self.assertEqual(added, {"became_buildable": {"Big House": {"id": "b"}}, "no_longer_buildable": {}})
+
+        with mock.patch('helpers.service.get_user_inventory_details') as get_user_inventory_details:
+            removed = self.post_delta([{"pieceId": "5678", "color": 3, "count": -3}]).get_json()
+
+        get_user_inventory_details.assert_not_called()
+        self.assertEqual(removed, {"became_buildable": {}, "no_longer_buildable": {"Small House": {
+            "id": "a",
+            "missing_pieces": [{"designID": "5678", "material": "3", "needed": 1, "owned": 0, "missing": 1}]}}})
+
+    def test_concurrent_first_deltas_are_both_kept(self):
+        """
+        Test that two first deltas for a user arriving together are both applied to the state kept for later deltas.
+        """
+        both_fetching = threading.Barrier(2, timeout=5)
+
+        def get_user_inventory_details(user):
+            both_fetching.wait()
+            return INVENTORIES[user['id']]
+
+        with mock.patch('helpers.service.get_user_inventory_details', side_effect=get_user_inventory_details):
+            threads = [threading.Thread(target=self.post_delta, args=([change],))
+                       for change in ({"pieceId": "1234", "color": "5", "count": 15},
+                                      {"pieceId": "5678", "color": "3", "count": -3})]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(service.incremental_states), 1)
+        state = next(iter(service.incremental_states.values()))
+        self.assertEqual(state.inventory, {'1234': {'5': 20}})
+        self.assertEqual(state.buildable_set_ids(), ['b'])
+
+    def test_delta_rejects_malformed_changes(self):
+        """
+        Test that a change without an integer count is rejected.
+        """
+        response = self.post_delta([{"pieceId": "1234", "color": "5", "count": "15"}])
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_delta_rejects_a_body_that_is_not_an_object(self):
+        """
+        Test that a JSON body other than an object is rejected instead of failing the request.
+        """
+        for body in ([1], "abc"):
+            response = self.client.post("/api/v1.0/buildable-sets/brickfan35/inventory-delta", json=body)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("list of changes", response.get_json()["message"])
+
+    def test_delta_rejects_a_color_flag_that_is_not_a_boolean(self):
+        """
+        Test that is_flexible_on_color must be a JSON boolean, so that "false" is not read as true.
+        """
+        response = self.post_delta([{"pieceId": "1234", "color": "5", "count": 1}], is_flexible_on_color="false")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(service.incremental_states, {})
+
+
+class TestNearlyBuildableSets(UpstreamTestCase):
+
+    def test_sets_are_ranked_with_their_missing_pieces(self):
+        """
+        Test that only the sets the user cannot build yet are returned, closest first, with the bricks they lack.
+        """
+        response = self.client.get("/api/v1.0/nearly-buildable-sets/brickfan35").get_json()
+
+        self.assertEqual(response, {"nearly_buildable_sets": [
+            {"name": "Big House", "id": "b", "missing_bricks": 15, "coverage": 0.25,
+             "missing_pieces": [{"designID": "1234", "material": "5", "needed": 20, "owned": 5, "missing": 15}]},
+        ]})
+
+    def test_invalid_parameters_are_rejected(self):
+        """
+        Test that a limit outside the allowed range, or an unknown ranking, is rejected.
+        """
+        for query in ("limit=0", "limit=abc", "limit=1000", "limit=%C2%B2", "limit=-1", "rank_by=price"):
+            response = self.client.get(f"/api/v1.0/nearly-buildable-sets/brickfan35?{query}")
+            self.assertEqual(response.status_code, 400, query)
+
+
+class TestRequestCoalescing(UpstreamTestCase):
+
+    def test_concurrent_requests_for_a_user_share_one_pipeline_run(self):
+        """
+        Test that requests for a user and mode arriving while one is being computed wait for it instead of fetching
+        the user again, and are counted as coalesced.
+        """
+        started, release = threading.Event(), threading.Event()
+
+        def get_user_data(username):
+            started.set()
+            release.wait()
+            return USERS.get(username)
+
+        coalesced_before = coalesced_requests._values.get(("color-flexible",), 0)
+        responses = []
+
+        def get():
+            client = main.app.test_client()
+            responses.append(client.get("/api/v1.0/buildable-sets-additional/brickfan35").get_json())
+
+        with mock.patch('helpers.service.get_user_data', side_effect=get_user_data) as patched:
+            threads = [threading.Thread(target=get) for _ in range(4)]
+            threads[0].start()
+            started.wait()
+            for thread in threads[1:]:
+                thread.start()
+            # Gives the later requests time to join the one in flight.
+            for thread in threads[1:]:
+                thread.join(timeout=0.05)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(len(responses), 4)
+        self.assertTrue(all(response == responses[0] for response in responses))
+        self.assertEqual(coalesced_requests._values.get(("color-flexible",), 0) - coalesced_before, 3)
+
+
+class TestMetrics(UpstreamTestCase):
+
+    def test_metrics_include_request_and_stage_timings(self):
+        """
+        Test that /metrics reports the timing of an answered request and of the stages of its pipeline.
+        """
+        self.client.get("/api/v1.0/buildable-sets/brickfan35")
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.get_data(as_text=True)
+        self.assertIn('request_duration_seconds_count{endpoint="/api/v1.0/buildable-sets/<string:username>"}', body)
+        self.assertIn('request_stage_duration_seconds_count{stage="inventory"}', body)
+        self.assertIn("catalog_cache_hits_total", body)
+
+    def test_streamed_request_is_timed_until_its_body_is_sent(self):
+        """
+        Test that the duration of an NDJSON request is recorded once its body has been produced, not when the
+        response object is returned.
+        """
+        with mock.patch.object(main.request_duration, 'observe') as observe:
+            response = self.client.get("/api/v1.0/buildable-sets/brickfan35?stream=1")
+            self.assertTrue(response.is_streamed)
+            observe.assert_not_called()
+
+            response.get_data()
+            response.close()
+
+        observe.assert_called_once_with(mock.ANY, "/api/v1.0/buildable-sets/<string:username>")
+
+    def test_metrics_are_not_served_when_disabled(self):
+        """
+        Test that /metrics is not found when METRICS_ENABLED is off.
+        """
+        with mock.patch.object(main, 'METRICS_ENABLED', False):
+            response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TestProfiling(UpstreamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.profile_dir = directory.name
+        for patch in (mock.patch('helpers.profiling.PROFILING_TOKEN', 'secret'),
+                      mock.patch('helpers.profiling.PROFILE_DIR', self.profile_dir)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_profile_is_returned_and_stored_with_the_token(self):
+        """
+        Test that a request with the profiling token gets its result along with hotspots, and that the profile is
+        written as a pstats file.
+        """
+        response = self.client.get("/api/v1.0/buildable-sets/brickfan35",
+                                   headers={"X-Profile-Token": "secret"}).get_json()
+
+        self.assertEqual(response["buildable_sets"], {"Small House": {"id": "a"}})
+        self.assertTrue(response["profile"]["hotspots"])
+        self.assertTrue(os.path.isfile(response["profile"]["path"]))
+        self.assertEqual(os.path.dirname(response["profile"]["path"]), self.profile_dir)
+
+    def test_streamed_response_is_profiled_while_its_body_is_produced(self):
+        """
+        Test that a profiled NDJSON response names its profile in a header, and that the profile is written once
+        the body has been sent, covering the checks that produced it.
+        """
+        response = self.client.get("/api/v1.0/buildable-sets/brickfan35?stream=1",
+                                   headers={"X-Profile-Token": "secret"})
+        path = response.headers["X-Profile"]
+        self.assertFalse(os.path.exists(path))
+
+        self.assertIn("Small House", response.get_data(as_text=True))
+        response.close()
+
+        self.assertTrue(os.path.isfile(path))
+        functions = [function for (_, _, function) in pstats.Stats(path).stats]
+        self.assertIn("iter_buildable_sets", functions)
+
+    def test_requests_without_the_right_token_are_not_profiled(self):
+        """
+        Test that a wrong token, or none, leaves the response and the profile directory untouched.
+        """
+        for path in ("/api/v1.0/buildable-sets-additional/brickfan35?profile_token=wrong",
+                     "/api/v1.0/buildable-sets-additional/brickfan35"):
+            response = self.client.get(path).get_json()
+            self.assertNotIn("profile", response)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+
+class TestSnapshotCatalogCommand(unittest.TestCase):
+
+    def test_snapshot_catalog_writes_every_set(self):
+        """
+        Test that the snapshot-catalog command writes the set list and every set's details to the given file.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "catalog.snapshot")
+
+        with mock.patch('main.get_lego_sets', return_value=LEGO_SETS), \
+                mock.patch('main.get_lego_set_details', side_effect=lambda set_id, use_snapshot: SET_DETAILS[set_id]):
+            result = main.app.test_cli_runner().invoke(args=["snapshot-catalog", path])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        snapshot = CatalogSnapshot(path)
+        self.assertEqual(snapshot.lego_sets(), LEGO_SETS)
+        self.assertEqual(snapshot.set_details('b'), SET_DETAILS['b'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers import metrics
+from helpers.metrics import Registry, cache_stats_collector, endpoint_label
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_render_uses_the_prometheus_text_format(self):
+        """
+        Test that counters and histograms render with their labels, cumulative buckets, sum and count.
+        """
+        registry = Registry()
+        errors = registry.counter("errors_total", "Errors.", ["endpoint"])
+        duration = registry.histogram("duration_seconds", "Duration.", ["stage"], buckets=(0.1, 1))
+        errors.inc("/api/sets")
+        errors.inc("/api/sets", amount=2)
+        duration.observe(0.05, "inventory")
+        duration.observe(0.5, "inventory")
+        duration.observe(5, "inventory")
+
+        lines = registry.render().splitlines()
+
+        self.assertIn('errors_total{endpoint="/api/sets"} 3', lines)
+        self.assertIn('duration_seconds_bucket{stage="inventory",le="0.1"} 1', lines)
+        self.assertIn('duration_seconds_bucket{stage="inventory",le="1"} 2', lines)
+        self.assertIn('duration_seconds_bucket{stage="inventory",le="+Inf"} 3', lines)
+        self.assertIn('duration_seconds_sum{stage="inventory"} 5.55', lines)
+        self.assertIn('duration_seconds_count{stage="inventory"} 3', lines)
+
+    def test_metrics_are_not_recorded_when_disabled(self):
+        """
+        Test that nothing is recorded while METRICS_ENABLED is off.
+        """
+        registry = Registry()
+        errors = registry.counter("errors_total", "Errors.")
+        duration = registry.histogram("duration_seconds", "Duration.")
+
+        with mock.patch.object(metrics, 'METRICS_ENABLED', False):
+            errors.inc()
+            with duration.time():
+                pass
+
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP errors_total Errors.", "# TYPE errors_total counter",
+            "# HELP duration_seconds Duration.", "# TYPE duration_seconds histogram",
+        ])
+
+    def test_cache_stats_collector_reports_counters_and_size(self):
+        """
+        Test that cache counters are reported as counters and the size as a gauge.
+        """
+        registry = Registry()
+        registry.register_collector(cache_stats_collector("catalog_cache", lambda: {"hits": 4, "size": 2}))
+
+        lines = registry.render().splitlines()
+
+        self.assertIn("catalog_cache_hits_total 4", lines)
+        self.assertIn("# TYPE catalog_cache_size gauge", lines)
+        self.assertIn("catalog_cache_size 2", lines)
+
+    def test_endpoint_label_hides_ids_and_usernames(self):
+        """
+        Test that upstream URLs are reduced to a path without per-user or per-set segments.
+        """
+        self.assertEqual(endpoint_label("https://example.com/api/user/by-username/brickfan35"),
+                         "/api/user/by-username/:username")
+        self.assertEqual(endpoint_label("https://example.com/api/set/by-id/abc?x=1"), "/api/set/by-id/:id")
+        self.assertEqual(endpoint_label("https://example.com/api/sets"), "/api/sets")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import random
+import sys
+import unittest
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers.functions import user_can_build_set
+from helpers.numpy_engine import NumpyCatalogIndex, np
+from test_catalog_index import random_catalog, random_inventory
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestNumpyCatalogIndex(unittest.TestCase):
+
+    def test_buildable_set_ids_matches_user_can_build_set(self):
+        """
+        Test that the vectorized engine finds exactly the sets user_can_build_set accepts, on randomized catalogs
+        and inventories, including sets without pieces and an empty inventory.
+        """
+        rng = random.Random(4321)
+        for _ in range(50):
+            lego_sets, set_details = random_catalog(rng, set_count=60, part_count=8, color_count=4)
+            index = NumpyCatalogIndex(lego_sets, set_details)
+            inventory = random_inventory(rng, part_count=8, color_count=4)
+
+            expected = [lego_set['id'] for lego_set in lego_sets['Sets']
+                        if user_can_build_set(inventory, set_details[lego_set['id']]['pieces'])]
+
+            self.assertEqual(index.buildable_set_ids(inventory), expected)
+
+    def test_inventory_vector_ignores_unused_pairs(self):
+        """
+        Test that (designID, material) pairs no set needs do not affect the inventory vector.
+        """
+        lego_sets = {'Sets': [{'id': 'a', 'name': 'A'}]}
+        set_details = {'a': {'pieces': [{'part': {'designID': '3001', 'material': 1}, 'quantity': 2}]}}
+        index = NumpyCatalogIndex(lego_sets, set_details)
+
+        vector = index.inventory_vector({'3001': {'1': 3, '2': 7}, '9999': {'1': 1}})
+
+        self.assertEqual(vector.tolist(), [3])
+        self.assertEqual(index.buildable_set_ids({'3001': {'1': 3}}), ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers.api_functions import make_conditional_fetch
+from helpers.cache import NOT_MODIFIED
+from helpers.payload_store import PayloadStore
+
+URL = "https://example.com/api/sets"
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def response(status_code, body=None, etag=None):
+    return mock.Mock(status_code=status_code, headers={"ETag": etag} if etag else {},
+                     content=json.dumps(body).encode())
+
+
+class TestPayloadStore(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.clock = FakeClock()
+        self.store = PayloadStore(os.path.join(directory.name, "payloads.sqlite3"), timer=self.clock)
+        patch = mock.patch('helpers.api_functions.payload_store', self.store)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_store_keeps_payloads_with_etag_and_fetch_time(self):
+        """
+        Test that a stored payload is read back with its ETag, and is fresh until its max age has passed since it
+        was stored or last revalidated.
+        """
+        self.store.set(URL, {'Sets': []}, '"v1"')
+        stored = self.store.get(URL)
+
+        self.assertEqual((stored.value, stored.etag), ({'Sets': []}, '"v1"'))
+        self.clock.now += 61
+        self.assertFalse(self.store.is_fresh(self.store.get(URL), 60))
+        self.store.touch(URL)
+        self.assertTrue(self.store.is_fresh(self.store.get(URL), 60))
+        self.assertIsNone(self.store.get("https://example.com/api/other"))
+
+    def test_fresh_payload_is_served_without_a_request(self):
+        """
+        Test that a payload stored within its max age is returned without calling the upstream.
+        """
+        self.store.set(URL, {'Sets': []}, '"v1"')
+
+        with mock.patch('helpers.api_functions.make_get_request') as make_get_request:
+            self.assertEqual(make_conditional_fetch(URL, 60)(None), ({'Sets': []}, '"v1"'))
+            self.assertIs(make_conditional_fetch(URL, 60)('"v1"'), NOT_MODIFIED)
+
+        make_get_request.assert_not_called()
+
+    def test_stale_payload_is_revalidated_with_its_etag(self):
+        """
+        Test that a stale payload is revalidated with its stored ETag, served and marked fresh on a 304, and
+        replaced on a 200.
+        """
+        self.store.set(URL, {'Sets': []}, '"v1"')
+        self.clock.now += 61
+
+        with mock.patch('helpers.api_functions.make_get_request', return_value=response(304)) as make_get_request:
+            self.assertEqual(make_conditional_fetch(URL, 60)(None), ({'Sets': []}, '"v1"'))
+        make_get_request.assert_called_once_with(URL, {"If-None-Match": '"v1"'})
+        self.assertTrue(self.store.is_fresh(self.store.get(URL), 60))
+
+        self.clock.now += 61
+        with mock.patch('helpers.api_functions.make_get_request',
+                        return_value=response(200, {'Sets': [{'id': 'a'}]}, '"v2"')):
+            self.assertEqual(make_conditional_fetch(URL, 60)(None), ({'Sets': [{'id': 'a'}]}, '"v2"'))
+        self.assertEqual(self.store.get(URL).etag, '"v2"')
+
+    def test_stale_payload_is_served_when_the_upstream_fails(self):
+        """
+        Test that a stale payload is served when the upstream cannot be reached.
+        """
+        self.store.set(URL, {'Sets': []}, '"v1"')
+        self.clock.now += 61
+
+        with mock.patch('helpers.api_functions.make_get_request', return_value=None):
+            self.assertEqual(make_conditional_fetch(URL, 60)(None), ({'Sets': []}, '"v1"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from helpers.snapshot import CatalogSnapshot, write_catalog_snapshot
+
+LEGO_SETS = {
+    'Sets': [
+        {'id': 'a', 'name': 'Small House', 'setNumber': '101', 'totalPieces': 3},
+        {'id': 'b', 'name': 'Empty Box', 'setNumber': '102', 'totalPieces': 0},
+    ]
+}
+
+SET_DETAILS = {
+    'a': {'id': 'a', 'name': 'Small House', 'pieces': [
+        {'part': {'designID': '1234', 'material': 5, 'partType': 'rigid'}, 'quantity': 2},
+        {'part': {'designID': '5678', 'material': 3, 'partType': 'rigid'}, 'quantity': 1},
+    ]},
+    'b': {'id': 'b', 'name': 'Empty Box', 'pieces': []},
+}
+
+
+class TestCatalogSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "catalog.snapshot")
+
+    def test_snapshot_round_trips_set_list_and_details(self):
+        """
+        Test that the set list and every set's details read back from a snapshot equal what was written.
+        """
+        write_catalog_snapshot(self.path, LEGO_SETS, SET_DETAILS)
+        snapshot = CatalogSnapshot(self.path)
+
+        self.assertEqual(snapshot.lego_sets(), LEGO_SETS)
+        self.assertEqual(snapshot.set_details('a'), SET_DETAILS['a'])
+        self.assertEqual(snapshot.set_details('b'), SET_DETAILS['b'])
+        self.assertIsNone(snapshot.set_details('missing'))
+
+    def test_snapshot_rejects_other_files(self):
+        """
+        Test that opening a file that is not a snapshot raises ValueError.
+        """
+        with open(self.path, 'wb') as f:
+            f.write(b"not a snapshot at all")
+
+        with self.assertRaises(ValueError):
+            CatalogSnapshot(self.path)
+
+    def test_api_functions_read_from_snapshot(self):
+        """
+        Test that get_lego_sets and get_lego_set_details serve a loaded snapshot without calling the upstream.
+        """
+        import helpers.api_functions as api_functions
+
+        write_catalog_snapshot(self.path, LEGO_SETS, SET_DETAILS)
+        with mock.patch.object(api_functions, 'catalog_snapshot', CatalogSnapshot(self.path)), \
+                mock.patch.object(api_functions, 'make_get_request') as make_get_request:
+            self.assertEqual(api_functions.get_lego_sets(), LEGO_SETS)
+            self.assertEqual(api_functions.get_lego_set_details('a'), SET_DETAILS['a'])
+
+        make_get_request.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
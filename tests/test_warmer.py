@@ -0,0 +1,150 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, parent_dir)
+
+from config import UPSTREAM_BASE_URL
+from helpers import catalog_index
+from helpers.cache import CatalogCache, NOT_MODIFIED
+from helpers.catalog_index import CatalogIndex, get_catalog_index
+from helpers.warmer import CatalogWarmer
+
+SETS_URL = f"{UPSTREAM_BASE_URL}/api/sets"
+
+
+def set_url(set_id):
+    return f"{UPSTREAM_BASE_URL}/api/set/by-id/{set_id}"
+
+
+class FakeUpstream:
+    """
+    Serves payloads by URL with ETags, recording every fetch.
+    """
+
+    def __init__(self):
+        self.payloads = {}
+        self.fetched = []
+        self.failing = set()
+        self.versions = 0
+
+    def serve(self, url, payload):
+        self.versions += 1
+        self.payloads[url] = (payload, f'"{self.versions}"')
+
+    def make_conditional_fetch(self, url, max_age):
+        def fetch(etag):
+            self.fetched.append(url)
+            if url in self.failing:
+                return None
+            payload, current_etag = self.payloads[url]
+            return NOT_MODIFIED if etag == current_etag else (payload, current_etag)
+        return fetch
+
+
+def pieces(design_id, quantity):
+    return {'pieces': [{'part': {'designID': design_id, 'material': 1}, 'quantity': quantity}]}
+
+
+class TestCatalogWarmer(unittest.TestCase):
+
+    def setUp(self):
+        self.upstream = FakeUpstream()
+        self.upstream.serve(SETS_URL, {'Sets': [{'id': 'a', 'name': 'A', 'totalPieces': 2},
+                                                {'id': 'b', 'name': 'B', 'totalPieces': 3}]})
+        self.upstream.serve(set_url('a'), pieces('3001', 2))
+        self.upstream.serve(set_url('b'), pieces('3002', 3))
+        self.cache = CatalogCache(maxsize=100, ttl=60)
+        patches = [
+            mock.patch('helpers.warmer.make_conditional_fetch', self.upstream.make_conditional_fetch),
+            mock.patch('helpers.warmer.catalog_cache', self.cache),
+            mock.patch.object(catalog_index, '_current_index', None),
+            mock.patch.object(catalog_index, '_previous_index', None),
+            # Requests must be answered from the published index without fetching anything.
+            mock.patch('helpers.catalog_index.fetch_lego_set_details', side_effect=AssertionError("fetched")),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.warmer = CatalogWarmer(interval=60, max_workers=2, engine="index")
+
+    def cached(self, url):
+        return self.cache.get(url, lambda etag: None)
+
+    def test_first_refresh_loads_and_publishes_the_catalog(self):
+        """
+        Test that the first poll fetches every set and publishes the set list, the set details and the index.
+        """
+        self.assertTrue(self.warmer.refresh())
+
+        lego_sets = self.cached(SETS_URL)
+        self.assertEqual([lego_set['id'] for lego_set in lego_sets['Sets']], ['a', 'b'])
+        self.assertEqual(self.cached(set_url('b')), pieces('3002', 3))
+        index = get_catalog_index(lego_sets, engine="index")
+        self.assertIsInstance(index, CatalogIndex)
+        self.assertEqual(index.buildable_set_ids({'3001': {'1': 5}}), ['a'])
+
+    def test_changed_set_list_refetches_only_changed_sets(self):
+        """
+        Test that after the set list changes only new and changed sets are fetched, and that requests still holding
+        the old set list keep getting the old index.
+        """
+        self.warmer.refresh()
+        old_sets = self.cached(SETS_URL)
+        self.upstream.fetched.clear()
+
+        self.upstream.serve(SETS_URL, {'Sets': [{'id': 'a', 'name': 'A', 'totalPieces': 2},
+                                                {'id': 'b', 'name': 'B', 'totalPieces': 4},
+                                                {'id': 'c', 'name': 'C', 'totalPieces': 1}]})
+        self.upstream.serve(set_url('b'), pieces('3002', 4))
+        self.upstream.serve(set_url('c'), pieces('3003', 1))
+        self.assertTrue(self.warmer.refresh())
+
+        self.assertEqual(sorted(self.upstream.fetched), sorted([SETS_URL, set_url('b'), set_url('c')]))
+        new_index = get_catalog_index(self.cached(SETS_URL), engine="index")
+        self.assertEqual(list(new_index.set_names), ['a', 'b', 'c'])
+        self.assertEqual(new_index.brick_counts['b'], 4)
+        self.assertEqual(list(get_catalog_index(old_sets, engine="index").set_names), ['a', 'b'])
+
+    def test_unchanged_set_list_is_not_rebuilt(self):
+        """
+        Test that a poll answered with 304 fetches no set details and publishes nothing new.
+        """
+        self.warmer.refresh()
+        index = get_catalog_index(self.cached(SETS_URL), engine="index")
+        self.upstream.fetched.clear()
+
+        self.assertFalse(self.warmer.refresh())
+
+        self.assertEqual(self.upstream.fetched, [SETS_URL])
+        self.assertIs(get_catalog_index(self.cached(SETS_URL), engine="index"), index)
+
+    def test_failed_sets_are_published_and_retried(self):
+        """
+        Test that a set that cannot be fetched is published as a failed set of the index, and that later polls try
+        only that set again, even when the set list did not change.
+        """
+        self.upstream.failing.add(set_url('b'))
+        self.assertTrue(self.warmer.refresh())
+        index = get_catalog_index(self.cached(SETS_URL), engine="index")
+        self.assertEqual(list(index.set_names), ['a'])
+        self.assertEqual(list(index.failed_sets), ['b'])
+
+        self.upstream.fetched.clear()
+        self.assertFalse(self.warmer.refresh())
+        self.assertEqual(self.upstream.fetched, [SETS_URL, set_url('b')])
+        self.assertIs(get_catalog_index(self.cached(SETS_URL), engine="index"), index)
+
+        self.upstream.failing.clear()
+        self.upstream.fetched.clear()
+        self.assertTrue(self.warmer.refresh())
+        self.assertEqual(self.upstream.fetched, [SETS_URL, set_url('b')])
+        index = get_catalog_index(self.cached(SETS_URL), engine="index")
+        self.assertEqual(list(index.set_names), ['a', 'b'])
+        self.assertEqual(index.failed_sets, {})
+
+
+if __name__ == '__main__':
+    unittest.main()